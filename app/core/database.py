@@ -1,7 +1,12 @@
 import os
-from sqlalchemy import create_engine
+import time
+import threading
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 
+from app.core.logger import logger
+from app.core.profiling import PROFILING_ENABLED, install_sqlalchemy_hooks
+
 # Get the connection URL from the environment variables
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -31,3 +36,102 @@ def get_db_session():
         yield db
     finally:
         db.close()
+
+
+# --- Read Replica Routing ---
+# Heavy analytical reads (clustering scans, RAG retrieval) go to a replica so they
+# don't compete with ingestion commits. Without READ_DATABASE_URL they share the primary.
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+MAX_REPLICA_LAG_SECONDS = float(os.getenv("MAX_REPLICA_LAG_SECONDS", "30"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "10"))
+# A dead replica must fail the health check quickly instead of hanging it
+REPLICA_CONNECT_TIMEOUT = int(os.getenv("REPLICA_CONNECT_TIMEOUT", "3"))
+
+if READ_DATABASE_URL:
+    read_engine = create_engine(
+        READ_DATABASE_URL.replace("postgresql://", "postgresql+psycopg2://"),
+        pool_size=10,
+        max_overflow=20,
+        pool_timeout=30,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        connect_args={"connect_timeout": REPLICA_CONNECT_TIMEOUT}
+    )
+else:
+    read_engine = engine
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Opt-in query timing and slow-query EXPLAIN logging (app/core/profiling.py)
+if PROFILING_ENABLED:
+    install_sqlalchemy_hooks([engine, read_engine])
+
+# Seconds the replica is behind, or NULL when its WAL receiver is not running.
+# A running receiver that has replayed everything it received is caught up
+# (lag 0): on an idle primary no new WAL arrives, so replay timestamps and
+# keepalive receipt times age without the replica falling behind. A stream
+# that stops is dropped by the receiver after wal_receiver_timeout, which
+# turns into NULL here (the view has a row only while a receiver runs,
+# readable without pg_read_all_stats). With WAL pending, the lag is the replay timestamp's age.
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+# Refreshed by a background thread; reads start on the primary until the first check
+_replica_state = {"checked_at": 0.0, "healthy": False, "lag": None}
+_replica_monitor_lock = threading.Lock()
+
+
+def _check_replica() -> None:
+    try:
+        with read_engine.connect() as conn:
+            lag = conn.execute(REPLICA_LAG_QUERY).scalar()
+        lag = float(lag) if lag is not None else None
+        healthy = lag is not None and lag <= MAX_REPLICA_LAG_SECONDS
+        if not healthy and (_replica_state["healthy"] or not _replica_state["checked_at"]):
+            reason = "WAL receiver stopped" if lag is None else f"lagging {lag:.1f}s"
+            logger.warning(f"Read replica {reason}; routing reads to primary.")
+    except Exception as e:
+        lag, healthy = None, False
+        if _replica_state["healthy"] or not _replica_state["checked_at"]:
+            logger.warning(f"Read replica unreachable ({e}); routing reads to primary.")
+    _replica_state.update(lag=lag, healthy=healthy, checked_at=time.monotonic())
+
+
+def _replica_monitor() -> None:
+    while True:
+        _check_replica()
+        time.sleep(REPLICA_LAG_CHECK_INTERVAL)
+
+
+def replica_is_usable() -> bool:
+    """
+    Returns True when the read replica is reachable and within MAX_REPLICA_LAG_SECONDS.
+    Never touches the network: a daemon thread re-checks every
+    REPLICA_LAG_CHECK_INTERVAL, so callers on the event loop can't stall on a dead replica.
+    """
+    if read_engine is engine:
+        return True
+
+    if not hasattr(replica_is_usable, 'monitor'):
+        with _replica_monitor_lock:
+            if not hasattr(replica_is_usable, 'monitor'):
+                replica_is_usable.monitor = threading.Thread(
+                    target=_replica_monitor, name="replica-monitor", daemon=True
+                )
+                replica_is_usable.monitor.start()
+    return _replica_state["healthy"]
+
+
+def get_read_db_session():
+    """Provides a read-only-intent session on the replica, falling back to the primary."""
+    db = ReadSessionLocal() if replica_is_usable() else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
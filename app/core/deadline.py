@@ -0,0 +1,96 @@
+"""
+REQUEST DEADLINES
+A Deadline is the time budget of one user request, started before admission
+so queueing counts against it. Each stage is allotted a share of what is
+left, hands that on as the OpenAI per-call timeout or the Postgres
+statement_timeout, and is recorded as a miss when it overruns, so a slow
+dependency degrades the answer instead of stalling it.
+"""
+
+import os
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.logger import logger
+
+# --- CONFIGURATION ---
+RAG_DEADLINE_SECONDS = float(os.getenv("RAG_DEADLINE_SECONDS", "25"))
+# A stage allotted less than this is skipped (its fallback runs) rather than attempted
+MIN_STAGE_SECONDS = 0.25
+
+_misses: Counter = Counter()
+_misses_lock = threading.Lock()
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage has no usable budget left."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"deadline exhausted before {stage}")
+        self.stage = stage
+
+
+class Stage:
+    """One stage's slice of the deadline."""
+
+    def __init__(self, name: str, budget: float):
+        self.name = name
+        self.budget = budget
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self) -> float:
+        return max(self.budget - self.elapsed, 0.0)
+
+
+class Deadline:
+    def __init__(self, seconds: float = RAG_DEADLINE_SECONDS):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @contextmanager
+    def stage(self, name: str, share: float = 1.0) -> Iterator[Stage]:
+        """
+        Runs a stage with `share` of the remaining time. Raises DeadlineExceeded
+        up front when that is below MIN_STAGE_SECONDS; an overrun (including one
+        that ended in a timeout error) is recorded as a miss either way.
+        """
+        stage = Stage(name, self.remaining() * share)
+        if stage.budget < MIN_STAGE_SECONDS:
+            record_miss(name, 0.0, stage.budget)
+            raise DeadlineExceeded(name)
+        try:
+            yield stage
+        finally:
+            if stage.elapsed >= stage.budget:
+                record_miss(name, stage.elapsed, stage.budget)
+
+
+def record_miss(stage: str, elapsed: float, budget: float) -> None:
+    with _misses_lock:
+        _misses[stage] += 1
+    logger.warning(f"Deadline miss in {stage}: {elapsed * 1000:.0f} ms of {budget * 1000:.0f} ms",
+                   extra={"event": "deadline.miss", "stage": stage,
+                          "elapsed_ms": round(elapsed * 1000), "budget_ms": round(budget * 1000)})
+
+
+def deadline_misses() -> Dict[str, int]:
+    """Misses per stage since the process started."""
+    with _misses_lock:
+        return dict(_misses)
+
+
+def apply_statement_timeout(session: Session, seconds: float) -> None:
+    """Caps every following statement of the session's current transaction (SET LOCAL)."""
+    session.execute(text(f"SET LOCAL statement_timeout = {max(int(seconds * 1000), 1)}"))
@@ -1,36 +1,154 @@
 
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
 import os
 
+# --- CONFIGURATION ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" (one object per line) or "text" (human-readable)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_CONSOLE_FORMAT = os.getenv("LOG_CONSOLE_FORMAT", "text").lower()
+LOG_FILE = os.getenv("LOG_FILE", "logs/bot.log")
+# "size" rotates at LOG_MAX_BYTES, "time" rotates at LOG_ROTATE_WHEN (e.g. "midnight", "H")
+LOG_ROTATION = os.getenv("LOG_ROTATION", "size").lower()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "7"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Per-event sampling for high-volume INFO/DEBUG records, e.g. "ingest.stored:0.01,ingest.skipped:0.1".
+# Records opt in with extra={"event": "..."}; warnings and errors are never sampled.
+LOG_SAMPLE_RATES = {
+    event.strip(): float(rate)
+    for event, rate in (
+        pair.split(":") for pair in os.getenv(
+            "LOG_SAMPLE_RATES", "ingest.stored:0.05,ingest.skipped:0.05"
+        ).split(",") if ":" in pair
+    )
+}
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: timestamp, level, module, message and any `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:  # already rendered by DroppingQueueHandler.prepare
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a LOG_SAMPLE_RATES fraction of records tagged with a sampled event."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(getattr(record, "event", None))
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        if rate < 1.0:
+            record.sample_rate = rate
+        return random.random() < rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: when the queue is full the record is dropped and counted."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare() folds the traceback into msg and clears exc_info,
+        # which leaves JsonFormatter's "exc" empty. Render the traceback into
+        # exc_text instead (tracebacks don't cross threads) and keep msg clean.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _formatter(kind: str) -> logging.Formatter:
+    if kind == "json":
+        return JsonFormatter()
+    return logging.Formatter(
+        '[%(asctime)s] [%(levelname)s] [%(module)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+
 def setup_logging():
     """
     Configures the application's logging with structured output.
     MANDATE 2.3: Observability
+    Callers only pay for putting the record on a queue; formatting, console
+    and file I/O (with rotation) happen on the QueueListener's thread.
     """
     # Create logger
     logger = logging.getLogger("discord_mind")
-    logger.setLevel(logging.INFO)
-
-    # Formatters
-    formatter = logging.Formatter(
-        '[%(asctime)s] [%(levelname)s] [%(module)s] %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
 
     # Console Handler
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    console_handler.setFormatter(_formatter(LOG_CONSOLE_FORMAT))
+    handlers = [console_handler]
 
     # File Handler (Optional, good for production persistence)
     try:
-        os.makedirs("logs", exist_ok=True)
-        file_handler = logging.FileHandler("logs/bot.log", encoding="utf-8")
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        os.makedirs(os.path.dirname(LOG_FILE) or ".", exist_ok=True)
+        if LOG_ROTATION == "time":
+            file_handler = logging.handlers.TimedRotatingFileHandler(
+                LOG_FILE, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+            )
+        else:
+            file_handler = logging.handlers.RotatingFileHandler(
+                LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+            )
+        file_handler.setFormatter(_formatter(LOG_FORMAT))
+        handlers.append(file_handler)
     except Exception as e:
-        print(f"Warning: Could not set up file logging: {e}")
+        sys.stderr.write(f"Warning: Could not set up file logging: {e}\n")
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATES))
+    logger.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # flush what's queued on shutdown
 
     # Silence noisy libraries
     logging.getLogger("discord").setLevel(logging.WARNING)
@@ -41,3 +159,8 @@ def setup_logging():
     return logger
 
 logger = setup_logging()
+
+
+def dropped_log_records() -> int:
+    """Records dropped since startup because the log queue was full."""
+    return sum(h.dropped for h in logger.handlers if isinstance(h, DroppingQueueHandler))
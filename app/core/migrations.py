@@ -0,0 +1,40 @@
+"""
+ADDITIVE SCHEMA MIGRATIONS
+Base.metadata.create_all() never alters tables that already exist.
+Columns and indexes added after the initial schema are listed here as
+idempotent DDL and applied in order by create_tables.py.
+"""
+
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+ADDITIVE_MIGRATIONS: List[str] = [
+    # Per-guild scoping (vector cache, guild-level stats)
+    "ALTER TABLE discord_messages ADD COLUMN IF NOT EXISTS guild_id VARCHAR(50)",
+    "CREATE INDEX IF NOT EXISTS ix_discord_messages_guild_id ON discord_messages (guild_id)",
+    # Pre-embedding content filter (near-duplicate links, vector-less rows)
+    "ALTER TABLE discord_messages ADD COLUMN IF NOT EXISTS duplicate_of BIGINT",
+    "ALTER TABLE discord_messages ALTER COLUMN embedding DROP NOT NULL",
+    # Engagement signals for retrieval scoring
+    "ALTER TABLE discord_messages ADD COLUMN IF NOT EXISTS reply_to VARCHAR(50)",
+    "ALTER TABLE discord_messages ADD COLUMN IF NOT EXISTS reaction_count INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE discord_messages ADD COLUMN IF NOT EXISTS reply_count INTEGER NOT NULL DEFAULT 0",
+    # Lexical fallback when the query embedding misses its deadline
+    "CREATE INDEX IF NOT EXISTS ix_discord_messages_content_fts "
+    "ON discord_messages USING gin (to_tsvector('english', content))",
+    # Insert time for the snapshot export's safety window; the default is set
+    # separately because a volatile ADD COLUMN default would rewrite the table
+    "ALTER TABLE discord_messages ADD COLUMN IF NOT EXISTS ingested_at TIMESTAMPTZ",
+    "ALTER TABLE discord_messages ALTER COLUMN ingested_at SET DEFAULT clock_timestamp()",
+    # Age-based purge of finished jobs
+    "CREATE INDEX IF NOT EXISTS ix_jobs_status_created_at ON jobs (status, created_at)",
+]
+
+
+def apply_additive_migrations(conn: Connection) -> int:
+    """Applies every additive migration; each statement is safe to re-run."""
+    for statement in ADDITIVE_MIGRATIONS:
+        conn.execute(text(statement))
+    return len(ADDITIVE_MIGRATIONS)
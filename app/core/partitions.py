@@ -0,0 +1,270 @@
+"""
+PARTITION MANAGEMENT
+Monthly range partitioning and retention tiers for discord_messages.
+Hot partitions keep their embeddings, cold partitions are compacted
+(vectors dropped) and partitions beyond retention are dropped entirely.
+"""
+
+import os
+import re
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.models.message import DiscordMessage, MessageChunk, Snowflake
+
+# --- CONFIGURATION ---
+PARENT_TABLE = DiscordMessage.__tablename__
+PARTITION_PREFIX = f"{PARENT_TABLE}_p"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+LEGACY_TABLE = f"{PARENT_TABLE}_legacy"
+CHUNK_TABLE = MessageChunk.__tablename__
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+# Tiers (0 disables the tier): compacted partitions lose their embeddings,
+# retained partitions beyond RETENTION_MONTHS are dropped.
+COMPACT_AFTER_MONTHS = int(os.getenv("COMPACT_AFTER_MONTHS", "0"))
+RETENTION_MONTHS = int(os.getenv("RETENTION_MONTHS", "0"))
+
+_PARTITION_NAME_RE = re.compile(rf"^{PARTITION_PREFIX}(\d{{4}})_(\d{{2}})$")
+
+
+# --- MONTH ARITHMETIC ---
+def month_start(dt: datetime) -> datetime:
+    """Truncates a datetime to the first instant of its month (UTC)."""
+    dt = dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, n: int) -> datetime:
+    """Shifts a month-start datetime by n months."""
+    index = month.year * 12 + (month.month - 1) + n
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{PARTITION_PREFIX}{month.year:04d}_{month.month:02d}"
+
+
+def searchable_cutoff() -> Optional[datetime]:
+    """
+    Earliest created_at that still carries embeddings, or None when compaction is off.
+    Vector queries filter on it so the planner prunes compacted partitions.
+    """
+    if COMPACT_AFTER_MONTHS <= 0:
+        return None
+    return add_months(month_start(datetime.now(timezone.utc)), -COMPACT_AFTER_MONTHS)
+
+
+def searchable_criteria() -> list:
+    """WHERE criteria restricting a vector query to rows with a live embedding."""
+    criteria = [DiscordMessage.embedding.is_not(None)]
+    cutoff = searchable_cutoff()
+    if cutoff is not None:
+        criteria.append(DiscordMessage.created_at >= cutoff)
+    return criteria
+
+
+def chunk_searchable_criteria() -> list:
+    """searchable_criteria() for discord_message_chunks."""
+    criteria = [MessageChunk.embedding.is_not(None)]
+    cutoff = searchable_cutoff()
+    if cutoff is not None:
+        criteria.append(MessageChunk.created_at >= cutoff)
+    return criteria
+
+
+# --- INTROSPECTION ---
+def is_partitioned(conn: Connection) -> bool:
+    """True if the parent table exists and is declaratively partitioned."""
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"),
+        {"name": PARENT_TABLE}
+    ).scalar()
+    return relkind == "p"
+
+
+def list_partitions(conn: Connection) -> List[Tuple[str, datetime]]:
+    """Returns (partition_name, month_start) for every monthly partition, oldest first."""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:name)"
+    ), {"name": PARENT_TABLE}).scalars().all()
+
+    partitions = []
+    for name in names:
+        match = _PARTITION_NAME_RE.match(name)
+        if match:
+            month = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+            partitions.append((name, month))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def default_partition_rows(conn: Connection) -> int:
+    """Rows sitting in the catch-all default partition (0 when it doesn't exist)."""
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": DEFAULT_PARTITION}).scalar() is None:
+        return 0
+    return conn.execute(text(f"SELECT count(*) FROM {DEFAULT_PARTITION}")).scalar()
+
+
+def _default_partition_months(conn: Connection) -> List[datetime]:
+    """Months of the rows held by the default partition."""
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": DEFAULT_PARTITION}).scalar() is None:
+        return []
+    months = conn.execute(text(
+        f"SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC') FROM {DEFAULT_PARTITION}"
+    )).scalars().all()
+    return [month_start(month) for month in months]
+
+
+# --- DDL ---
+def ensure_monthly_partitions(conn: Connection, start: Optional[datetime] = None,
+                              months_ahead: int = PARTITION_MONTHS_AHEAD) -> List[str]:
+    """
+    Creates any missing monthly partitions from `start` (default: this month)
+    through `months_ahead` months in the future, plus the default partition.
+    Rows that landed in the default partition (e.g. history older than the
+    oldest partition) get partitions for their months and are moved into
+    them: Postgres refuses to create a partition whose range the default
+    already holds rows for. Returns the names of the partitions that were created.
+    """
+    now_month = month_start(datetime.now(timezone.utc))
+    month = month_start(start) if start else now_month
+    last = add_months(now_month, months_ahead)
+    existing = {name for name, _ in list_partitions(conn)}
+
+    wanted = []
+    while month <= last:
+        wanted.append(month)
+        month = add_months(month, 1)
+    stranded = _default_partition_months(conn)
+    missing = sorted({m for m in wanted + stranded if partition_name(m) not in existing})
+
+    # Detached, the default's rows no longer block the new ranges
+    rehome = any(partition_name(m) not in existing for m in stranded)
+    if rehome:
+        conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+
+    created = []
+    for month in missing:
+        name = partition_name(month)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        ))
+        created.append(name)
+
+    if rehome:
+        columns = ", ".join(c.name for c in DiscordMessage.__table__.columns)
+        conn.execute(text(
+            f"INSERT INTO {PARENT_TABLE} ({columns}) SELECT {columns} FROM {DEFAULT_PARTITION}"
+        ))
+        conn.execute(text(f"TRUNCATE {DEFAULT_PARTITION}"))
+        conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+
+    # Catch-all so out-of-range timestamps never fail an insert
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"
+    ))
+    return created
+
+
+def migrate_to_partitioned(conn: Connection, metadata) -> int:
+    """
+    Converts an existing unpartitioned discord_messages table in place:
+    renames it aside, creates the partitioned parent, copies all rows across
+    and drops the legacy table. Runs inside the caller's transaction.
+    Returns the number of rows migrated.
+    """
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {LEGACY_TABLE}"))
+    conn.execute(text(f"ALTER SEQUENCE IF EXISTS {PARENT_TABLE}_id_seq RENAME TO {LEGACY_TABLE}_id_seq"))
+
+    # Index and constraint names survive a rename; move them aside so create_all can reuse them
+    index_names = conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :name"),
+        {"name": LEGACY_TABLE}
+    ).scalars().all()
+    for index_name in index_names:
+        conn.execute(text(f"ALTER INDEX {index_name} RENAME TO legacy_{index_name}"))
+
+    metadata.create_all(bind=conn, tables=[DiscordMessage.__table__])
+
+    oldest = conn.execute(text(f"SELECT MIN(created_at) FROM {LEGACY_TABLE}")).scalar()
+    ensure_monthly_partitions(conn, start=oldest)
+
+    # Copy only the columns the legacy table actually has (it may predate newer ones)
+    legacy_columns = set(conn.execute(
+        text("SELECT column_name FROM information_schema.columns WHERE table_name = :name"),
+        {"name": LEGACY_TABLE}
+    ).scalars().all())
+    copied = [c for c in DiscordMessage.__table__.columns if c.name in legacy_columns]
+    columns = ", ".join(c.name for c in copied)
+    # Legacy VARCHAR Discord IDs become BIGINT on the way across
+    values = ", ".join(f"{c.name}::bigint" if isinstance(c.type, Snowflake) else c.name for c in copied)
+    migrated = conn.execute(text(
+        f"INSERT INTO {PARENT_TABLE} ({columns}) SELECT {values} FROM {LEGACY_TABLE}"
+    )).rowcount
+    conn.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{PARENT_TABLE}', 'id'), "
+        f"COALESCE((SELECT MAX(id) FROM {PARENT_TABLE}), 1))"
+    ))
+    conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+    return migrated
+
+
+# --- RETENTION TIERS ---
+def compact_partitions(engine: Engine, older_than_months: int = COMPACT_AFTER_MONTHS) -> List[str]:
+    """
+    Drops the embeddings of every monthly partition older than the compaction
+    tier, then vacuums it to hand the TOASTed vector space back.
+    Content and metadata are kept. Returns the names of compacted partitions.
+    """
+    if older_than_months <= 0:
+        return []
+
+    cutoff = add_months(month_start(datetime.now(timezone.utc)), -older_than_months)
+    compacted = []
+    # VACUUM cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # Chunks of long messages are not partitioned; compact them by timestamp
+        chunk_rows = conn.execute(
+            text(f"UPDATE {CHUNK_TABLE} SET embedding = NULL "
+                 f"WHERE created_at < :cutoff AND embedding IS NOT NULL"),
+            {"cutoff": cutoff}
+        ).rowcount
+        if chunk_rows:
+            conn.execute(text(f"VACUUM (ANALYZE) {CHUNK_TABLE}"))
+            compacted.append(f"{CHUNK_TABLE} ({chunk_rows} rows)")
+        for name, month in list_partitions(conn):
+            if month >= cutoff:
+                continue
+            updated = conn.execute(
+                text(f"UPDATE {name} SET embedding = NULL WHERE embedding IS NOT NULL")
+            ).rowcount
+            if updated:
+                conn.execute(text(f"VACUUM (ANALYZE) {name}"))
+                compacted.append(name)
+    return compacted
+
+
+def apply_retention(conn: Connection, retention_months: int = RETENTION_MONTHS) -> List[str]:
+    """
+    Detaches and drops monthly partitions older than the retention window.
+    The activity rollups and topic counts still include the dropped messages;
+    create_tables.py rebuilds them after a pass that dropped anything.
+    """
+    if retention_months <= 0:
+        return []
+
+    cutoff = add_months(month_start(datetime.now(timezone.utc)), -retention_months)
+    dropped = []
+    conn.execute(text(f"DELETE FROM {CHUNK_TABLE} WHERE created_at < :cutoff"), {"cutoff": cutoff})
+    for name, month in list_partitions(conn):
+        if month < cutoff:
+            conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    return dropped
@@ -0,0 +1,242 @@
+"""
+PROFILING HOOKS (opt-in: PROFILING_ENABLED=true)
+  - trace()/span(): per-operation timing with a breakdown by category
+    (db, openai, sklearn, ...); operations slower than SLOW_OPERATION_MS are
+    logged with that breakdown,
+  - SQLAlchemy cursor hooks time every query into the current trace and log
+    queries slower than SLOW_QUERY_MS with their EXPLAIN plan (taken on a
+    background thread, sampled per statement),
+  - SamplingProfiler: on-demand, py-spy style wall-clock sampling of all
+    threads, written as collapsed stacks (flamegraph.pl / speedscope input).
+Disabled, trace() and span() cost one flag check.
+"""
+
+import os
+import sys
+import time
+import queue
+import threading
+import contextvars
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from app.core.logger import logger
+
+# --- CONFIGURATION ---
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+SLOW_OPERATION_MS = float(os.getenv("SLOW_OPERATION_MS", "2000"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+EXPLAIN_SLOW_QUERIES = os.getenv("EXPLAIN_SLOW_QUERIES", "true").lower() == "true"
+# The same statement text is explained at most once per interval
+EXPLAIN_INTERVAL_SECONDS = float(os.getenv("EXPLAIN_INTERVAL_SECONDS", "300"))
+EXPLAIN_QUEUE_SIZE = 100
+PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", "logs/profiles")
+SAMPLE_INTERVAL_SECONDS = 0.005
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+_explaining: contextvars.ContextVar = contextvars.ContextVar("explaining", default=False)
+
+
+class Trace:
+    """Timing of one operation (a command, a mention reply, an ingestion)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, str, float]] = []  # (category, name, seconds)
+        self.lock = threading.Lock()  # spans may arrive from worker threads
+
+    def add(self, category: str, name: str, seconds: float) -> None:
+        with self.lock:
+            self.spans.append((category, name, seconds))
+
+    def breakdown(self) -> Dict[str, Tuple[float, int]]:
+        """category -> (total seconds, count)."""
+        totals: Dict[str, List] = defaultdict(lambda: [0.0, 0])
+        with self.lock:
+            for category, _, seconds in self.spans:
+                totals[category][0] += seconds
+                totals[category][1] += 1
+        return {category: (seconds, count) for category, (seconds, count) in totals.items()}
+
+    def summary(self, elapsed: float) -> str:
+        breakdown = self.breakdown()
+        parts = [f"{category} {seconds * 1000:.0f} ms ({count}x)"
+                 for category, (seconds, count) in sorted(breakdown.items(), key=lambda b: -b[1][0])]
+        accounted = sum(seconds for seconds, _ in breakdown.values())
+        parts.append(f"other {max(elapsed - accounted, 0.0) * 1000:.0f} ms")
+        return ", ".join(parts)
+
+
+@contextmanager
+def trace(name: str):
+    """Top-level operation; logs its breakdown when slower than SLOW_OPERATION_MS."""
+    if not PROFILING_ENABLED:
+        yield None
+        return
+    current = Trace(name)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+        elapsed = time.perf_counter() - current.started
+        if elapsed * 1000 >= SLOW_OPERATION_MS:
+            logger.warning(f"🐢 Slow operation {name}: {elapsed * 1000:.0f} ms [{current.summary(elapsed)}]")
+
+
+@contextmanager
+def span(category: str, name: str = ""):
+    """Times a block into the current trace (no-op outside a trace)."""
+    current = _current_trace.get() if PROFILING_ENABLED else None
+    if current is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.add(category, name, time.perf_counter() - started)
+
+
+# --- SQLALCHEMY HOOKS ---
+def _explain(engine, statement: str, parameters) -> Optional[str]:
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    token = _explaining.set(True)
+    try:
+        # Separate connection: the caller's cursor and transaction stay untouched
+        with engine.connect() as explain_conn:
+            rows = explain_conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).all()
+        return "\n".join(row[0] for row in rows)
+    except Exception as e:
+        return f"(EXPLAIN failed: {e})"
+    finally:
+        _explaining.reset(token)
+
+
+class _SlowQueryExplainer:
+    """
+    EXPLAINs slow queries on one daemon thread, so the query's caller (often
+    the event loop) never waits for a plan and at most one extra pooled
+    connection is in use. Each statement text is explained at most once per
+    EXPLAIN_INTERVAL_SECONDS; when the queue is full the query is logged
+    without its plan.
+    """
+
+    def __init__(self):
+        self.queue: "queue.Queue" = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+        self.explained_at: Dict[str, float] = {}
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def submit(self, engine, statement: str, parameters, message: str) -> bool:
+        """Queues a slow query for its plan; False when it should be logged without one."""
+        now = time.monotonic()
+        with self.lock:
+            if now - self.explained_at.get(statement, float("-inf")) < EXPLAIN_INTERVAL_SECONDS:
+                return False
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="slow-query-explainer", daemon=True)
+                self.thread.start()
+            try:
+                self.queue.put_nowait((engine, statement, parameters, message))
+            except queue.Full:
+                return False
+            if len(self.explained_at) > 1000:
+                self.explained_at.clear()
+            self.explained_at[statement] = now
+        return True
+
+    def _run(self) -> None:
+        while True:
+            engine, statement, parameters, message = self.queue.get()
+            plan = _explain(engine, statement, parameters)
+            logger.warning(message + (f"\n{plan}" if plan else ""))
+
+
+_explainer = _SlowQueryExplainer()
+
+
+def install_sqlalchemy_hooks(engines) -> None:
+    """Times every query on `engines`; logs slow ones with their plan."""
+    from sqlalchemy import event
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Kept on the statement's execution context: a statement that fails
+        # never reaches after_cursor_execute, and must not leave a start time behind
+        context._profiling_started = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_profiling_started", None)
+        if started is None or _explaining.get():
+            return
+        elapsed = time.perf_counter() - started
+        current = _current_trace.get()
+        if current is not None:
+            current.add("db", statement.split(None, 1)[0].upper(), elapsed)
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            message = (f"🐢 Slow query ({elapsed * 1000:.0f} ms"
+                       f"{', in ' + current.name if current else ''}): {statement[:500]}")
+            if not (EXPLAIN_SLOW_QUERIES and not executemany
+                    and _explainer.submit(conn.engine, statement, parameters, message)):
+                logger.warning(message)
+
+    for engine in {id(e): e for e in engines}.values():
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+# --- SAMPLING PROFILER ---
+class SamplingProfiler:
+    """
+    Wall-clock sampler over every thread's stack (sys._current_frames), in the
+    spirit of py-spy but in-process, so it needs no ptrace permissions.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def _sample(self, own_ident: int) -> None:
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def run(self, seconds: float) -> "SamplingProfiler":
+        """Samples for `seconds` on the calling thread (use from asyncio.to_thread)."""
+        own_ident = threading.get_ident()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            self._sample(own_ident)
+            time.sleep(self.interval)
+        return self
+
+    def top_functions(self, n: int = 15) -> List[Tuple[str, int, int]]:
+        """(function, self samples, cumulative samples), by self samples."""
+        own, cumulative = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                cumulative[name] += count
+        return [(name, count, cumulative[name]) for name, count in own.most_common(n)]
+
+    def write_collapsed(self, path: Optional[str] = None) -> str:
+        """Writes `stack count` lines (flamegraph.pl / speedscope format); returns the path."""
+        if path is None:
+            os.makedirs(PROFILE_OUTPUT_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_OUTPUT_DIR, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
@@ -0,0 +1,122 @@
+"""
+DISCORD SNOWFLAKES
+A snowflake's top 42 bits are milliseconds since the Discord epoch (2015),
+so every message ID carries its send time. This module decodes it, converts
+legacy VARCHAR ID columns to BIGINT in place, and rewrites created_at of
+existing rows to the decoded send time (backfilled history was stamped with
+its ingestion time by the old server default).
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.models.message import DiscordMessage, MessageChunk
+from app.core.partitions import ensure_monthly_partitions, is_partitioned
+
+DISCORD_EPOCH_MS = 1420070400000
+
+# Every Discord ID column, including tables created after the original schema
+SNOWFLAKE_COLUMNS: List[Tuple[str, str]] = [
+    ("discord_messages", "discord_id"),
+    ("discord_messages", "channel_id"),
+    ("discord_messages", "author_id"),
+    ("discord_messages", "guild_id"),
+    ("discord_messages", "reply_to"),
+    ("discord_message_chunks", "guild_id"),
+    ("author_centroids", "author_id"),
+    ("author_neighbors", "author_id"),
+    ("author_neighbors", "neighbor_id"),
+    ("channel_summaries", "guild_id"),
+    ("channel_summaries", "channel_id"),
+    ("activity_hourly", "guild_id"),
+    ("activity_hourly", "channel_id"),
+    ("activity_hourly", "author_id"),
+    ("author_activity", "author_id"),
+]
+
+# SQL twin of snowflake_time()
+SNOWFLAKE_TIME_SQL = "to_timestamp(((discord_id >> 22) + {epoch}) / 1000.0)".format(epoch=DISCORD_EPOCH_MS)
+
+_MESSAGES = DiscordMessage.__tablename__
+_CHUNKS = MessageChunk.__tablename__
+
+
+def snowflake_time(discord_id: str) -> datetime:
+    """Send time encoded in a Discord snowflake (ms since the Discord epoch, 2015)."""
+    return datetime.fromtimestamp(((int(discord_id) >> 22) + DISCORD_EPOCH_MS) / 1000, tz=timezone.utc)
+
+
+# --- BIGINT MIGRATION ---
+def varchar_snowflake_columns(conn: Connection) -> List[Tuple[str, str]]:
+    """The (table, column) pairs still stored as text."""
+    rows = conn.execute(text(
+        "SELECT table_name, column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND data_type IN ('character varying', 'text')"
+    )).all()
+    existing = {(table, column) for table, column in rows}
+    return [pair for pair in SNOWFLAKE_COLUMNS if pair in existing]
+
+
+def migrate_snowflake_columns(conn: Connection) -> List[str]:
+    """
+    Converts VARCHAR Discord ID columns to BIGINT in place (ALTER ... TYPE
+    rewrites the table and its indexes under an exclusive lock; on the
+    partitioned parent it covers every partition). Idempotent: converted
+    columns are skipped. Raises before altering anything if a column holds
+    non-numeric values. Returns the converted "table.column" names.
+    """
+    pending = varchar_snowflake_columns(conn)
+    invalid: Dict[str, int] = {}
+    for table, column in pending:
+        bad = conn.execute(text(
+            f"SELECT count(*) FROM {table} WHERE {column} !~ '^[0-9]*$'"
+        )).scalar()
+        if bad:
+            invalid[f"{table}.{column}"] = bad
+    if invalid:
+        details = ", ".join(f"{name} ({count} rows)" for name, count in invalid.items())
+        raise ValueError(f"Non-numeric Discord IDs, fix before migrating: {details}")
+
+    for table, column in pending:
+        # "" was the rollups' placeholder for a missing guild
+        conn.execute(text(
+            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT "
+            f"USING (CASE WHEN {column} = '' THEN '0' ELSE {column} END)::bigint"
+        ))
+    return [f"{table}.{column}" for table, column in pending]
+
+
+# --- SEND-TIME BACKFILL ---
+def backfill_snowflake_timestamps(conn: Connection) -> Tuple[int, int]:
+    """
+    Sets created_at of every message to its snowflake send time (moving rows
+    across partitions as needed) and copies it onto their chunks. Extra rows
+    for an already stored Discord message (re-deliveries stamped with
+    different ingestion times) would collide on the unique key once their
+    timestamps agree, so all but the oldest copy are removed first.
+    Runs inside the caller's transaction. Returns (duplicates removed, rows retimed).
+    """
+    oldest = conn.execute(text(f"SELECT min({SNOWFLAKE_TIME_SQL}) FROM {_MESSAGES}")).scalar()
+    if oldest is None:
+        return 0, 0
+    if is_partitioned(conn):
+        ensure_monthly_partitions(conn, start=oldest)
+
+    duplicate_ids = (
+        f"SELECT later.id FROM {_MESSAGES} later JOIN {_MESSAGES} earlier "
+        f"ON later.discord_id = earlier.discord_id AND later.id > earlier.id"
+    )
+    conn.execute(text(f"DELETE FROM {_CHUNKS} WHERE message_id IN ({duplicate_ids})"))
+    duplicates = conn.execute(text(f"DELETE FROM {_MESSAGES} WHERE id IN ({duplicate_ids})")).rowcount
+    retimed = conn.execute(text(
+        f"UPDATE {_MESSAGES} SET created_at = {SNOWFLAKE_TIME_SQL} "
+        f"WHERE created_at IS DISTINCT FROM {SNOWFLAKE_TIME_SQL}"
+    )).rowcount
+    conn.execute(text(
+        f"UPDATE {_CHUNKS} c SET created_at = m.created_at FROM {_MESSAGES} m "
+        f"WHERE c.message_id = m.id AND c.created_at IS DISTINCT FROM m.created_at"
+    ))
+    return duplicates, retimed
@@ -0,0 +1,87 @@
+"""
+STARTUP PROFILING
+Per-phase cold-start timing for the bot process and an `-X importtime`
+report for finding heavy imports. Run `python -m app.core.startup` to see
+which modules dominate bot.py's import time.
+"""
+
+import os
+import re
+import ast
+import sys
+import time
+import subprocess
+from typing import List, Optional, Tuple
+
+from app.core.logger import logger
+
+BOT_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "bot.py")
+
+
+def bot_imports(path: str = BOT_PATH) -> List[str]:
+    """
+    bot.py's top-level import statements, read from the file so the list can't
+    drift, plus its load_dotenv() call (app modules read their config at import).
+    """
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return [
+        ast.unparse(node) for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+        or (isinstance(node, ast.Expr) and isinstance(node.value, ast.Call)
+            and getattr(node.value.func, "id", None) == "load_dotenv")
+    ]
+
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\s*)(\S+)")
+
+
+class StartupTimer:
+    """Records named phase boundaries from process start and logs a breakdown."""
+
+    def __init__(self, started_at: float):
+        self.started_at = started_at
+        self.marks: List[Tuple[str, float]] = []
+        self.reported = False
+
+    def mark(self, phase: str) -> None:
+        self.marks.append((phase, time.perf_counter()))
+
+    def report(self) -> None:
+        """Logs each phase's duration and the total, once per process."""
+        if self.reported:
+            return
+        self.reported = True
+        previous = self.started_at
+        lines = []
+        for phase, at in self.marks:
+            lines.append(f"  {phase:<28} {(at - previous) * 1000:8.1f} ms")
+            previous = at
+        total = (previous - self.started_at) * 1000
+        logger.info("⏱️  Startup breakdown:\n" + "\n".join(lines) + f"\n  {'TOTAL':<28} {total:8.1f} ms")
+
+
+def profile_imports(statements: Optional[List[str]] = None, top_n: int = 15) -> List[Tuple[str, float, float]]:
+    """
+    Runs import `statements` (default: bot.py's) in a fresh interpreter under
+    -X importtime and returns the top_n entries as (module, self_ms,
+    cumulative_ms), slowest cumulative first.
+    """
+    code = "\n".join(bot_imports() if statements is None else statements)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=os.getcwd()
+    )
+    entries = []
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            entries.append((name, int(self_us) / 1000, int(cumulative_us) / 1000))
+    return sorted(entries, key=lambda e: e[2], reverse=True)[:top_n]
+
+
+if __name__ == "__main__":
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_ms, cumulative_ms in profile_imports():
+        print(f"{cumulative_ms:14.1f} {self_ms:9.1f}  {name}")
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, Index, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.message import Base, Snowflake
+
+
+# --- ACTIVITY ROLLUP MODELS ---
+class ActivityHourly(Base):
+    """
+    Message count per guild, channel, author and hour, incremented in the
+    same transaction as the messages themselves. guild_id is 0 for legacy
+    rows without a guild.
+    """
+    __tablename__ = "activity_hourly"
+    __table_args__ = (
+        Index("ix_activity_hourly_guild_hour", "guild_id", "hour_start"),
+        Index("ix_activity_hourly_author_hour", "author_id", "hour_start"),
+    )
+
+    guild_id: Mapped[str] = mapped_column(Snowflake, primary_key=True)
+    channel_id: Mapped[str] = mapped_column(Snowflake, primary_key=True)
+    author_id: Mapped[str] = mapped_column(Snowflake, primary_key=True)
+    hour_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    message_count: Mapped[int] = mapped_column(Integer, default=0)
+
+    def __repr__(self) -> str:
+        return (f"ActivityHourly(guild_id={self.guild_id!r}, channel_id={self.channel_id!r}, "
+                f"author_id={self.author_id!r}, hour_start={self.hour_start!r}, "
+                f"message_count={self.message_count!r})")
+
+
+class AuthorActivity(Base):
+    """Lifetime totals per author; its row count is the number of distinct authors."""
+    __tablename__ = "author_activity"
+
+    author_id: Mapped[str] = mapped_column(Snowflake, primary_key=True)
+    message_count: Mapped[int] = mapped_column(Integer, default=0)
+    first_message_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    last_message_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    def __repr__(self) -> str:
+        return f"AuthorActivity(author_id={self.author_id!r}, message_count={self.message_count!r})"
@@ -0,0 +1,40 @@
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import BigInteger, DateTime, Float, Integer, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.models.message import Base, EmbeddingVector, Snowflake
+
+
+# --- AUTHOR SIMILARITY GRAPH MODELS ---
+class AuthorCentroid(Base):
+    """
+    Last-computed idea centroid (mean embedding) per author. Refreshes compare
+    new centroids against these to find authors whose neighbours may have changed.
+    """
+    __tablename__ = "author_centroids"
+
+    author_id: Mapped[str] = mapped_column(Snowflake, primary_key=True)
+    centroid: Mapped[List[float]] = mapped_column(EmbeddingVector())
+    message_count: Mapped[int] = mapped_column(Integer)
+    max_message_id: Mapped[int] = mapped_column(BigInteger)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self) -> str:
+        return f"AuthorCentroid(author_id={self.author_id!r}, message_count={self.message_count!r})"
+
+
+class AuthorNeighbor(Base):
+    """One edge of the author k-nearest-neighbour graph (cosine similarity of centroids)."""
+    __tablename__ = "author_neighbors"
+
+    author_id: Mapped[str] = mapped_column(Snowflake, primary_key=True)
+    rank: Mapped[int] = mapped_column(Integer, primary_key=True)  # 1 = most similar
+    neighbor_id: Mapped[str] = mapped_column(Snowflake)
+    similarity: Mapped[float] = mapped_column(Float)
+    neighbor_message_count: Mapped[int] = mapped_column(Integer)
+    computed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self) -> str:
+        return (f"AuthorNeighbor(author_id={self.author_id!r}, rank={self.rank!r}, "
+                f"neighbor_id={self.neighbor_id!r}, similarity={self.similarity!r})")
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import BigInteger, DateTime, Integer, String, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.message import Base
+
+
+# --- EMBEDDING STATE MODEL ---
+class EmbeddingState(Base):
+    """
+    Single row recording which model the stored vectors come from and the
+    progress of a re-embedding to a target model (app/services/reembedding.py).
+    Every process reads the active model from here (active_embedding()).
+    """
+    __tablename__ = "embedding_state"
+
+    SINGLETON_ID = 1
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    active_model: Mapped[str] = mapped_column(String(128))
+    active_dimension: Mapped[int] = mapped_column(Integer)
+    # Incremented by every switch; caches keyed on vectors rebuild when it changes
+    generation: Mapped[int] = mapped_column(Integer, default=0)
+
+    # Re-embedding in progress (NULL when idle)
+    target_model: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+    target_dimension: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    status: Mapped[str] = mapped_column(String(16), default="idle")  # idle|backfilling|backfilled|indexed
+    # table -> highest id below which every row has its shadow vector
+    checkpoint: Mapped[Dict[str, Any]] = mapped_column(JSONB, default=dict)
+    embedded: Mapped[int] = mapped_column(BigInteger, default=0)
+    # Model replaced by the last switch; its vectors stay in embedding_prev until dropped
+    previous_model: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    switched_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(),
+                                                 onupdate=func.now())
+
+    def __repr__(self) -> str:
+        return (f"EmbeddingState(active_model={self.active_model!r}, generation={self.generation!r}, "
+                f"target_model={self.target_model!r}, status={self.status!r})")
@@ -0,0 +1,39 @@
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+from sqlalchemy import BigInteger, DateTime, Index, Integer, String, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.message import Base
+
+
+# --- JOB QUEUE MODEL ---
+class Job(Base):
+    """
+    A unit of offloaded work (ingestion, analytics) claimed by worker
+    processes with SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Claim query: pending jobs of a kind that are due, oldest first
+        Index("ix_jobs_claim", "kind", "status", "run_after"),
+        # Purge of finished jobs by age
+        Index("ix_jobs_status_created_at", "status", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(32))          # "ingest" | "analytics"
+    status: Mapped[str] = mapped_column(String(16), default="pending")  # pending|running|done|failed
+    payload: Mapped[Dict[str, Any]] = mapped_column(JSONB)
+    result: Mapped[Optional[Any]] = mapped_column(JSONB, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    locked_by: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+
+    run_after: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    locked_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self) -> str:
+        return f"Job(id={self.id!r}, kind={self.kind!r}, status={self.status!r}, attempts={self.attempts!r})"
@@ -1,15 +1,21 @@
+import os
 import numpy as np
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 # Import necessary SQLAlchemy 2.0 components
-from sqlalchemy import BigInteger, DateTime, String, func
+from sqlalchemy import BigInteger, DateTime, Integer, String, UniqueConstraint, func, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy.types import TypeDecorator
 
 # Import the Vector type from the pgvector library
 # This is crucial for MANDATE 5.3
 from pgvector.sqlalchemy import Vector 
 
+# Output size of the active embedding model. Re-embedding to another model
+# (reembed.py) may change it at runtime; embedding_state records the live value.
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "1536"))
+
 # --- BASE DECLARATION (The Foundation) ---
 # Every model must inherit from this
 class Base(DeclarativeBase):
@@ -17,6 +23,38 @@ class Base(DeclarativeBase):
     and default timestamp columns."""
     pass
 
+# --- DISCORD ID TYPE ---
+class Snowflake(TypeDecorator):
+    """
+    Discord ID (snowflake): BIGINT in Postgres for compact indexes and joins,
+    str in Python, the way discord.py payloads and the services pass them around.
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return int(value) if value is not None else None
+
+    def process_result_value(self, value, dialect):
+        return str(value) if value is not None else None
+
+
+# --- EMBEDDING VECTOR TYPE ---
+class EmbeddingVector(Vector):
+    """
+    vector(EMBEDDING_DIMENSION) in the DDL, but binds vectors of any size:
+    after a re-embedding switch the column holds the new model's dimension
+    while long-running processes still have the old constant loaded.
+    """
+    cache_ok = True
+
+    def __init__(self, dim=None):
+        super().__init__(dim or EMBEDDING_DIMENSION)
+
+    def bind_processor(self, dialect):
+        return Vector(None).bind_processor(dialect)
+
+
 # --- DISCORD MESSAGE MODEL (The Data Structure) ---
 class DiscordMessage(Base):
     """
@@ -24,14 +62,24 @@ class DiscordMessage(Base):
     """
     __tablename__ = "discord_messages"  # MANDATORY Table Name (1.3)
     
-    # Primary Key - Unique ID
+    # Monthly range partitions on created_at (managed by create_tables.py).
+    # Postgres requires every unique constraint to include the partition key.
+    __table_args__ = (
+        UniqueConstraint("discord_id", "created_at", name="uq_discord_messages_discord_id_created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    
+    # Primary Key - Unique ID (+ partition key)
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     
     # Discord Metadata
     # We use BIGINT for Discord IDs as they are too large for standard INT
-    discord_id: Mapped[str] = mapped_column(String(50), index=True, unique=True)
-    channel_id: Mapped[str] = mapped_column(String(50), index=True)
-    author_id: Mapped[str] = mapped_column(String(50), index=True)
+    # (legacy VARCHAR columns are converted by app/core/snowflakes.py)
+    discord_id: Mapped[str] = mapped_column(Snowflake, index=True)
+    channel_id: Mapped[str] = mapped_column(Snowflake, index=True)
+    author_id: Mapped[str] = mapped_column(Snowflake, index=True)
+    # NULL for rows ingested before guild tracking (backfilled from channel lists on_ready)
+    guild_id: Mapped[Optional[str]] = mapped_column(Snowflake, index=True, nullable=True)
     
     # Message Content
     content: Mapped[str] = mapped_column(String)
@@ -40,16 +88,62 @@ class DiscordMessage(Base):
     # We anticipate using a popular model (like BAAI/bge-small-en-v1.5) 
     # which has 384 dimensions. This must match your chosen model's output size.
     # The Mapped[List[float]] provides Python type hinting for the vector array.
-    embedding: Mapped[List[float]] = mapped_column(Vector(1536))
+    # NULL once the row's partition has been compacted (see app/core/partitions.py)
+    # or when the content filter judged the message not worth a vector.
+    embedding: Mapped[Optional[List[float]]] = mapped_column(EmbeddingVector(), nullable=True)
+    # Set (with embedding NULL) when the content filter found a near-duplicate;
+    # points at discord_messages.id of the embedded original.
+    duplicate_of: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    
+    # Engagement signals for retrieval scoring (app/services/scoring.py)
+    # reply_to is the Discord ID of the message this one replies to.
+    reply_to: Mapped[Optional[str]] = mapped_column(Snowflake, nullable=True)
+    reaction_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    reply_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     
     # Timestamps (MANDATE 4.1: Data Integrity)
+    # Ingestion sets the send time decoded from discord_id (app/core/snowflakes.py);
+    # the server default only covers rows inserted by other tools.
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), 
         server_default=func.now(),
+        primary_key=True,
         index=True
     )
+    # Wall-clock insert time (clock_timestamp(), not the transaction start):
+    # snapshot exports only pass rows old enough that every lower id has committed.
+    # NULL for rows stored before the column existed.
+    ingested_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), server_default=text("clock_timestamp()"), nullable=True
+    )
     
     def __repr__(self) -> str:
         return (f"DiscordMessage(id={self.id!r}, "
                 f"content='{self.content[:30]}...', "
-                f"vector_dims={len(self.embedding)})")
+                f"vector_dims={len(self.embedding) if self.embedding is not None else 0})")
+
+
+# --- MESSAGE CHUNK MODEL (Long Messages) ---
+class MessageChunk(Base):
+    """
+    One overlapping slice of a long message, with its own embedding.
+    The parent DiscordMessage keeps the full text but no vector.
+    """
+    __tablename__ = "discord_message_chunks"
+    __table_args__ = (
+        UniqueConstraint("message_id", "chunk_index", name="uq_discord_message_chunks_message_chunk"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    # discord_messages.id of the parent (no FK: the parent table is partitioned)
+    message_id: Mapped[int] = mapped_column(BigInteger, index=True)
+    guild_id: Mapped[Optional[str]] = mapped_column(Snowflake, index=True, nullable=True)
+    chunk_index: Mapped[int] = mapped_column(Integer)
+    content: Mapped[str] = mapped_column(String)
+    embedding: Mapped[Optional[List[float]]] = mapped_column(EmbeddingVector(), nullable=True)
+    # Parent's created_at, so retention and compaction tiers apply to chunks too
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    def __repr__(self) -> str:
+        return (f"MessageChunk(message_id={self.message_id!r}, "
+                f"chunk_index={self.chunk_index!r}, content='{self.content[:30]}...')")
@@ -0,0 +1,34 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import BigInteger, DateTime, Integer, String, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.models.message import Base, EmbeddingVector, Snowflake
+
+
+# --- CHANNEL SUMMARY MODEL ---
+class ChannelSummary(Base):
+    """
+    Rolling LLM summary of one channel for one time bucket. "day" summaries are
+    updated incrementally from new messages; "week" summaries roll up the days.
+    """
+    __tablename__ = "channel_summaries"
+    __table_args__ = (
+        UniqueConstraint("channel_id", "granularity", "bucket_start", name="uq_channel_summaries_bucket"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    guild_id: Mapped[Optional[str]] = mapped_column(Snowflake, index=True, nullable=True)
+    channel_id: Mapped[str] = mapped_column(Snowflake, index=True)
+    granularity: Mapped[str] = mapped_column(String(8))  # "day" | "week"
+    bucket_start: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    summary: Mapped[str] = mapped_column(String)
+    message_count: Mapped[int] = mapped_column(Integer, default=0)
+    # discord_messages.id watermark: messages above it are not yet in the summary
+    last_message_id: Mapped[int] = mapped_column(BigInteger, default=0)
+    embedding: Mapped[Optional[List[float]]] = mapped_column(EmbeddingVector(), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self) -> str:
+        return (f"ChannelSummary(channel_id={self.channel_id!r}, granularity={self.granularity!r}, "
+                f"bucket_start={self.bucket_start!r}, message_count={self.message_count!r})")
@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import DateTime, Integer, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.message import Base, EmbeddingVector, Snowflake
+
+
+# --- TOPIC MATRIX MODELS ---
+class TopicCentroid(Base):
+    """
+    One topic of the stored topic model: a k-means centroid over recent
+    embeddings, labelled with the message closest to it. Replaced as a whole
+    by each rebuild (app/services/topic_matrix.py).
+    """
+    __tablename__ = "topic_centroids"
+
+    topic_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    centroid: Mapped[List[float]] = mapped_column(EmbeddingVector())
+    label: Mapped[str] = mapped_column(String)
+    message_count: Mapped[int] = mapped_column(Integer, default=0)  # at build time
+    computed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self) -> str:
+        return f"TopicCentroid(topic_id={self.topic_id!r}, label={self.label[:30]!r})"
+
+
+class AuthorTopic(Base):
+    """Messages of one author assigned to one topic; the primary key serves per-author reads."""
+    __tablename__ = "author_topics"
+
+    author_id: Mapped[str] = mapped_column(Snowflake, primary_key=True)
+    topic_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    message_count: Mapped[int] = mapped_column(Integer, default=0)
+
+    def __repr__(self) -> str:
+        return (f"AuthorTopic(author_id={self.author_id!r}, topic_id={self.topic_id!r}, "
+                f"message_count={self.message_count!r})")
+
+
+class ChannelTopic(Base):
+    """Messages of one channel assigned to one topic."""
+    __tablename__ = "channel_topics"
+
+    channel_id: Mapped[str] = mapped_column(Snowflake, primary_key=True)
+    topic_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    message_count: Mapped[int] = mapped_column(Integer, default=0)
+
+    def __repr__(self) -> str:
+        return (f"ChannelTopic(channel_id={self.channel_id!r}, topic_id={self.topic_id!r}, "
+                f"message_count={self.message_count!r})")
@@ -1,6 +1,8 @@
 from pydantic import BaseModel, Field, validator
 from typing import Optional
 
+from app.services.chunking import MAX_MESSAGE_CHARS
+
 # MANDATE 5.4: Pydantic Base Model for Type Checking and Validation
 class MessageIngestSchema(BaseModel):
     """
@@ -10,9 +12,11 @@ class MessageIngestSchema(BaseModel):
     discord_id: str = Field(..., description="Unique Discord ID of the message.")
     author_id: str = Field(..., description="Discord ID of the author.")
     channel_id: str = Field(..., description="Discord ID of the channel.")
+    guild_id: Optional[str] = Field(None, description="Discord ID of the guild (None for DMs).")
     
     # Message content length constraint is vital for performance (MANDATE 2.2)
-    content: str = Field(..., min_length=1, max_length=5000, 
+    # Long messages are accepted and stored as embedded chunks (see app/services/chunking.py)
+    content: str = Field(..., min_length=1, max_length=MAX_MESSAGE_CHARS, 
                          description="The actual text content of the message.")
     
     # MANDATE 1.4: Input validation function (5.4)
@@ -20,8 +24,8 @@ class MessageIngestSchema(BaseModel):
     @validator('content')
     def check_content_safety(cls, v):
         # Prevent huge messages from crashing the embedding service 
-        if len(v) > 4000:
-            raise ValueError("Content exceeds processing limit (4000 characters).")
+        if len(v) > MAX_MESSAGE_CHARS:
+            raise ValueError(f"Content exceeds processing limit ({MAX_MESSAGE_CHARS} characters).")
         # Basic check against potential injection (can be expanded)
         if "DROP TABLE" in v.upper():
             raise ValueError("Potential malicious input detected.")
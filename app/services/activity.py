@@ -0,0 +1,139 @@
+"""
+ACTIVITY ROLLUPS
+Pre-aggregated message counts so stats never scan discord_messages:
+activity_hourly (guild, channel, author, hour) and author_activity (lifetime
+totals per author). Ingestion increments both in the same transaction as
+the insert; rebuild_activity_rollups() recomputes them from scratch once
+(create_tables.py does this when they are empty).
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.models.activity import ActivityHourly, AuthorActivity
+
+
+def _hour(dt: datetime) -> datetime:
+    dt = dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def record_activity(db: Session, messages: Iterable[Tuple[Optional[str], str, str, datetime]]) -> None:
+    """
+    Adds (guild_id, channel_id, author_id, created_at) messages to the rollups.
+    Call inside the transaction that inserts the messages. Keys are upserted
+    in sorted order so concurrent ingesters lock rows in the same order.
+    """
+    hourly: Counter = Counter()
+    authors: Dict[str, List] = {}
+    for guild_id, channel_id, author_id, created_at in messages:
+        hourly[(guild_id or "0", channel_id, author_id, _hour(created_at))] += 1
+        first, last, count = authors.get(author_id, (created_at, created_at, 0))
+        authors[author_id] = [min(first, created_at), max(last, created_at), count + 1]
+    if not hourly:
+        return
+
+    statement = pg_insert(ActivityHourly).values([
+        {"guild_id": g, "channel_id": c, "author_id": a, "hour_start": h, "message_count": n}
+        for (g, c, a, h), n in sorted(hourly.items())
+    ])
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["guild_id", "channel_id", "author_id", "hour_start"],
+        set_={"message_count": ActivityHourly.message_count + statement.excluded.message_count},
+    ))
+    statement = pg_insert(AuthorActivity).values([
+        {"author_id": a, "first_message_at": first, "last_message_at": last, "message_count": n}
+        for a, (first, last, n) in sorted(authors.items())
+    ])
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["author_id"],
+        set_={
+            "message_count": AuthorActivity.message_count + statement.excluded.message_count,
+            "first_message_at": func.least(AuthorActivity.first_message_at, statement.excluded.first_message_at),
+            "last_message_at": func.greatest(AuthorActivity.last_message_at, statement.excluded.last_message_at),
+        },
+    ))
+
+
+def rebuild_activity_rollups(connection: Connection) -> int:
+    """
+    Recomputes both rollups from discord_messages. The exclusive lock makes
+    concurrent ingesters wait, so their increments land on the rebuilt rows.
+    Returns the number of hourly rows written.
+    """
+    connection.execute(text("LOCK TABLE activity_hourly, author_activity IN EXCLUSIVE MODE"))
+    connection.execute(text("TRUNCATE activity_hourly, author_activity"))
+    written = connection.execute(text("""
+        INSERT INTO activity_hourly (guild_id, channel_id, author_id, hour_start, message_count)
+        SELECT coalesce(guild_id, 0), channel_id, author_id, date_trunc('hour', created_at), count(*)
+        FROM discord_messages
+        GROUP BY 1, 2, 3, 4
+    """)).rowcount
+    connection.execute(text("""
+        INSERT INTO author_activity (author_id, message_count, first_message_at, last_message_at)
+        SELECT author_id, count(*), min(created_at), max(created_at)
+        FROM discord_messages
+        GROUP BY author_id
+    """))
+    return written
+
+
+def rollups_empty(connection: Connection) -> bool:
+    return connection.execute(text("SELECT NOT EXISTS (SELECT 1 FROM author_activity)")).scalar()
+
+
+# --- QUERIES ---
+def activity_totals(db: Session) -> Tuple[int, int]:
+    """(total messages, distinct authors)."""
+    total, authors = db.execute(
+        select(func.coalesce(func.sum(AuthorActivity.message_count), 0), func.count())
+        .select_from(AuthorActivity)
+    ).one()
+    return int(total), authors
+
+
+def guild_volume(db: Session, guild_id: str, days: int = 7) -> List[Tuple[datetime, int]]:
+    """Messages per day over the last `days` days, oldest first."""
+    since = _hour(datetime.now(timezone.utc)).replace(hour=0) - timedelta(days=days - 1)
+    day = func.date_trunc("day", ActivityHourly.hour_start)
+    return db.execute(
+        select(day, func.sum(ActivityHourly.message_count))
+        .where(ActivityHourly.guild_id == guild_id, ActivityHourly.hour_start >= since)
+        .group_by(day)
+        .order_by(day)
+    ).all()
+
+
+def top_channels(db: Session, guild_id: str, days: int = 7, limit: int = 3) -> List[Tuple[str, int]]:
+    """Most active channels of a guild over the last `days` days."""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    total = func.sum(ActivityHourly.message_count)
+    return db.execute(
+        select(ActivityHourly.channel_id, total)
+        .where(ActivityHourly.guild_id == guild_id, ActivityHourly.hour_start >= since)
+        .group_by(ActivityHourly.channel_id)
+        .order_by(total.desc())
+        .limit(limit)
+    ).all()
+
+
+def get_author_activity(db: Session, author_id: str) -> Optional[AuthorActivity]:
+    return db.get(AuthorActivity, author_id)
+
+
+def author_top_channels(db: Session, author_id: str, limit: int = 3) -> List[Tuple[str, int]]:
+    """An author's most used channels, all time."""
+    total = func.sum(ActivityHourly.message_count)
+    return db.execute(
+        select(ActivityHourly.channel_id, total)
+        .where(ActivityHourly.author_id == author_id)
+        .group_by(ActivityHourly.channel_id)
+        .order_by(total.desc())
+        .limit(limit)
+    ).all()
@@ -0,0 +1,236 @@
+"""
+LLM ADMISSION CONTROL
+Gatekeeper in front of every RAG answer (OpenAI embedding + chat call):
+  - token buckets per user and per guild cap how fast any one caller can spend
+    our rate limit,
+  - admitted requests wait in a weighted fair queue across guilds, so one busy
+    guild cannot starve the others,
+  - a global in-flight cap bounds concurrent LLM calls,
+  - under overload (queue full or wait too long) requests are shed immediately
+    with a canned reply instead of piling up.
+State is per process; with the sharded launcher each bot process enforces its
+own share.
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from app.core.logger import logger
+
+# --- CONFIGURATION ---
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "4"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "50"))
+LLM_MAX_QUEUE_WAIT = float(os.getenv("LLM_MAX_QUEUE_WAIT", "20"))
+# Requests per minute and burst size
+LLM_USER_RATE = float(os.getenv("LLM_USER_RATE", "6"))
+LLM_USER_BURST = float(os.getenv("LLM_USER_BURST", "3"))
+LLM_GUILD_RATE = float(os.getenv("LLM_GUILD_RATE", "60"))
+LLM_GUILD_BURST = float(os.getenv("LLM_GUILD_BURST", "10"))
+# Fair-queue weights, e.g. "123456789:2,987654321:0.5" (default weight 1)
+LLM_GUILD_WEIGHTS = {
+    guild_id.strip(): float(weight)
+    for guild_id, weight in (
+        pair.split(":") for pair in os.getenv("LLM_GUILD_WEIGHTS", "").split(",") if ":" in pair
+    )
+}
+# Buckets idle longer than this are full again and can be forgotten
+BUCKET_IDLE_SECONDS = 3600
+WAIT_SAMPLES = 1000
+
+DM_GUILD = "dm"
+
+SHED_REPLIES = {
+    "user_rate": "⏳ You're asking faster than I can think. Give me a moment and try again.",
+    "guild_rate": "⏳ This server has hit its question budget for now. Try again in a minute.",
+    "overload": "🌀 The substrate is overloaded right now. Please try again shortly.",
+    "queue_timeout": "🌀 The substrate is overloaded right now. Please try again shortly.",
+}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; `reason` is a key of SHED_REPLIES."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+    @property
+    def reply(self) -> str:
+        return SHED_REPLIES[self.reason]
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        # `now` may predate a bucket created after it was read
+        self.tokens = min(self.capacity, self.tokens + max(now - self.updated, 0.0) * self.rate)
+        self.updated = max(now, self.updated)
+
+    def available(self, now: float) -> bool:
+        self.refill(now)
+        return self.tokens >= 1.0
+
+    def take(self) -> None:
+        self.tokens -= 1.0
+
+
+class AdmissionController:
+    """
+    Token-bucket admission plus a weighted fair queue (virtual finish times)
+    feeding at most `max_inflight` concurrent LLM calls. Runs on one event loop.
+    """
+
+    def __init__(self, max_inflight: int = LLM_MAX_INFLIGHT, max_queue: int = LLM_MAX_QUEUE,
+                 max_wait: float = LLM_MAX_QUEUE_WAIT):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.user_buckets: Dict[str, TokenBucket] = {}
+        self.guild_buckets: Dict[str, TokenBucket] = {}
+
+        # Weighted fair queueing: each guild's requests get virtual finish times
+        # spaced 1/weight apart; the smallest finish time is served first.
+        self.queue: list = []  # heap of (finish, seq, future)
+        self.virtual_time = 0.0
+        self.last_finish: Dict[str, float] = {}
+        self.sequence = itertools.count()
+        self.inflight = 0
+
+        self.admitted = 0
+        self.rejected: Counter = Counter()
+        self.waits: deque = deque(maxlen=WAIT_SAMPLES)
+
+    def _bucket(self, buckets: Dict[str, TokenBucket], key: str, per_minute: float, burst: float) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(per_minute / 60.0, burst)
+        return bucket
+
+    def _prune(self, now: float) -> None:
+        for buckets in (self.user_buckets, self.guild_buckets):
+            for key in [k for k, b in buckets.items() if now - b.updated > BUCKET_IDLE_SECONDS]:
+                del buckets[key]
+        if not self.queue:
+            self.last_finish.clear()
+
+    def _queued(self) -> int:
+        """Waiters still queued; drops entries that timed out or were cancelled."""
+        if any(waiter.done() for _, _, waiter in self.queue):
+            self.queue = [entry for entry in self.queue if not entry[2].done()]
+            heapq.heapify(self.queue)
+        return len(self.queue)
+
+    def _reject(self, reason: str, user_id: str, guild_id: str) -> AdmissionRejected:
+        self.rejected[reason] += 1
+        logger.warning(f"LLM request shed ({reason}) user={user_id} guild={guild_id} "
+                       f"inflight={self.inflight} queued={self._queued()}")
+        return AdmissionRejected(reason)
+
+    def _admit(self, user_id: str, guild_id: str) -> None:
+        """Rate-limit check at arrival; takes one token from both buckets or raises."""
+        now = time.monotonic()
+        if len(self.user_buckets) + len(self.guild_buckets) > 10000:
+            self._prune(now)
+        user_bucket = self._bucket(self.user_buckets, user_id, LLM_USER_RATE, LLM_USER_BURST)
+        guild_bucket = self._bucket(self.guild_buckets, guild_id, LLM_GUILD_RATE, LLM_GUILD_BURST)
+        if not user_bucket.available(now):
+            raise self._reject("user_rate", user_id, guild_id)
+        if not guild_bucket.available(now):
+            raise self._reject("guild_rate", user_id, guild_id)
+        if self._queued() >= self.max_queue:
+            raise self._reject("overload", user_id, guild_id)
+        user_bucket.take()
+        guild_bucket.take()
+
+    def _dispatch(self) -> None:
+        """Grants free in-flight slots to the queued requests with the smallest finish time."""
+        while self.inflight < self.max_inflight and self.queue:
+            finish, _, waiter = heapq.heappop(self.queue)
+            if waiter.done():  # timed out or cancelled while queued
+                continue
+            self.virtual_time = finish
+            self.inflight += 1
+            waiter.set_result(None)
+
+    async def _acquire(self, user_id: str, guild_id: str) -> float:
+        self._admit(user_id, guild_id)
+        queued_at = time.monotonic()
+
+        weight = LLM_GUILD_WEIGHTS.get(guild_id, 1.0)
+        finish = max(self.virtual_time, self.last_finish.get(guild_id, 0.0)) + 1.0 / weight
+        self.last_finish[guild_id] = finish
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.queue, (finish, next(self.sequence), waiter))
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(waiter, timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            # Timed out right after being granted a slot: hand it back
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise self._reject("queue_timeout", user_id, guild_id)
+        except asyncio.CancelledError:
+            # Cancelled right after being granted a slot: hand it back
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+
+        wait = time.monotonic() - queued_at
+        self.waits.append(wait)
+        self.admitted += 1
+        return wait
+
+    def _release(self) -> None:
+        self.inflight -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, guild_id: Optional[str]):
+        """
+        Holds one in-flight LLM slot for the duration of the block.
+        Raises AdmissionRejected when the request is shed.
+        """
+        guild_key = guild_id or DM_GUILD
+        await self._acquire(user_id, guild_key)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        """Queue-wait percentiles (ms), rejection counts and current load."""
+        waits = sorted(self.waits)
+
+        def percentile(p: float) -> float:
+            return waits[min(len(waits) - 1, int(p * len(waits)))] * 1000 if waits else 0.0
+
+        return {
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "inflight": self.inflight,
+            "queued": self._queued(),
+            "wait_p50_ms": percentile(0.50),
+            "wait_p95_ms": percentile(0.95),
+            "wait_max_ms": waits[-1] * 1000 if waits else 0.0,
+        }
+
+
+def get_admission_controller() -> AdmissionController:
+    """Dependency function providing the process-wide controller."""
+    if not hasattr(get_admission_controller, 'instance'):
+        get_admission_controller.instance = AdmissionController()
+    return get_admission_controller.instance
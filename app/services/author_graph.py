@@ -0,0 +1,226 @@
+"""
+AUTHOR SIMILARITY GRAPH
+Precomputes each author's k nearest neighbours by idea centroid (mean message
+embedding; a long message counts once, as the mean of its chunks) into
+author_neighbors, so "who thinks like X" is a single indexed read.
+Centroids are averaged in Postgres; similarities come from blocked matmuls over
+the L2-normalised author matrix. Incremental refreshes only recompute authors
+whose centroid moved beyond a threshold, plus authors whose neighbour lists
+those moves can change.
+"""
+
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import select, func, delete, text, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from pgvector.sqlalchemy import Vector
+
+from app.core.logger import logger
+from app.core.partitions import searchable_criteria, chunk_searchable_criteria
+from app.models.message import DiscordMessage, MessageChunk
+from app.models.author_graph import AuthorCentroid, AuthorNeighbor
+
+# --- CONFIGURATION ---
+AUTHOR_GRAPH_K = int(os.getenv("AUTHOR_GRAPH_K", "10"))
+# Cosine distance a centroid must move before its neighbours are recomputed
+AUTHOR_GRAPH_MOVE_THRESHOLD = float(os.getenv("AUTHOR_GRAPH_MOVE_THRESHOLD", "0.02"))
+# Seconds between background refreshes (0 disables the refresh loop)
+AUTHOR_GRAPH_REFRESH_SECONDS = int(os.getenv("AUTHOR_GRAPH_REFRESH_SECONDS", "3600"))
+# Rows per similarity block (block x authors float32 scores in memory at once)
+AUTHOR_GRAPH_BLOCK = 1024
+
+# Serialises refreshes across bot processes
+_ADVISORY_LOCK_KEY = 0x4155544852  # "AUTHR"
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _message_vectors(author_ids: Optional[Set[str]] = None):
+    """
+    (author_id, message_id, embedding) per embedded message: the message's own
+    vector, or for long messages the mean of their chunk vectors.
+    """
+    by_author = [DiscordMessage.author_id.in_(author_ids)] if author_ids is not None else []
+    return union_all(
+        select(DiscordMessage.author_id, DiscordMessage.id.label("message_id"),
+               DiscordMessage.embedding.label("embedding"))
+        .where(*searchable_criteria(), *by_author),
+        select(DiscordMessage.author_id, MessageChunk.message_id,
+               func.avg(MessageChunk.embedding, type_=Vector()).label("embedding"))
+        .join(DiscordMessage, (DiscordMessage.id == MessageChunk.message_id)
+              & (DiscordMessage.created_at == MessageChunk.created_at))
+        .where(*chunk_searchable_criteria(), *by_author)
+        .group_by(MessageChunk.message_id, DiscordMessage.author_id),
+    ).subquery()
+
+
+def compute_author_centroids(db: Session, author_ids: Optional[Set[str]] = None
+                       ) -> Dict[str, Tuple[np.ndarray, int, int]]:
+    """author_id -> (mean embedding, message count, max message id), averaged in SQL."""
+    vectors = _message_vectors(author_ids)
+    statement = (
+        select(
+            vectors.c.author_id,
+            func.avg(vectors.c.embedding, type_=Vector()),
+            func.count(),
+            func.max(vectors.c.message_id),
+        )
+        .group_by(vectors.c.author_id)
+    )
+    return {
+        author_id: (np.asarray(centroid, dtype=np.float32), count, max_id)
+        for author_id, centroid, count, max_id in db.execute(statement).all()
+    }
+
+
+def _top_k(matrix: np.ndarray, rows: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """(neighbour indices, similarities) for each row, best first, self excluded."""
+    results = []
+    k = min(k, matrix.shape[0] - 1)
+    if k <= 0:
+        return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in rows]
+    for start in range(0, len(rows), AUTHOR_GRAPH_BLOCK):
+        block = rows[start:start + AUTHOR_GRAPH_BLOCK]
+        scores = matrix[block] @ matrix.T
+        scores[np.arange(len(block)), block] = -np.inf
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        for neighbours, sims in zip(np.take_along_axis(top, order, axis=1),
+                                    np.take_along_axis(top_scores, order, axis=1)):
+            results.append((neighbours, sims))
+    return results
+
+
+def refresh_author_graph(db: Session, k: int = AUTHOR_GRAPH_K, full: bool = False) -> Optional[Dict]:
+    """
+    Refreshes author centroids and the kNN graph. Returns refresh stats, or
+    None when another process holds the refresh lock.
+    """
+    if not db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _ADVISORY_LOCK_KEY}).scalar():
+        return None
+
+    stored = {
+        row.author_id: row for row in db.scalars(select(AuthorCentroid)).all()
+    }
+    if full or not stored:
+        fresh = compute_author_centroids(db)
+    else:
+        # Only authors with messages newer than the last refresh can have moved
+        watermark = max(row.max_message_id for row in stored.values())
+        changed = set(db.scalars(
+            select(DiscordMessage.author_id.distinct())
+            .where(DiscordMessage.id > watermark, *searchable_criteria())
+        ).all())
+        changed.update(db.scalars(
+            select(DiscordMessage.author_id.distinct())
+            .join(MessageChunk, (DiscordMessage.id == MessageChunk.message_id)
+                  & (DiscordMessage.created_at == MessageChunk.created_at))
+            .where(MessageChunk.message_id > watermark, *chunk_searchable_criteria())
+        ).all())
+        fresh = compute_author_centroids(db, changed) if changed else {}
+
+    # The stored centroid is the one the graph was built from; it is only
+    # replaced once the author has moved far enough to matter.
+    moved: Set[str] = set()
+    centroid_rows = []
+    for author_id, (centroid, count, max_id) in fresh.items():
+        previous = stored.get(author_id)
+        if previous is not None and not full:
+            old = np.asarray(previous.centroid, dtype=np.float32)
+            denominator = (np.linalg.norm(old) * np.linalg.norm(centroid)) or 1.0
+            if 1.0 - float(old @ centroid) / denominator <= AUTHOR_GRAPH_MOVE_THRESHOLD:
+                centroid = old
+            else:
+                moved.add(author_id)
+        else:
+            moved.add(author_id)
+        centroid_rows.append({"author_id": author_id, "centroid": centroid.tolist(),
+                              "message_count": count, "max_message_id": max_id})
+
+    if centroid_rows:
+        statement = pg_insert(AuthorCentroid).values(centroid_rows)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[AuthorCentroid.author_id],
+            set_={"centroid": statement.excluded.centroid,
+                  "message_count": statement.excluded.message_count,
+                  "max_message_id": statement.excluded.max_message_id,
+                  "updated_at": func.now()},
+        ))
+
+    if not moved:
+        db.commit()
+        return {"authors": len(stored), "moved": 0, "recomputed": 0}
+
+    # Full author matrix (stored centroids overlaid with this refresh's values)
+    author_ids = sorted(set(stored) | set(fresh))
+    position = {author_id: i for i, author_id in enumerate(author_ids)}
+    centroids = {row["author_id"]: row["centroid"] for row in centroid_rows}
+    counts = {a: r.message_count for a, r in stored.items()}
+    counts.update({row["author_id"]: row["message_count"] for row in centroid_rows})
+    matrix = _normalize(np.asarray(
+        [centroids[a] if a in centroids else stored[a].centroid for a in author_ids], dtype=np.float32
+    ))
+
+    if full:
+        recompute = set(author_ids)
+    else:
+        # Authors whose lists include a moved author, or whom a moved author
+        # now beats their current k-th neighbour, need new lists too.
+        edges = db.execute(select(AuthorNeighbor.author_id, AuthorNeighbor.neighbor_id,
+                                  AuthorNeighbor.similarity, AuthorNeighbor.rank)).all()
+        kth = np.full(len(author_ids), -np.inf, dtype=np.float32)  # short lists admit anyone
+        recompute = set(moved)
+        for author_id, neighbor_id, similarity, rank in edges:
+            if author_id not in position:
+                continue
+            if neighbor_id in moved:
+                recompute.add(author_id)
+            if rank == k:
+                kth[position[author_id]] = similarity
+
+        moved_rows = np.array([position[a] for a in moved])
+        for start in range(0, len(moved_rows), AUTHOR_GRAPH_BLOCK):
+            block = moved_rows[start:start + AUTHOR_GRAPH_BLOCK]
+            beaten = ((matrix[block] @ matrix.T) > kth[None, :]).any(axis=0)
+            recompute.update(author_ids[i] for i in np.flatnonzero(beaten))
+
+    rows = np.array(sorted(position[a] for a in recompute))
+    neighbor_rows = []
+    for row, (neighbours, sims) in zip(rows, _top_k(matrix, rows, k)):
+        author_id = author_ids[row]
+        for rank, (neighbour, sim) in enumerate(zip(neighbours, sims), 1):
+            neighbor_id = author_ids[neighbour]
+            neighbor_rows.append({"author_id": author_id, "rank": rank, "neighbor_id": neighbor_id,
+                                  "similarity": float(sim), "neighbor_message_count": counts[neighbor_id]})
+
+    recomputed_ids = [author_ids[row] for row in rows]
+    for start in range(0, len(recomputed_ids), AUTHOR_GRAPH_BLOCK):
+        db.execute(delete(AuthorNeighbor).where(
+            AuthorNeighbor.author_id.in_(recomputed_ids[start:start + AUTHOR_GRAPH_BLOCK])
+        ))
+    for start in range(0, len(neighbor_rows), 5000):
+        db.execute(pg_insert(AuthorNeighbor).values(neighbor_rows[start:start + 5000]))
+    db.commit()
+
+    stats = {"authors": len(author_ids), "moved": len(moved), "recomputed": len(recomputed_ids)}
+    logger.info(f"Author graph refreshed: {stats}")
+    return stats
+
+
+def get_similar_authors(db: Session, author_id: str, top_n: int = 5) -> List[Tuple[str, float, int]]:
+    """Reads (author_id, similarity, message_count) neighbours from the precomputed graph."""
+    rows = db.execute(
+        select(AuthorNeighbor.neighbor_id, AuthorNeighbor.similarity, AuthorNeighbor.neighbor_message_count)
+        .where(AuthorNeighbor.author_id == author_id)
+        .order_by(AuthorNeighbor.rank)
+        .limit(top_n)
+    ).all()
+    return [tuple(row) for row in rows]
@@ -0,0 +1,57 @@
+"""
+LONG MESSAGE CHUNKING
+Splits long posts (guides, write-ups) into overlapping chunks that are each
+embedded and stored in discord_message_chunks, instead of dropping them.
+"""
+
+import os
+import re
+from typing import List
+
+# --- CONFIGURATION ---
+# Messages longer than this are stored as chunks (the parent row gets no vector)
+LONG_MESSAGE_THRESHOLD = int(os.getenv("LONG_MESSAGE_THRESHOLD", "4000"))
+# Hard cap on what we accept at all (Discord's own limit is 4000 for Nitro users;
+# longer bodies come from forwarded/bridged content)
+MAX_MESSAGE_CHARS = int(os.getenv("MAX_MESSAGE_CHARS", "40000"))
+CHUNK_CHARS = int(os.getenv("CHUNK_CHARS", "1500"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+# Neighbouring chunks on each side pulled into RAG context around a hit
+CHUNK_CONTEXT_RADIUS = int(os.getenv("CHUNK_CONTEXT_RADIUS", "1"))
+
+# Preferred split points, strongest first
+_BOUNDARIES = [re.compile(r"\n\s*\n"), re.compile(r"\n"), re.compile(r"(?<=[.!?])\s"), re.compile(r"\s")]
+
+
+def needs_chunking(content: str) -> bool:
+    return len(content) > LONG_MESSAGE_THRESHOLD
+
+
+def split_into_chunks(content: str, size: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Splits text into chunks of at most `size` characters, each starting
+    `overlap` characters before the previous one ended. Cuts prefer paragraph,
+    line, sentence and word boundaries in the back half of the window.
+    """
+    chunks = []
+    start = 0
+    length = len(content)
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            window = content[start:end]
+            for boundary in _BOUNDARIES:
+                cuts = [m.end() for m in boundary.finditer(window) if m.end() >= size // 2]
+                if cuts:
+                    end = start + cuts[-1]
+                    break
+        chunk = content[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= length:
+            break
+        # Back up by `overlap`, then forward to the next word so chunks start cleanly
+        next_start = max(end - overlap, start + 1)
+        space = content.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return chunks
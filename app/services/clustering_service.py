@@ -16,7 +16,15 @@ from sklearn.cluster import KMeans
 from sklearn.metrics.pairwise import cosine_similarity
 
 from app.models.message import DiscordMessage
-from app.services.embedding_service import get_embedding_service
+from app.core.partitions import searchable_criteria
+from app.services.embedding_service import get_embedding_service, active_embedding
+from app.services.snapshot_service import CorpusSnapshot
+from app.services.author_graph import get_similar_authors, compute_author_centroids
+from app.services.activity import activity_totals
+from app.core.profiling import span
+
+# Optional: run clustering against an exported snapshot instead of Postgres
+CLUSTERING_SNAPSHOT_PATH = os.getenv("CLUSTERING_SNAPSHOT_PATH")
 
 
 @dataclass
@@ -27,6 +35,25 @@ class TopicCluster:
     representative_messages: List[str]
     top_authors: List[Tuple[str, int]]  # (author_id, message_count)
     centroid: np.ndarray
+    
+    def to_dict(self) -> Dict:
+        """JSON-safe form for job results (the centroid is not shipped)."""
+        return {
+            "cluster_id": self.cluster_id,
+            "message_count": self.message_count,
+            "representative_messages": self.representative_messages,
+            "top_authors": [list(a) for a in self.top_authors],
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TopicCluster":
+        return cls(
+            cluster_id=data["cluster_id"],
+            message_count=data["message_count"],
+            representative_messages=data["representative_messages"],
+            top_authors=[tuple(a) for a in data["top_authors"]],
+            centroid=None
+        )
 
 
 @dataclass
@@ -42,16 +69,24 @@ class ClusteringService:
     """
     Provides semantic analysis through clustering of vector embeddings.
     Implements: Topic discovery, author profiling, similarity matching.
+    When constructed with a CorpusSnapshot, all reads come from the memory-mapped
+    snapshot and Postgres is never queried.
     """
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Optional[Session], snapshot: Optional[CorpusSnapshot] = None):
         self.db = db
+        self.snapshot = snapshot
         self.embedding_service = get_embedding_service()
     
     def get_all_embeddings(self) -> Tuple[List[DiscordMessage], np.ndarray]:
-        """Fetch all messages with their embeddings."""
+        """Fetch all messages with their embeddings (hot partitions only)."""
+        if self.snapshot is not None:
+            return self.snapshot.messages(), self.snapshot.embeddings
+        
         messages = self.db.scalars(
-            select(DiscordMessage).order_by(DiscordMessage.created_at.desc())
+            select(DiscordMessage)
+            .where(*searchable_criteria())
+            .order_by(DiscordMessage.created_at.desc())
         ).all()
         
         if not messages:
@@ -72,7 +107,8 @@ class ClusteringService:
         
         # Fit K-means
         kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-        labels = kmeans.fit_predict(embeddings)
+        with span("sklearn", "kmeans"):
+            labels = kmeans.fit_predict(embeddings)
         
         clusters = []
         for cluster_id in range(n_clusters):
@@ -111,26 +147,36 @@ class ClusteringService:
         Build semantic profile for an author.
         Their "idea fingerprint" is the average of all their message embeddings.
         """
-        messages = self.db.scalars(
-            select(DiscordMessage)
-            .where(DiscordMessage.author_id == author_id)
-            .order_by(DiscordMessage.created_at.desc())
-        ).all()
+        if self.snapshot is not None:
+            indices = self.snapshot.author_indices(author_id)
+            if len(indices) == 0:
+                return None
+            return AuthorProfile(
+                author_id=author_id,
+                message_count=len(indices),
+                idea_centroid=np.mean(self.snapshot.embeddings[np.sort(indices)], axis=0),
+                sample_messages=[m.content[:200] for m in self.snapshot.messages(indices[:5])]
+            )
         
-        if not messages:
+        # Averaged in SQL; long messages count through the mean of their chunks
+        centroid = compute_author_centroids(self.db, {author_id}).get(author_id)
+        if centroid is None:
             return None
-        
-        embeddings = np.array([msg.embedding for msg in messages])
-        idea_centroid = np.mean(embeddings, axis=0)
+        idea_centroid, message_count, _ = centroid
         
         # Get sample messages (most recent)
-        samples = [msg.content[:200] for msg in messages[:5]]
+        samples = self.db.scalars(
+            select(DiscordMessage.content)
+            .where(DiscordMessage.author_id == author_id)
+            .order_by(DiscordMessage.created_at.desc())
+            .limit(5)
+        ).all()
         
         return AuthorProfile(
             author_id=author_id,
-            message_count=len(messages),
+            message_count=message_count,
             idea_centroid=idea_centroid,
-            sample_messages=samples
+            sample_messages=[content[:200] for content in samples]
         )
     
     def find_similar_thinkers(self, author_id: str, top_n: int = 5
@@ -138,34 +184,37 @@ class ClusteringService:
         """
         Find authors with similar thinking patterns.
         Returns list of (author_id, similarity_score, message_count).
+        Reads the precomputed author graph (app/services/author_graph.py) and
+        falls back to one vectorised pass over all centroids when it is empty.
         """
+        if self.snapshot is None:
+            neighbours = get_similar_authors(self.db, author_id, top_n)
+            if neighbours:
+                return neighbours
+        
         target_profile = self.get_author_profile(author_id)
         if target_profile is None:
             return []
         
-        # Get all unique authors
-        authors = self.db.execute(
-            select(DiscordMessage.author_id, func.count(DiscordMessage.id))
-            .group_by(DiscordMessage.author_id)
-        ).all()
-        
-        similarities = []
-        for other_author_id, msg_count in authors:
-            if other_author_id == author_id:
-                continue
-            
-            other_profile = self.get_author_profile(other_author_id)
-            if other_profile is None:
-                continue
-            
-            # Compute cosine similarity between idea centroids
-            sim = cosine_similarity(
-                target_profile.idea_centroid.reshape(1, -1),
-                other_profile.idea_centroid.reshape(1, -1)
-            )[0][0]
-            
-            similarities.append((other_author_id, float(sim), msg_count))
+        authors = self._author_counts()
+        others = [a for a in authors if a != author_id]
+        profiles = [self.get_author_profile(a) for a in others] if self.snapshot is not None else None
+        if profiles is not None:
+            pairs = [(a, p.idea_centroid) for a, p in zip(others, profiles) if p is not None]
+        else:
+            # Centroids for every author in one aggregate query
+            pairs = [
+                (a, centroid) for a, (centroid, _, _) in compute_author_centroids(self.db).items()
+                if a != author_id
+            ]
+        if not pairs:
+            return []
         
+        # Compute cosine similarity between idea centroids
+        sims = cosine_similarity(
+            target_profile.idea_centroid.reshape(1, -1), np.stack([c for _, c in pairs])
+        )[0]
+        similarities = [(a, float(s), authors.get(a, 0)) for (a, _), s in zip(pairs, sims)]
         return sorted(similarities, key=lambda x: x[1], reverse=True)[:top_n]
     
     def attribute_idea(self, idea_text: str, top_n: int = 3
@@ -179,9 +228,7 @@ class ClusteringService:
         idea_vec = np.array(idea_embedding).reshape(1, -1)
         
         # Get all unique authors with their profiles
-        authors = self.db.execute(
-            select(DiscordMessage.author_id).distinct()
-        ).scalars().all()
+        authors = list(self._author_counts())
         
         attributions = []
         for author_id in authors:
@@ -197,21 +244,41 @@ class ClusteringService:
         
         return sorted(attributions, key=lambda x: x[1], reverse=True)[:top_n]
     
+    def _author_counts(self) -> Dict[str, int]:
+        """Message count per author, from the snapshot or the database."""
+        if self.snapshot is not None:
+            return self.snapshot.author_counts()
+        return dict(self.db.execute(
+            select(DiscordMessage.author_id, func.count(DiscordMessage.id))
+            .group_by(DiscordMessage.author_id)
+        ).all())
+    
     def get_cluster_summary(self) -> Dict:
         """Get overall clustering statistics."""
-        total_messages = self.db.scalar(select(func.count(DiscordMessage.id)))
-        unique_authors = self.db.scalar(
-            select(func.count(func.distinct(DiscordMessage.author_id)))
-        )
+        if self.snapshot is not None:
+            total = len(self.snapshot)
+            return {
+                "total_messages": total,
+                "unique_authors": len(self.snapshot.author_counts()),
+                "embeddings_dimension": self.snapshot.embeddings.shape[1],
+                "status": "snapshot" if total > 0 else "awaiting data"
+            }
+        
+        # Rollup tables: one row per author instead of a scan of every message
+        total_messages, unique_authors = activity_totals(self.db)
         
         return {
             "total_messages": total_messages or 0,
             "unique_authors": unique_authors or 0,
-            "embeddings_dimension": 1536,
+            "embeddings_dimension": active_embedding().dimension,
             "status": "active" if total_messages and total_messages > 0 else "awaiting data"
         }
 
 
 def get_clustering_service(db: Session) -> ClusteringService:
     """Dependency injection for clustering service."""
+    if CLUSTERING_SNAPSHOT_PATH:
+        if not hasattr(get_clustering_service, 'snapshot'):
+            get_clustering_service.snapshot = CorpusSnapshot(CLUSTERING_SNAPSHOT_PATH)
+        return ClusteringService(db, snapshot=get_clustering_service.snapshot)
     return ClusteringService(db)
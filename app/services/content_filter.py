@@ -0,0 +1,225 @@
+"""
+PRE-EMBEDDING CONTENT FILTER
+Decides, before paying for an embedding, whether a message is worth a vector:
+  - low-information messages ("+1", lone emoji, bare links) are stored
+    without an embedding (or skipped entirely),
+  - near-duplicates of recently embedded messages (pasted walls, spam) are
+    stored without an embedding and linked to the original via duplicate_of.
+Near-duplicates are found with 64-bit SimHash over word shingles and a banded
+lookup over a bounded recent-window index per guild.
+"""
+
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict, deque, Counter
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Sequence, Set, Tuple
+
+# --- CONFIGURATION ---
+FILTER_ENABLED = os.getenv("CONTENT_FILTER_ENABLED", "true").lower() == "true"
+# Alphanumeric characters left after removing URLs, mentions and emoji
+MIN_INFORMATIVE_CHARS = int(os.getenv("MIN_INFORMATIVE_CHARS", "6"))
+# "store" keeps low-information rows (without a vector) for history; "skip" drops them
+LOW_INFO_ACTION = os.getenv("LOW_INFO_ACTION", "store")
+if LOW_INFO_ACTION not in ("store", "skip"):
+    raise ValueError(f"LOW_INFO_ACTION must be 'store' or 'skip', not {LOW_INFO_ACTION!r}.")
+NEAR_DUP_MAX_DISTANCE = int(os.getenv("NEAR_DUP_MAX_DISTANCE", "6"))
+NEAR_DUP_MIN_TOKENS = int(os.getenv("NEAR_DUP_MIN_TOKENS", "8"))
+# Recent fingerprints kept per guild, and guilds kept (least recently active evicted)
+NEAR_DUP_WINDOW = int(os.getenv("NEAR_DUP_WINDOW", "20000"))
+NEAR_DUP_MAX_GUILDS = int(os.getenv("NEAR_DUP_MAX_GUILDS", "1000"))
+
+SHINGLE_SIZE = 2
+SIMHASH_BITS = 64
+# 8 bands x 8 bits: by pigeonhole, any pair within 7 bits shares at least one band
+SIMHASH_BANDS = 8
+_BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+URL_PATTERN = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
+MENTION_PATTERN = re.compile(r"<(?:@[!&]?|#)\d+>")
+CUSTOM_EMOJI_PATTERN = re.compile(r"<a?:\w+:\d+>")
+SHORTCODE_EMOJI_PATTERN = re.compile(r":[a-z0-9_+\-]+:", re.IGNORECASE)
+UNICODE_EMOJI_PATTERN = re.compile(
+    "[\U0001F000-\U0001FAFF\U00002600-\U000027BF\u200d\ufe0f]"
+)
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+@dataclass
+class FilterDecision:
+    """Outcome of the pre-embedding stage for one message."""
+    action: str                        # "embed" | "store" | "skip"
+    reason: str                        # "ok" | "low_info" | "emoji_only" | "url_only" | "near_duplicate"
+    fingerprint: Optional[int] = None  # SimHash, set when the text is long enough to fingerprint
+    duplicate_of: Optional[int] = None # discord_messages.id of the near-duplicate original
+    # Index of the original within the same evaluate_batch() call (its id is not known yet)
+    duplicate_in_batch: Optional[int] = None
+
+
+def informative_text(content: str) -> str:
+    """Strips URLs, mentions and emoji, leaving the words that carry meaning."""
+    text = URL_PATTERN.sub(" ", content)
+    text = MENTION_PATTERN.sub(" ", text)
+    text = CUSTOM_EMOJI_PATTERN.sub(" ", text)
+    text = SHORTCODE_EMOJI_PATTERN.sub(" ", text)
+    return UNICODE_EMOJI_PATTERN.sub(" ", text)
+
+
+def simhash(tokens) -> int:
+    """64-bit SimHash over word shingles."""
+    if len(tokens) >= SHINGLE_SIZE:
+        shingles = [" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)]
+    else:
+        shingles = tokens
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+class _Window:
+    """One guild's recent fingerprints and their band index."""
+    __slots__ = ("recent", "bands")
+
+    def __init__(self):
+        self.recent: deque = deque()  # (fingerprint, message_id), oldest first
+        self.bands: Dict[Tuple[int, int], Set[Tuple[int, int]]] = {}
+
+
+class ContentFilter:
+    """
+    Stateful filter holding a recent-window SimHash index per guild: retrieval
+    is scoped to one guild, so a message may only be deduplicated against
+    messages of its own guild (DMs share the None window).
+    """
+
+    def __init__(self, window: int = NEAR_DUP_WINDOW, max_guilds: int = NEAR_DUP_MAX_GUILDS):
+        self.window = window
+        self.max_guilds = max_guilds
+        self.windows: "OrderedDict[Optional[str], _Window]" = OrderedDict()  # LRU order
+        self.stats: Counter = Counter()
+        self.lock = threading.Lock()
+
+    def _band_keys(self, fingerprint: int):
+        return [(band, (fingerprint >> (band * _BAND_BITS)) & _BAND_MASK) for band in range(SIMHASH_BANDS)]
+
+    def find_near_duplicate(self, fingerprint: int, guild_id: Optional[str] = None) -> Optional[int]:
+        """Returns the id of a recent message of the guild within NEAR_DUP_MAX_DISTANCE bits, if any."""
+        with self.lock:
+            window = self.windows.get(guild_id)
+            if window is None:
+                return None
+            candidates = set()
+            for key in self._band_keys(fingerprint):
+                candidates |= window.bands.get(key, set())
+        best = None
+        for other, message_id in candidates:
+            distance = (fingerprint ^ other).bit_count()
+            if distance <= NEAR_DUP_MAX_DISTANCE and (best is None or distance < best[0]):
+                best = (distance, message_id)
+        return best[1] if best else None
+
+    def remember(self, fingerprint: Optional[int], message_id: int, guild_id: Optional[str] = None) -> None:
+        """Adds an embedded message to its guild's window, evicting the oldest entry."""
+        if fingerprint is None:
+            return
+        entry = (fingerprint, message_id)
+        with self.lock:
+            window = self.windows.get(guild_id)
+            if window is None:
+                window = self.windows[guild_id] = _Window()
+                while len(self.windows) > self.max_guilds:
+                    self.windows.popitem(last=False)
+            else:
+                self.windows.move_to_end(guild_id)
+            window.recent.append(entry)
+            for key in self._band_keys(fingerprint):
+                window.bands.setdefault(key, set()).add(entry)
+            while len(window.recent) > self.window:
+                old = window.recent.popleft()
+                for key in self._band_keys(old[0]):
+                    bucket = window.bands.get(key)
+                    if bucket is not None:
+                        bucket.discard(old)
+                        if not bucket:
+                            del window.bands[key]
+
+    def evaluate(self, content: str, guild_id: Optional[str] = None) -> FilterDecision:
+        """Classifies a message before embedding."""
+        decision = self._evaluate(content, guild_id)
+        self.stats[decision.reason] += 1
+        return decision
+
+    def evaluate_batch(self, contents: Sequence[str],
+                       guild_ids: Optional[Sequence[Optional[str]]] = None) -> List[FilterDecision]:
+        """
+        Classifies a batch before embedding (guild_ids parallel to contents).
+        Fingerprints are registered as the batch is evaluated, so a
+        near-duplicate of an earlier message of the same guild in the batch is
+        not embedded either (it points at it through duplicate_in_batch until
+        the original has an id).
+        """
+        if guild_ids is None:
+            guild_ids = [None] * len(contents)
+        decisions: List[FilterDecision] = []
+        # guild -> (fingerprint, batch index) of its messages to embed
+        pending: Dict[Optional[str], List[Tuple[int, int]]] = {}
+        for index, (content, guild_id) in enumerate(zip(contents, guild_ids)):
+            decision = self._evaluate(content, guild_id)
+            if decision.action == "embed" and decision.fingerprint is not None:
+                earlier = pending.setdefault(guild_id, [])
+                original = min(
+                    ((fingerprint ^ decision.fingerprint).bit_count(), i) for fingerprint, i in earlier
+                ) if earlier else None
+                if original is not None and original[0] <= NEAR_DUP_MAX_DISTANCE:
+                    decision = FilterDecision("store", "near_duplicate", decision.fingerprint,
+                                              duplicate_in_batch=original[1])
+                else:
+                    earlier.append((decision.fingerprint, index))
+            self.stats[decision.reason] += 1
+            decisions.append(decision)
+        return decisions
+
+    def _evaluate(self, content: str, guild_id: Optional[str]) -> FilterDecision:
+        if not FILTER_ENABLED:
+            return FilterDecision("embed", "ok")
+
+        remaining = informative_text(content)
+        informative_chars = sum(1 for ch in remaining if ch.isalnum())
+        if informative_chars < MIN_INFORMATIVE_CHARS:
+            stripped = content.strip()
+            if URL_PATTERN.fullmatch(stripped):
+                reason = "url_only"
+            elif not remaining.strip():
+                reason = "emoji_only"
+            else:
+                reason = "low_info"
+            return FilterDecision(LOW_INFO_ACTION, reason)
+
+        tokens = TOKEN_PATTERN.findall(remaining.lower())
+        if len(tokens) < NEAR_DUP_MIN_TOKENS:
+            return FilterDecision("embed", "ok")
+
+        fingerprint = simhash(tokens)
+        original = self.find_near_duplicate(fingerprint, guild_id)
+        if original is not None:
+            return FilterDecision("store", "near_duplicate", fingerprint, original)
+        return FilterDecision("embed", "ok", fingerprint)
+
+
+def get_content_filter() -> ContentFilter:
+    """Dependency function providing the process-wide filter (and its window index)."""
+    if not hasattr(get_content_filter, 'instance'):
+        get_content_filter.instance = ContentFilter()
+    return get_content_filter.instance
@@ -1,52 +1,132 @@
 import os
-import logging
-from typing import List, Dict, Any
+import time
+import threading
+from collections import Counter
+from datetime import timedelta
+from typing import List, Dict, Any, NamedTuple, Optional
+
+import numpy as np
 
 # --- CORE DEPENDENCIES ---
-from openai import OpenAI 
-from openai import APIError
+# The openai package is imported on first use (see EmbeddingService) for faster cold start
+from sqlalchemy import update, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session 
 
 # Import message model
-from app.models.message import DiscordMessage 
+from app.models.message import DiscordMessage, MessageChunk, EMBEDDING_DIMENSION
+from app.services.chunking import needs_chunking, split_into_chunks, MAX_MESSAGE_CHARS
+from app.services.vector_index import get_vector_index_cache, IndexedMessage
+from app.services.content_filter import get_content_filter
+from app.services.recent_context import get_recent_context_buffer
+from app.services.activity import record_activity
+from app.services.topic_matrix import record_topics
+from app.core.profiling import span
+from app.core.snowflakes import snowflake_time
+from app.core.logger import logger
 
 # --- CONFIGURATION ---
-EMBEDDING_MODEL = "text-embedding-3-small"
-EMBEDDING_DIMENSION = 1536 # The size of the vector from this model
+# Model used until embedding_state records another (see app/services/reembedding.py);
+# EMBEDDING_DIMENSION (app/models/message.py) is the size of its vectors
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# How often each process re-reads the active model, i.e. how long a switch takes to propagate
+EMBEDDING_STATE_TTL = float(os.getenv("EMBEDDING_STATE_TTL", "15"))
+# Point at any OpenAI-compatible server (e.g. `python stub_openai.py` for offline/perf runs)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+
+
+def create_openai_client():
+    """OpenAI client honouring OPENAI_BASE_URL; a stub endpoint needs no real key."""
+    from openai import OpenAI
+    api_key = os.getenv("OPENAI_API_KEY") or ("stub" if OPENAI_BASE_URL else None)
+    return OpenAI(api_key=api_key, base_url=OPENAI_BASE_URL or None)
+
+class ActiveEmbedding(NamedTuple):
+    model: str
+    dimension: int
+    generation: int  # bumped by every re-embedding switch
+
+
+_active = {"value": ActiveEmbedding(EMBEDDING_MODEL, EMBEDDING_DIMENSION, 0), "checked_at": float("-inf")}
+_active_lock = threading.Lock()
+
+
+def active_embedding() -> ActiveEmbedding:
+    """
+    The model every stored vector comes from, so queries and new messages
+    must be embedded with it. Read from embedding_state at most every
+    EMBEDDING_STATE_TTL seconds; the env defaults apply until that row exists.
+    """
+    with _active_lock:
+        if time.monotonic() - _active["checked_at"] < EMBEDDING_STATE_TTL:
+            return _active["value"]
+        _active["checked_at"] = time.monotonic()
+    try:
+        from app.core.database import SessionLocal
+        from app.models.embedding_state import EmbeddingState
+        db = SessionLocal()
+        try:
+            state = db.get(EmbeddingState, EmbeddingState.SINGLETON_ID)
+        finally:
+            db.close()
+        if state is not None:
+            value = ActiveEmbedding(state.active_model, state.active_dimension, state.generation)
+            with _active_lock:
+                if value != _active["value"]:
+                    logger.info(f"Active embedding model: {value.model} ({value.dimension} dims, "
+                                f"generation {value.generation})", extra={"event": "embedding.active"})
+                _active["value"] = value
+    except Exception as e:
+        logger.warning(f"Could not read embedding_state, keeping {_active['value'].model}: {e}")
+    return _active["value"]
+
 
 # MANDATE 2.1: Structured Error Hierarchy 
 class AppError(Exception):
     """Base application error with logging context"""
     def __init__(self, message: str, context: Dict[str, Any] = None):
         self.context = context or {}
-        print(f"AppError: {message} Context: {self.context}") 
+        logger.error(f"AppError: {message} Context: {self.context}", extra={"event": "app_error"})
         super().__init__(message)
 
 # MANDATE 4.2: Single Responsibility Law
 class EmbeddingService:
     def __init__(self):
         """
-        Initializes the OpenAI client. This happens once when the bot starts.
+        Initializes the OpenAI client. This happens once, on first use.
         The client automatically finds the OPENAI_API_KEY from the environment.
         """
         try:
-            self.client = OpenAI()
-            print(f"✅ OpenAI Embedding client initialized with model: {EMBEDDING_MODEL}")
+            self.client = create_openai_client()
+            logger.info(f"✅ OpenAI Embedding client initialized (default model: {EMBEDDING_MODEL})"
+                        + (f" ({OPENAI_BASE_URL})" if OPENAI_BASE_URL else ""))
         except Exception as e:
             raise AppError(f"CRITICAL: Failed to initialize OpenAI client: {e}")
 
-    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+    def embed_batch(self, texts: List[str], model: Optional[str] = None,
+                    dimensions: Optional[int] = None, timeout: Optional[float] = None) -> List[List[float]]:
         """
         Converts a list of texts into a list of embedding vectors using the OpenAI API.
+        Defaults to the active model; the re-embedding backfill passes its target.
+        A timeout (seconds, no retries) bounds calls made on behalf of a waiting user.
         """
         if not texts:
             return []
-            
+        if model is None:
+            model, dimensions, _ = active_embedding()
+        # text-embedding-3 models can shorten their output; older ones reject the parameter
+        extra = {"dimensions": dimensions} if dimensions and model.startswith("text-embedding-3") else {}
+        
+        from openai import APIError
         try:
-            response = self.client.embeddings.create(
-                input=texts,
-                model=EMBEDDING_MODEL
-            )
+            client = self.client.with_options(timeout=timeout, max_retries=0) if timeout else self.client
+            with span("openai", "embeddings"):
+                response = client.embeddings.create(
+                    input=texts,
+                    model=model,
+                    **extra
+                )
             return [data.embedding for data in response.data]
             
         except APIError as e:
@@ -70,12 +150,15 @@ def get_embedding_service() -> EmbeddingService:
     
 # --- Service Function for Message Ingestion ---
 
-async def process_and_store_message(
+def process_and_store_message(
     db: Session, 
     discord_message_id: str,
     author_id: str,
     channel_id: str,
-    content: str
+    content: str,
+    guild_id: Optional[str] = None,
+    reply_to: Optional[str] = None,
+    reaction_count: int = 0
 ):
     """
     Generates an embedding for a single message and saves it to the database.
@@ -86,43 +169,298 @@ async def process_and_store_message(
         author_id: Discord user ID of the message author
         channel_id: Discord channel ID where message was sent
         content: The message text content
+        guild_id: Discord guild ID (None for DMs)
+        reply_to: Discord ID of the message this one replies to, if any
+        reaction_count: Reactions already on the message (history backfills)
     """
     # Validate input
     if not content or not content.strip():
-        print("⚠️  Skipping message due to empty content.")
+        logger.info("⚠️  Skipping message due to empty content.", extra={"event": "ingest.skipped"})
+        return
+
+    # Check for content length (long posts are chunked, only absurd bodies are dropped)
+    if len(content) > MAX_MESSAGE_CHARS:
+        logger.warning(f"⚠️  Skipping message due to excessive length: {len(content)} characters",
+                       extra={"event": "ingest.skipped", "discord_id": discord_message_id})
         return
 
-    # Check for content length
-    if len(content) > 4000:
-        print(f"⚠️  Skipping message due to excessive length: {len(content)} characters")
+    # Pre-embedding stage: low-information and near-duplicate messages get no vector
+    content_filter = get_content_filter()
+    decision = content_filter.evaluate(content, guild_id)
+    if decision.action == "skip":
         return
 
     embedding_service = get_embedding_service()
 
     try:
-        # 1. Generate the Vector Embedding
-        embedding_vector = embedding_service.embed_batch([content])[0]
+        # 1. Generate the Vector Embedding (only for messages that pass the filter).
+        #    Long messages are split and all chunks are embedded in one batch call.
+        embedding_vector = None
+        chunks, chunk_vectors = [], []
+        if decision.action == "embed" and needs_chunking(content):
+            chunks = split_into_chunks(content)
+            chunk_vectors = embedding_service.embed_batch(chunks)
+        elif decision.action == "embed":
+            embedding_vector = embedding_service.embed_batch([content])[0]
 
         # 2. Create the Database Record (matching your model fields)
         new_message = DiscordMessage(
             discord_id=discord_message_id,
             author_id=author_id,
             channel_id=channel_id,
+            guild_id=guild_id,
             content=content,
-            embedding=embedding_vector  # This matches your model's field name
+            embedding=embedding_vector,  # This matches your model's field name
+            duplicate_of=decision.duplicate_of,
+            reply_to=reply_to,
+            reaction_count=reaction_count,
+            # Send time from the snowflake: re-deliveries hit the unique key and
+            # backfilled history lands in the right partition
+            created_at=snowflake_time(discord_message_id)
         )
 
-        # 3. Commit to Database
+        # 3. Commit to Database (flush first so chunks can reference the parent id)
         db.add(new_message)
+        if chunks:
+            db.flush()
+            db.add_all([
+                MessageChunk(message_id=new_message.id, guild_id=guild_id, chunk_index=i,
+                             content=chunk, embedding=vector, created_at=new_message.created_at)
+                for i, (chunk, vector) in enumerate(zip(chunks, chunk_vectors))
+            ])
+        if reply_to:
+            _increment_reply_counts(db, {reply_to: 1})
+        record_activity(db, [(guild_id, channel_id, author_id, new_message.created_at)])
+        record_topics(db, [(author_id, channel_id, np.mean(chunk_vectors, axis=0) if chunks else embedding_vector)])
         db.commit()
-        print(f"✅ Message {discord_message_id} embedded and stored successfully")
+
+        if embedding_vector is None and not chunks:
+            logger.info(f"✅ Message {discord_message_id} stored without embedding ({decision.reason})",
+                        extra={"event": "ingest.stored", "discord_id": discord_message_id,
+                               "filter_reason": decision.reason})
+            return
+
+        # 4. Keep the hot-guild vector cache, near-duplicate window and the
+        #    channel's recent-context buffer current
+        content_filter.remember(decision.fingerprint, new_message.id, guild_id)
+        recent = get_recent_context_buffer()
+        if recent is not None:
+            recent.attach_vector(channel_id, discord_message_id,
+                                 np.mean(chunk_vectors, axis=0) if chunks else embedding_vector)
+        cache = get_vector_index_cache()
+        if cache is not None:
+            if chunks:
+                for i, (chunk, vector) in enumerate(zip(chunks, chunk_vectors)):
+                    cache.add_message(guild_id, IndexedMessage(
+                        new_message.id, author_id, channel_id, new_message.created_at, chunk, i
+                    ), vector)
+            else:
+                cache.add_message(guild_id, IndexedMessage(
+                    new_message.id, author_id, channel_id, new_message.created_at, content
+                ), embedding_vector)
+        logger.info(f"✅ Message {discord_message_id} embedded and stored successfully"
+                    + (f" ({len(chunks)} chunks)" if chunks else ""),
+                    extra={"event": "ingest.stored", "discord_id": discord_message_id, "chunks": len(chunks)})
+
+    except IntegrityError:
+        # Same snowflake, same created_at: a re-delivered message already stored
+        db.rollback()
+        logger.info(f"⚠️  Message {discord_message_id} already stored, skipping.",
+                    extra={"event": "ingest.skipped", "discord_id": discord_message_id})
 
     except AppError as e:
-        print(f"❌ Embedding generation failed: {e}")
+        logger.error(f"❌ Embedding generation failed: {e}", extra={"event": "ingest.failed"})
         db.rollback()
         raise
 
     except Exception as e:
         db.rollback()
-        print(f"❌ Database error during message save: {e}")
-        raise
\ No newline at end of file
+        logger.error(f"❌ Database error during message save: {e}", extra={"event": "ingest.failed"})
+        raise
+
+
+def _message_criteria(discord_id: str) -> list:
+    """Looks a message up by Discord ID; rows are stamped with their snowflake
+    send time (legacy rows with a later ingestion time), so it prunes older partitions."""
+    return [DiscordMessage.discord_id == discord_id,
+            DiscordMessage.created_at >= snowflake_time(discord_id) - timedelta(minutes=1)]
+
+
+def _increment_reply_counts(db: Session, replies: Dict[str, int]) -> None:
+    """Adds reply counts to parent messages (caller commits)."""
+    for parent_id, count in replies.items():
+        db.execute(
+            update(DiscordMessage)
+            .where(*_message_criteria(parent_id))
+            .values(reply_count=DiscordMessage.reply_count + count)
+        )
+
+
+def adjust_reaction_counts(db: Session, deltas: Dict[str, int]) -> None:
+    """Applies net reaction changes (adds minus removes) per Discord message ID in one commit."""
+    # Sorted: concurrent flushes lock rows in the same order
+    for discord_message_id, delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        db.execute(
+            update(DiscordMessage)
+            .where(*_message_criteria(discord_message_id))
+            .values(reaction_count=func.greatest(DiscordMessage.reaction_count + delta, 0))
+        )
+    db.commit()
+
+
+def backfill_guild_ids(db: Session, guild_id: str, channel_ids: List[str]) -> int:
+    """Stamps guild_id onto legacy rows from the guild's known channels."""
+    if not channel_ids:
+        return 0
+    result = db.execute(
+        update(DiscordMessage)
+        .where(DiscordMessage.guild_id.is_(None), DiscordMessage.channel_id.in_(channel_ids))
+        .values(guild_id=guild_id)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def store_message_batch(db: Session, items: List[Dict[str, Any]]) -> int:
+    """
+    Embeds many messages with one API call and bulk-inserts them.
+    Used by queue workers; re-running a batch is safe (existing rows are skipped).
+    Each item carries the keyword arguments of process_and_store_message.
+    created_at is the snowflake send time, so replays hit the
+    (discord_id, created_at) unique constraint instead of duplicating.
+    Returns the number of rows inserted.
+    """
+    items = [
+        item for item in items
+        if item.get("content") and item["content"].strip() and len(item["content"]) <= MAX_MESSAGE_CHARS
+    ]
+    content_filter = get_content_filter()
+    kept = list(zip(items, content_filter.evaluate_batch([item["content"] for item in items],
+                                                         [item.get("guild_id") for item in items])))
+    # Near-duplicates within the batch point at their original's position until it has an id
+    batch_originals = {
+        item["discord_message_id"]: kept[d.duplicate_in_batch][0]["discord_message_id"]
+        for item, d in kept if d.duplicate_in_batch is not None
+    }
+    kept = [(item, decision) for item, decision in kept if decision.action != "skip"]
+    if not kept:
+        return 0
+    items = [item for item, _ in kept]
+    decisions = [decision for _, decision in kept]
+
+    # One embedding call for the whole batch: short messages whole, long ones as chunks
+    chunks_by_item = [
+        split_into_chunks(item["content"]) if d.action == "embed" and needs_chunking(item["content"]) else None
+        for item, d in zip(items, decisions)
+    ]
+    to_embed = []
+    for item, decision, chunks in zip(items, decisions, chunks_by_item):
+        if decision.action == "embed":
+            to_embed.extend(chunks if chunks else [item["content"]])
+    vectors = iter(get_embedding_service().embed_batch(to_embed))
+
+    rows, chunk_rows = [], {}
+    for item, decision, chunks in zip(items, decisions, chunks_by_item):
+        embedding = None
+        if chunks:
+            chunk_rows[item["discord_message_id"]] = [(chunk, next(vectors)) for chunk in chunks]
+        elif decision.action == "embed":
+            embedding = next(vectors)
+        row = {
+            "discord_id": item["discord_message_id"],
+            "author_id": item["author_id"],
+            "channel_id": item["channel_id"],
+            "guild_id": item.get("guild_id"),
+            "content": item["content"],
+            "embedding": embedding,
+            "duplicate_of": decision.duplicate_of,
+            "reply_to": item.get("reply_to"),
+            "reaction_count": item.get("reaction_count", 0),
+            "created_at": snowflake_time(item["discord_message_id"]),
+        }
+        rows.append(row)
+    try:
+        inserted = db.execute(
+            pg_insert(DiscordMessage)
+            .values(rows)
+            .on_conflict_do_nothing(constraint="uq_discord_messages_discord_id_created_at")
+            .returning(DiscordMessage.id, DiscordMessage.discord_id, DiscordMessage.guild_id,
+                       DiscordMessage.created_at)
+        ).all()
+        chunk_values = [
+            {"message_id": message_id, "guild_id": guild_id, "chunk_index": i,
+             "content": chunk, "embedding": vector, "created_at": created_at}
+            for message_id, discord_id, guild_id, created_at in inserted
+            for i, (chunk, vector) in enumerate(chunk_rows.get(discord_id, []))
+        ]
+        if chunk_values:
+            db.execute(
+                pg_insert(MessageChunk)
+                .values(chunk_values)
+                .on_conflict_do_nothing(constraint="uq_discord_message_chunks_message_chunk")
+            )
+        inserted_ids = {discord_id: (message_id, created_at) for message_id, discord_id, _, created_at in inserted}
+        for discord_id, original in batch_originals.items():
+            if discord_id in inserted_ids and original in inserted_ids:
+                message_id, created_at = inserted_ids[discord_id]
+                db.execute(
+                    update(DiscordMessage)
+                    .where(DiscordMessage.id == message_id, DiscordMessage.created_at == created_at)
+                    .values(duplicate_of=inserted_ids[original][0])
+                )
+        # Only rows actually inserted count as replies, so replayed batches don't double count
+        reply_parents = {item["discord_message_id"]: item.get("reply_to") for item in items}
+        replies = Counter(reply_parents[discord_id] for _, discord_id, _, _ in inserted
+                          if reply_parents.get(discord_id))
+        _increment_reply_counts(db, replies)
+        by_discord_id = {item["discord_message_id"]: item for item in items}
+        record_activity(db, [
+            (guild_id, by_discord_id[discord_id]["channel_id"], by_discord_id[discord_id]["author_id"], created_at)
+            for _, discord_id, guild_id, created_at in inserted
+        ])
+        vectors_by_discord_id = {row["discord_id"]: row["embedding"] for row in rows}
+        vectors_by_discord_id.update({
+            discord_id: np.mean([vector for _, vector in chunks], axis=0) for discord_id, chunks in chunk_rows.items()
+        })
+        record_topics(db, [
+            (by_discord_id[discord_id]["author_id"], by_discord_id[discord_id]["channel_id"],
+             vectors_by_discord_id[discord_id])
+            for _, discord_id, _, _ in inserted
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    fingerprints = {item["discord_message_id"]: d.fingerprint
+                    for item, d in zip(items, decisions) if d.action == "embed"}
+    for message_id, discord_id, guild_id, _ in inserted:
+        if discord_id in fingerprints:
+            content_filter.remember(fingerprints[discord_id], message_id, guild_id)
+
+    # Spool drainers run in the bot process, where the channel buffers live
+    recent = get_recent_context_buffer()
+    if recent is not None:
+        for item, row in zip(items, rows):
+            chunk_vectors = [vector for _, vector in chunk_rows.get(item["discord_message_id"], [])]
+            vector = np.mean(chunk_vectors, axis=0) if chunk_vectors else row["embedding"]
+            if vector is not None:
+                recent.attach_vector(item["channel_id"], item["discord_message_id"], vector)
+
+    # Same hot-guild cache upkeep as process_and_store_message (no-op for uncached guilds)
+    cache = get_vector_index_cache()
+    if cache is not None:
+        for message_id, discord_id, guild_id, created_at in inserted:
+            item = by_discord_id[discord_id]
+            if discord_id in chunk_rows:
+                for i, (chunk, vector) in enumerate(chunk_rows[discord_id]):
+                    cache.add_message(guild_id, IndexedMessage(
+                        message_id, item["author_id"], item["channel_id"], created_at, chunk, i
+                    ), vector)
+            elif vectors_by_discord_id[discord_id] is not None:
+                cache.add_message(guild_id, IndexedMessage(
+                    message_id, item["author_id"], item["channel_id"], created_at, item["content"]
+                ), vectors_by_discord_id[discord_id])
+    return len(inserted)
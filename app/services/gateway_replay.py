@@ -0,0 +1,424 @@
+"""
+GATEWAY RECORD / REPLAY
+Captures the on_message stream to JSONL (GATEWAY_RECORD_PATH), generates
+synthetic streams, and replays either into DiscordMindBot.on_message through
+stub Discord objects, so ingestion and command capacity can be measured
+without a live server. See replay.py for the CLI.
+"""
+
+import json
+import time
+import random
+import asyncio
+import inspect
+import threading
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+
+from app.core.logger import logger
+from app.models.message import DiscordMessage
+from app.core.snowflakes import DISCORD_EPOCH_MS
+
+# Handler exceptions logged with their traceback per replay (the rest are only counted)
+REPLAY_LOGGED_ERRORS = 5
+
+
+@dataclass
+class GatewayEvent:
+    """One recorded (or synthetic) MESSAGE_CREATE, timed relative to the stream start."""
+    t: float
+    message_id: str
+    author_id: str
+    channel_id: str
+    guild_id: Optional[str]
+    content: str
+    mentions_bot: bool = False
+    reply_to: Optional[str] = None
+
+
+# --- RECORDING ---
+class EventRecorder:
+    """Appends on_message events to a JSONL file (thread-safe, line-buffered)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def record(self, message, bot_user=None) -> None:
+        reference = getattr(message, "reference", None)
+        mentions_bot = bot_user is not None and bot_user in message.mentions
+        content = message.content
+        if mentions_bot:  # replay re-adds the mention for whichever bot user it runs as
+            content = content.replace(f"<@{bot_user.id}>", "").replace(f"<@!{bot_user.id}>", "").strip()
+        event = GatewayEvent(
+            t=round(time.monotonic() - self.started, 3),
+            message_id=str(message.id),
+            author_id=str(message.author.id),
+            channel_id=str(message.channel.id),
+            guild_id=str(message.guild.id) if message.guild else None,
+            content=content,
+            mentions_bot=mentions_bot,
+            reply_to=str(reference.message_id) if reference and reference.message_id else None,
+        )
+        with self.lock:
+            self.file.write(json.dumps(asdict(event)) + "\n")
+
+
+def load_events(path: str) -> List[GatewayEvent]:
+    with open(path, encoding="utf-8") as f:
+        return [GatewayEvent(**json.loads(line)) for line in f if line.strip()]
+
+
+def save_events(path: str, events: Iterable[GatewayEvent]) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(asdict(event)) + "\n")
+            count += 1
+    return count
+
+
+# --- SYNTHETIC STREAMS ---
+_WORDS = ("substrate gravity idea model vector memory signal pattern theory network energy "
+          "question answer context thread channel server design system latency queue embed "
+          "cluster topic author language meaning attention field orbit mass time").split()
+
+
+def _snowflake(at_ms: int, sequence: int) -> str:
+    return str(((at_ms - DISCORD_EPOCH_MS) << 22) | (sequence & 0xFFF))
+
+
+def synthesize(count: int, rate: float, guilds: int = 3, channels: int = 10, authors: int = 200,
+               command_ratio: float = 0.02, mention_ratio: float = 0.01, reply_ratio: float = 0.1,
+               burst_every: float = 0.0, burst_seconds: float = 5.0, burst_factor: float = 10.0,
+               seed: int = 0) -> List[GatewayEvent]:
+    """
+    Poisson stream at `rate` events/s. Every `burst_every` seconds (0 = never)
+    the rate is multiplied by `burst_factor` for `burst_seconds`. Author
+    activity is Zipf-skewed, like real servers.
+    """
+    rng = random.Random(seed)
+    author_weights = [1.0 / (i + 1) for i in range(authors)]
+    now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+    events: List[GatewayEvent] = []
+    t = 0.0
+    for i in range(count):
+        in_burst = burst_every > 0 and (t % burst_every) < burst_seconds
+        t += rng.expovariate(rate * (burst_factor if in_burst else 1.0))
+        guild = rng.randrange(guilds)
+        channel = guild * channels + rng.randrange(channels)
+        author = rng.choices(range(authors), weights=author_weights)[0]
+        words = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(3, 40)))
+
+        roll = rng.random()
+        mentions_bot = False
+        if roll < command_ratio:
+            content = rng.choice(["!ask ", "!ask ", "!ask ", "!status", "!ping"])
+            content = content + words if content == "!ask " else content
+        elif roll < command_ratio + mention_ratio:
+            content, mentions_bot = words, True
+        else:
+            content = words
+
+        reply_to = None
+        if events and rng.random() < reply_ratio:
+            reply_to = rng.choice(events[-50:]).message_id
+        events.append(GatewayEvent(
+            t=round(t, 4),
+            message_id=_snowflake(now_ms + int(t * 1000), i),
+            author_id=str(1000 + author),
+            channel_id=str(100000 + channel),
+            guild_id=str(10 + guild),
+            content=content,
+            mentions_bot=mentions_bot,
+            reply_to=reply_to,
+        ))
+    return events
+
+
+# --- STUB DISCORD OBJECTS ---
+@dataclass(eq=False)
+class StubUser:
+    id: int
+    bot: bool = False
+
+    @property
+    def display_name(self) -> str:
+        return f"user{self.id}"
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+
+@dataclass(eq=False)
+class StubGuild:
+    id: int
+
+    def get_member(self, user_id):
+        return None
+
+
+class _Typing:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class StubChannel:
+    """Counts what the bot sends instead of calling the Discord API."""
+
+    def __init__(self, channel_id: int, sink: "ReplayStats"):
+        self.id = channel_id
+        self.sink = sink
+
+    def typing(self):
+        return _Typing()
+
+    async def send(self, content=None, **kwargs):
+        self.sink.sent += 1
+        return None
+
+
+@dataclass(eq=False)
+class StubReference:
+    message_id: Optional[int]
+
+
+class StubMessage:
+    """Enough of discord.Message for on_message, ingestion and replies."""
+
+    def __init__(self, event: GatewayEvent, bot_user: StubUser, channel: StubChannel,
+                 guild: Optional[StubGuild]):
+        self.id = int(event.message_id)
+        self.author = StubUser(int(event.author_id))
+        self.channel = channel
+        self.guild = guild
+        self.content = f"<@{bot_user.id}> {event.content}" if event.mentions_bot else event.content
+        self.mentions = [bot_user] if event.mentions_bot else []
+        self.reference = StubReference(int(event.reply_to)) if event.reply_to else None
+        self.reactions = []
+        self.created_at = datetime.fromtimestamp(
+            ((self.id >> 22) + DISCORD_EPOCH_MS) / 1000, tz=timezone.utc
+        )
+        self.replied = asyncio.get_running_loop().create_future()
+
+    async def reply(self, content=None, **kwargs):
+        await self.channel.send(content)
+        if not self.replied.done():
+            self.replied.set_result(time.monotonic())
+
+
+class StubContext:
+    """Minimal commands.Context for invoking command callbacks directly."""
+
+    def __init__(self, message: StubMessage):
+        self.message = message
+        self.author = message.author
+        self.guild = message.guild
+        self.channel = message.channel
+        self.first_send: Optional[float] = None
+
+    def typing(self):
+        return _Typing()
+
+    async def send(self, content=None, **kwargs):
+        if self.first_send is None:
+            self.first_send = time.monotonic()
+        return await self.channel.send(content, **kwargs)
+
+
+# --- METRICS ---
+def percentiles(samples: List[float], points=(0.5, 0.95, 0.99)) -> Dict[str, float]:
+    """{"p50": ms, ..., "max": ms, "n": count} for samples in seconds."""
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+    result = {f"p{int(p * 100)}": ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000 for p in points}
+    result["max"] = ordered[-1] * 1000
+    result["n"] = len(ordered)
+    return result
+
+
+@dataclass
+class ReplayStats:
+    dispatched: int = 0
+    sent: int = 0
+    errors: int = 0
+    unsupported: int = 0
+    command_latency: Dict[str, List[float]] = field(default_factory=dict)
+    ingest_lag: List[float] = field(default_factory=list)
+    not_ingested: int = 0
+    pool_samples: List[int] = field(default_factory=list)
+    pool_capacity: int = 0
+    pool_waiting_samples: int = 0
+    wall_seconds: float = 0.0
+
+    def report(self) -> Dict:
+        pool = self.pool_samples or [0]
+        return {
+            "events": self.dispatched,
+            "wall_seconds": round(self.wall_seconds, 2),
+            "events_per_second": round(self.dispatched / self.wall_seconds, 1) if self.wall_seconds else 0.0,
+            "errors": self.errors,
+            "unsupported_commands": self.unsupported,
+            "ingest_lag_ms": percentiles(self.ingest_lag),
+            "not_ingested": self.not_ingested,
+            "command_latency_ms": {name: percentiles(s) for name, s in self.command_latency.items()},
+            "db_pool": {
+                "capacity": self.pool_capacity,
+                "checked_out_max": max(pool),
+                "checked_out_mean": round(sum(pool) / len(pool), 1),
+                "saturated_fraction": round(self.pool_waiting_samples / len(pool), 3),
+            },
+        }
+
+
+# --- REPLAY DRIVER ---
+class ReplayDriver:
+    """
+    Feeds events into a DiscordMindBot at their recorded pace (scaled by
+    `speed`, or re-timed to a fixed `rate`), runs commands through their
+    callbacks with a StubContext, and samples ingest lag and pool usage.
+    """
+
+    def __init__(self, bot, session_factory, engine, events: List[GatewayEvent],
+                 speed: float = 1.0, rate: Optional[float] = None,
+                 bot_user_id: int = 1, pool_sample_interval: float = 0.1):
+        self.bot = bot
+        self.session_factory = session_factory
+        self.engine = engine
+        self.events = events
+        self.speed = speed
+        self.rate = rate
+        self.bot_user = StubUser(bot_user_id, bot=True)
+        self.pool_sample_interval = pool_sample_interval
+        self.stats = ReplayStats()
+        self.channels: Dict[int, StubChannel] = {}
+        self.guilds: Dict[int, StubGuild] = {}
+        self.tasks: List[asyncio.Task] = []
+        # on_message compares against bot.user; give the stub stream a bot identity
+        bot._connection.user = self.bot_user
+
+    def _schedule(self) -> List[float]:
+        if self.rate:
+            return [i / self.rate for i in range(len(self.events))]
+        return [event.t / self.speed for event in self.events]
+
+    def _message(self, event: GatewayEvent) -> StubMessage:
+        channel_id = int(event.channel_id)
+        channel = self.channels.setdefault(channel_id, StubChannel(channel_id, self.stats))
+        guild = None
+        if event.guild_id:
+            guild = self.guilds.setdefault(int(event.guild_id), StubGuild(int(event.guild_id)))
+        return StubMessage(event, self.bot_user, channel, guild)
+
+    async def _run_command(self, message: StubMessage) -> None:
+        name, _, rest = message.content[len(self.bot.command_prefix):].partition(" ")
+        command = self.bot.get_command(name)
+        if command is None:
+            self.stats.unsupported += 1
+            return
+        ctx = StubContext(message)
+        started = time.monotonic()
+        # Commands taking free text get it as their keyword-only argument; the rest use defaults
+        params = list(inspect.signature(command.callback).parameters.values())[1:]
+        text_param = next((p.name for p in params if p.kind is inspect.Parameter.KEYWORD_ONLY), None)
+        if text_param and not rest:
+            self.stats.unsupported += 1
+            return
+        kwargs = {text_param: rest} if text_param else {}
+        await command.callback(ctx, **kwargs)
+        if ctx.first_send is not None:
+            self.stats.command_latency.setdefault(name, []).append(ctx.first_send - started)
+
+    async def _dispatch(self, event: GatewayEvent) -> None:
+        message = self._message(event)
+        started = time.monotonic()
+        self.stats.dispatched += 1
+        try:
+            if message.content.startswith(self.bot.command_prefix):
+                await self._run_command(message)
+                return
+            await self.bot.on_message(message)
+            if message.replied.done():
+                self.stats.command_latency.setdefault("mention", []).append(message.replied.result() - started)
+        except Exception:
+            self.stats.errors += 1
+            # The first few with tracebacks; a broken handler otherwise just shows up as a count
+            if self.stats.errors <= REPLAY_LOGGED_ERRORS:
+                logger.error(f"Replay handler failed for message {event.message_id}", exc_info=True)
+
+    def _find_ingested(self, ids: List[str]) -> set:
+        """Discord IDs among `ids` that are visible in the database (runs in a worker thread)."""
+        db = self.session_factory()
+        try:
+            found = set()
+            for start in range(0, len(ids), 1000):
+                found.update(db.scalars(
+                    select(DiscordMessage.discord_id).where(DiscordMessage.discord_id.in_(ids[start:start + 1000]))
+                ).all())
+            return found
+        finally:
+            db.close()
+
+    async def _poll_ingested(self, pending: Dict[str, float]) -> None:
+        """
+        Moves rows that became visible in the database from `pending` into
+        ingest_lag. `pending` is only read and mutated here on the loop; the
+        query gets a snapshot of its keys.
+        """
+        if not pending:
+            return
+        found = await asyncio.to_thread(self._find_ingested, list(pending))
+        now = time.monotonic()
+        for discord_id in found:
+            self.stats.ingest_lag.append(now - pending.pop(discord_id))
+
+    async def _monitor(self, stop: asyncio.Event, pending: Dict[str, float]) -> None:
+        pool = self.engine.pool
+        self.stats.pool_capacity = pool.size() + getattr(pool, "_max_overflow", 0)
+        last_poll = 0.0
+        while not stop.is_set():
+            checked_out = pool.checkedout()
+            self.stats.pool_samples.append(checked_out)
+            if checked_out >= self.stats.pool_capacity:
+                self.stats.pool_waiting_samples += 1
+            if time.monotonic() - last_poll > 0.5:
+                await self._poll_ingested(pending)
+                last_poll = time.monotonic()
+            await asyncio.sleep(self.pool_sample_interval)
+
+    async def run(self, drain_timeout: float = 60.0) -> Dict:
+        """Replays every event, waits up to drain_timeout for ingestion to land, returns the report."""
+        loop_started = time.monotonic()
+        pending: Dict[str, float] = {}
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(self._monitor(stop, pending))
+
+        for event, offset in zip(self.events, self._schedule()):
+            delay = loop_started + offset - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if event.guild_id and not event.content.startswith(self.bot.command_prefix):
+                pending[event.message_id] = time.monotonic()
+            self.tasks.append(asyncio.create_task(self._dispatch(event)))
+
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        deadline = time.monotonic() + drain_timeout
+        while pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+        stop.set()
+        await monitor
+        await self._poll_ingested(pending)
+
+        self.stats.not_ingested = len(pending)
+        self.stats.wall_seconds = time.monotonic() - loop_started
+        return self.stats.report()
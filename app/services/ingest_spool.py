@@ -0,0 +1,252 @@
+"""
+INGESTION SPOOL (local write-ahead log)
+The gateway handler appends each message to a local SQLite file (WAL mode)
+and returns; a drainer moves spooled messages into Postgres in batches.
+A row is deleted only after its batch committed, and the downstream insert
+is idempotent (store_message_batch skips existing rows), so a crash between
+the two replays the batch harmlessly. Failed batches back off exponentially
+and stay spooled, so DB or embedding outages delay ingestion instead of
+losing messages. A failed batch is bisected (the next batches are halved)
+until the failing row is drained alone; only a row failing on its own, with
+an error the sink does not call transient, has an attempt counted against
+it. Transient failures (connection errors, outages) back the drainer off
+instead. A row that still fails after INGEST_SPOOL_DEAD_AFTER attempts is
+moved to the spool_dead table; requeue_dead() (or
+`python -m app.services.ingest_spool --requeue-dead`) spools it again.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from app.core.logger import logger
+
+# --- CONFIGURATION ---
+INGEST_SPOOL_ENABLED = os.getenv("INGEST_SPOOL_ENABLED", "false").lower() == "true"
+INGEST_SPOOL_DIR = os.getenv("INGEST_SPOOL_DIR", "spool")
+# NORMAL survives process crashes; FULL also survives power loss (one fsync per append)
+INGEST_SPOOL_SYNC = os.getenv("INGEST_SPOOL_SYNC", "NORMAL").upper()
+INGEST_SPOOL_BATCH_SIZE = int(os.getenv("INGEST_SPOOL_BATCH_SIZE", "64"))
+INGEST_SPOOL_DRAIN_INTERVAL = float(os.getenv("INGEST_SPOOL_DRAIN_INTERVAL", "0.5"))
+INGEST_SPOOL_MAX_BACKOFF = float(os.getenv("INGEST_SPOOL_MAX_BACKOFF", "300"))
+# Failed attempts (each on its own) after which a row is dead-lettered instead of retried
+INGEST_SPOOL_DEAD_AFTER = int(os.getenv("INGEST_SPOOL_DEAD_AFTER", "10"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    discord_id TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_spool_next_attempt ON spool (next_attempt, seq);
+CREATE TABLE IF NOT EXISTS spool_dead (
+    seq INTEGER PRIMARY KEY,
+    discord_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    attempts INTEGER NOT NULL,
+    failed_at REAL NOT NULL,
+    last_error TEXT
+);
+"""
+
+
+def default_spool_path(shard_ids: Optional[Sequence[int]] = None) -> str:
+    """One spool file per bot process; the name is stable across restarts so it is replayed."""
+    suffix = f"-shards-{shard_ids[0]}-{shard_ids[-1]}" if shard_ids else ""
+    return os.path.join(INGEST_SPOOL_DIR, f"ingest{suffix}.sqlite3")
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Default outage test for sink errors: network failures, lost or refused
+    database connections, and embedding API errors that are not about the
+    input (rate limits, 5xx, no status).
+    """
+    if isinstance(error, (ConnectionError, TimeoutError, OperationalError, InterfaceError)):
+        return True
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    context = getattr(error, "context", None)  # AppError from the embedding service
+    status = context.get("status_code") if isinstance(context, dict) else None
+    return status == "unknown" or status == 429 or (isinstance(status, int) and status >= 500)
+
+class IngestSpool:
+    """Durable FIFO of ingest payloads (the process_and_store_message kwargs)."""
+
+    def __init__(self, path: str, synchronous: str = INGEST_SPOOL_SYNC,
+                 dead_after: int = INGEST_SPOOL_DEAD_AFTER,
+                 is_transient: Callable[[Exception], bool] = is_transient_error):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.dead_after = dead_after
+        self.is_transient = is_transient
+        # One connection shared by the event loop (appends) and the drainer thread
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA synchronous={'FULL' if synchronous == 'FULL' else 'NORMAL'}")
+        self.conn.executescript(_SCHEMA)
+        self.lock = threading.Lock()
+        self.appended = 0
+        self.drained = 0
+        self.failed_batches = 0
+        self.dead_lettered = 0
+        self.last_error: Optional[str] = None
+        # Drainer state: batches shrink while bisecting a failure, and transient
+        # failures pause draining with exponential backoff
+        self.batch_limit: Optional[int] = None
+        self.outages = 0
+        self.paused_until = 0.0
+
+    def append(self, payload: Dict[str, Any]) -> None:
+        """Spools one message; a re-delivered Discord message is ignored."""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO spool (discord_id, payload, enqueued_at) VALUES (?, ?, ?)",
+                (payload["discord_message_id"], json.dumps(payload), time.time())
+            )
+            self.appended += 1
+
+    def _due(self, limit: int) -> List[tuple]:
+        now = time.time()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT seq, payload, attempts FROM spool WHERE next_attempt <= ? ORDER BY seq LIMIT ?",
+                (now, limit)
+            ).fetchall()
+        # A row that already failed on its own is retried alone
+        if rows and rows[0][2] > 0:
+            return rows[:1]
+        return [row for row in rows if row[2] == 0]
+
+    def drain_once(self, sink: Callable[[List[Dict[str, Any]]], int],
+                   limit: int = INGEST_SPOOL_BATCH_SIZE) -> int:
+        """
+        Hands up to `limit` due payloads to `sink` (which must be idempotent)
+        and checkpoints them by deleting on success. Returns the batch size
+        (0 when nothing was due or the drainer is backing off); failures are
+        handled as described in the module docstring and re-raised.
+        """
+        now = time.time()
+        if now < self.paused_until:
+            return 0
+        rows = self._due(min(limit, self.batch_limit or limit))
+        if not rows:
+            return 0
+        seqs = [seq for seq, _, _ in rows]
+        marks = ",".join("?" * len(seqs))
+        try:
+            sink([json.loads(payload) for _, payload, _ in rows])
+        except Exception as e:
+            self.failed_batches += 1
+            self.last_error = str(e)[:500]
+            if self.is_transient(e):
+                # The sink is down, not the rows: nothing is counted against them
+                self.outages += 1
+                self.paused_until = time.time() + min(INGEST_SPOOL_MAX_BACKOFF, 2 ** min(self.outages, 16))
+            elif len(rows) > 1:
+                self.batch_limit = len(rows) // 2
+            else:
+                self._count_failure(seqs[0])
+            raise
+        with self.lock:
+            self.conn.execute(f"DELETE FROM spool WHERE seq IN ({marks})", seqs)
+        self.drained += len(rows)
+        self.outages = 0
+        if self.batch_limit is not None:
+            self.batch_limit = self.batch_limit * 2 if self.batch_limit * 2 < limit else None
+        return len(rows)
+
+    def _count_failure(self, seq: int) -> None:
+        """Counts a failed attempt against a row drained alone; dead-letters it past dead_after."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN")
+            self.conn.execute(
+                "UPDATE spool SET attempts = attempts + 1, last_error = ?, "
+                "next_attempt = ? + min(?, 1 << min(attempts, 16)) WHERE seq = ?",
+                (self.last_error, now, INGEST_SPOOL_MAX_BACKOFF, seq)
+            )
+            dead = self.conn.execute(
+                "INSERT INTO spool_dead (seq, discord_id, payload, enqueued_at, attempts, failed_at, last_error) "
+                "SELECT seq, discord_id, payload, enqueued_at, attempts, ?, last_error FROM spool "
+                "WHERE seq = ? AND attempts >= ?",
+                (now, seq, self.dead_after)
+            ).rowcount
+            if dead:
+                self.conn.execute("DELETE FROM spool WHERE seq = ?", (seq,))
+            self.conn.execute("COMMIT")
+        if dead:
+            self.dead_lettered += 1
+            logger.error(f"Ingest spool dead-lettered a message after {self.dead_after} attempts: "
+                         f"{self.last_error}", extra={"event": "spool.dead_letter"})
+
+    def requeue_dead(self) -> int:
+        """Moves every dead-lettered row back into the spool with a fresh attempt count."""
+        with self.lock:
+            self.conn.execute("BEGIN")
+            requeued = self.conn.execute(
+                "INSERT OR IGNORE INTO spool (discord_id, payload, enqueued_at) "
+                "SELECT discord_id, payload, enqueued_at FROM spool_dead ORDER BY seq"
+            ).rowcount
+            self.conn.execute("DELETE FROM spool_dead")
+            self.conn.execute("COMMIT")
+        return requeued
+
+    def stats(self) -> Dict[str, Any]:
+        """Depth, lag (age of the oldest spooled message), dead-lettered rows and drain counters."""
+        with self.lock:
+            depth, oldest, retrying = self.conn.execute(
+                "SELECT count(*), min(enqueued_at), coalesce(sum(attempts > 0), 0) FROM spool"
+            ).fetchone()
+            dead = self.conn.execute("SELECT count(*) FROM spool_dead").fetchone()[0]
+        return {
+            "depth": depth,
+            "lag_seconds": time.time() - oldest if oldest else 0.0,
+            "retrying": retrying,
+            "dead": dead,
+            "appended": self.appended,
+            "drained": self.drained,
+            "failed_batches": self.failed_batches,
+            "last_error": self.last_error,
+        }
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+def get_ingest_spool(shard_ids: Optional[Sequence[int]] = None) -> Optional[IngestSpool]:
+    """Dependency function providing the process's spool (None when disabled)."""
+    if not INGEST_SPOOL_ENABLED:
+        return None
+    if not hasattr(get_ingest_spool, 'instance'):
+        get_ingest_spool.instance = IngestSpool(default_spool_path(shard_ids))
+        depth = get_ingest_spool.instance.stats()["depth"]
+        if depth:
+            logger.info(f"📼 Ingest spool has {depth} message(s) to replay.")
+    return get_ingest_spool.instance
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect an ingest spool file.")
+    parser.add_argument("path", nargs="?", default=default_spool_path())
+    parser.add_argument("--requeue-dead", action="store_true",
+                        help="Move dead-lettered messages back into the spool for another try.")
+    args = parser.parse_args()
+    spool = IngestSpool(args.path)
+    if args.requeue_dead:
+        print(f"Requeued {spool.requeue_dead()} dead-lettered message(s).")
+    print(json.dumps(spool.stats(), indent=2))
+    spool.close()
@@ -0,0 +1,164 @@
+"""
+JOB QUEUE SERVICE
+A Postgres-backed work queue shared by bot shards and worker processes.
+Producers insert rows; workers claim batches with FOR UPDATE SKIP LOCKED so
+any number of processes (on any host) can drain the queue without contention.
+"""
+
+import os
+import socket
+import asyncio
+from datetime import timedelta
+from typing import List, Dict, Any, Optional, Sequence
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.orm import Session
+
+from app.models.job import Job
+
+# --- CONFIGURATION ---
+OFFLOAD_INGESTION = os.getenv("OFFLOAD_INGESTION", "false").lower() == "true"
+OFFLOAD_ANALYTICS = os.getenv("OFFLOAD_ANALYTICS", "false").lower() == "true"
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv("JOB_LOCK_TIMEOUT_SECONDS", "300"))
+JOB_RESULT_TIMEOUT_SECONDS = float(os.getenv("JOB_RESULT_TIMEOUT_SECONDS", "120"))
+JOB_POLL_INTERVAL_SECONDS = 0.5
+# Done jobs (ingest payloads carry the full message content) are deleted after this
+JOB_DONE_RETENTION_HOURS = float(os.getenv("JOB_DONE_RETENTION_HOURS", "24"))
+JOB_PURGE_BATCH = 5000
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(db: Session, kind: str, payload: Dict[str, Any]) -> int:
+    """Inserts a pending job and returns its id."""
+    job = Job(kind=kind, payload=payload, status="pending", attempts=0)
+    db.add(job)
+    db.commit()
+    return job.id
+
+
+def enqueue_many(db: Session, kind: str, payloads: Sequence[Dict[str, Any]]) -> None:
+    """Inserts several pending jobs in one commit."""
+    db.add_all([Job(kind=kind, payload=payload, status="pending", attempts=0) for payload in payloads])
+    db.commit()
+
+
+def claim_batch(db: Session, kinds: Sequence[str], limit: int,
+                worker_id: str = WORKER_ID) -> List[Job]:
+    """
+    Atomically claims up to `limit` due jobs of the given kinds.
+    Rows locked by other workers are skipped, never waited on.
+    """
+    claimable = (
+        select(Job.id)
+        .where(Job.kind.in_(kinds), Job.status == "pending", Job.run_after <= func.now())
+        .order_by(Job.run_after, Job.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    jobs = db.scalars(
+        update(Job)
+        .where(Job.id.in_(claimable))
+        .values(status="running", locked_by=worker_id, locked_at=func.now(), attempts=Job.attempts + 1)
+        .returning(Job)
+        .execution_options(synchronize_session=False)
+    ).all()
+    # Detach before commit so callers can still read the rows once the session closes
+    for job in jobs:
+        db.expunge(job)
+    db.commit()
+    return sorted(jobs, key=lambda job: job.id)
+
+
+def complete(db: Session, job_ids: Sequence[int], results: Optional[Dict[int, Any]] = None) -> None:
+    """Marks jobs done, optionally storing a JSON result per job."""
+    if not job_ids:
+        return
+    results = results or {}
+    for job_id in job_ids:
+        db.execute(
+            update(Job)
+            .where(Job.id == job_id)
+            .values(status="done", result=results.get(job_id), locked_by=None, locked_at=None)
+        )
+    db.commit()
+
+
+def fail(db: Session, job: Job, error: str) -> None:
+    """Reschedules a job with exponential backoff, or marks it failed after JOB_MAX_ATTEMPTS."""
+    if job.attempts >= JOB_MAX_ATTEMPTS:
+        values = {"status": "failed"}
+    else:
+        values = {"status": "pending", "run_after": func.now() + timedelta(seconds=2 ** job.attempts)}
+    db.execute(
+        update(Job)
+        .where(Job.id == job.id)
+        .values(last_error=error[:2000], locked_by=None, locked_at=None, **values)
+    )
+    db.commit()
+
+
+def release_stale(db: Session) -> int:
+    """Returns jobs whose worker died mid-flight (lock older than the timeout) to the queue."""
+    result = db.execute(
+        update(Job)
+        .where(Job.status == "running",
+               Job.locked_at < func.now() - timedelta(seconds=JOB_LOCK_TIMEOUT_SECONDS))
+        .values(status="pending", locked_by=None, locked_at=None)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def purge_done(db: Session, older_than_hours: float = JOB_DONE_RETENTION_HOURS) -> int:
+    """Deletes done jobs created more than `older_than_hours` ago, in batches; returns the count."""
+    purged = 0
+    while True:
+        batch = (
+            select(Job.id)
+            .where(Job.status == "done", Job.created_at < func.now() - timedelta(hours=older_than_hours))
+            .limit(JOB_PURGE_BATCH)
+            .scalar_subquery()
+        )
+        deleted = db.execute(
+            delete(Job).where(Job.id.in_(batch)).execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        purged += deleted
+        if deleted < JOB_PURGE_BATCH:
+            return purged
+
+
+def queue_depth(db: Session) -> Dict[str, int]:
+    """Pending job count per kind."""
+    return dict(db.execute(
+        select(Job.kind, func.count(Job.id)).where(Job.status == "pending").group_by(Job.kind)
+    ).all())
+
+
+async def wait_for_result(session_factory, job_id: int,
+                          timeout: float = JOB_RESULT_TIMEOUT_SECONDS) -> Any:
+    """
+    Polls (off the event loop) until a job finishes and returns its result.
+    Raises TimeoutError if it is still queued/running after `timeout` seconds
+    and RuntimeError if it failed permanently.
+    """
+    def _fetch():
+        db = session_factory()
+        try:
+            return db.execute(select(Job.status, Job.result, Job.last_error).where(Job.id == job_id)).one()
+        finally:
+            db.close()
+
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        status, result, last_error = await asyncio.to_thread(_fetch)
+        if status == "done":
+            return result
+        if status == "failed":
+            raise RuntimeError(f"Job {job_id} failed: {last_error}")
+        if asyncio.get_running_loop().time() >= deadline:
+            raise TimeoutError(f"Job {job_id} did not finish within {timeout}s")
+        await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
@@ -0,0 +1,267 @@
+"""
+OPENAI STUB
+Deterministic stand-ins for the OpenAI embeddings and chat APIs, for load
+tests and offline runs: an in-process client (replay.py) and an
+OpenAI-compatible HTTP server (stub_openai.py; point OPENAI_BASE_URL at it).
+Embeddings are the normalised sum of per-token pseudo-random vectors, so texts
+sharing words land near each other and the same text always maps to the same
+vector. The server can inject latency, 5xx errors and 429 rate limiting.
+"""
+
+import json
+import time
+import uuid
+import base64
+import random
+import hashlib
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import List
+
+import numpy as np
+
+from app.models.message import EMBEDDING_DIMENSION
+
+
+def deterministic_embedding(text: str, dim: int = EMBEDDING_DIMENSION) -> List[float]:
+    """Stable unit vector for `text` (bag of hashed tokens)."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in (text.lower().split() or [""]):
+        seed = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+        vector += np.random.default_rng(seed).standard_normal(dim, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+def stub_answer(messages) -> str:
+    """Canned chat completion that echoes the question it was asked."""
+    question = messages[-1]["content"] if messages else ""
+    return f"(stub) You asked about: {question[-200:]}"
+
+
+def _usage(prompt_tokens: int, completion_tokens: int = 0):
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=0),
+    )
+
+
+class _Embeddings:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def create(self, input, model, dimensions=None, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        dim = int(dimensions or EMBEDDING_DIMENSION)
+        time.sleep(self.latency)
+        return SimpleNamespace(
+            data=[SimpleNamespace(embedding=deterministic_embedding(t, dim), index=i) for i, t in enumerate(texts)],
+            model=model,
+            usage=_usage(sum(len(t.split()) for t in texts)),
+        )
+
+
+class _Completions:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def create(self, model, messages, **kwargs):
+        time.sleep(self.latency)
+        content = stub_answer(messages)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(index=0, finish_reason="stop",
+                                     message=SimpleNamespace(role="assistant", content=content))],
+            model=model,
+            usage=_usage(sum(len(m["content"].split()) for m in messages), len(content.split())),
+        )
+
+
+class StubOpenAIClient:
+    """In-process object with the subset of the OpenAI client surface the services use."""
+
+    def __init__(self, embedding_latency: float = 0.0, chat_latency: float = 0.0):
+        self.embeddings = _Embeddings(embedding_latency)
+        self.chat = SimpleNamespace(completions=_Completions(chat_latency))
+
+    def with_options(self, **_):
+        # Per-call timeouts and retries mean nothing in process
+        return self
+
+
+def install_stub_clients(embedding_latency: float = 0.0, chat_latency: float = 0.0) -> StubOpenAIClient:
+    """Points the embedding service and the chat client singletons at a stub client."""
+    from app.services.embedding_service import EmbeddingService, get_embedding_service
+    from app.services.retrieval_service import get_chat_client
+
+    client = StubOpenAIClient(embedding_latency, chat_latency)
+    service = EmbeddingService.__new__(EmbeddingService)
+    service.client = client
+    get_embedding_service.instance = service
+    get_chat_client.instance = client
+    return client
+
+
+# --- HTTP SERVER ---
+@dataclass
+class StubServerConfig:
+    """Fault and latency injection for the HTTP stub."""
+    latency_ms: float = 50.0
+    jitter_ms: float = 20.0
+    error_rate: float = 0.0          # fraction of requests answered with a 500
+    rate_limit_rps: float = 0.0      # token-bucket requests/s before 429s (0 = unlimited)
+    rate_limit_burst: float = 10.0
+    retry_after_seconds: float = 1.0
+    stream_chunk_ms: float = 15.0    # delay between streamed chat chunks
+    seed: int = 0
+
+
+class _RateLimiter:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1.0:
+                return False
+            self.tokens -= 1.0
+            return True
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: "StubOpenAIServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # keep perf runs quiet
+        pass
+
+    def _json(self, status: int, body: dict, headers: dict = None) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status: int, message: str, kind: str, headers: dict = None) -> None:
+        self._json(status, {"error": {"message": message, "type": kind, "param": None, "code": None}}, headers)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            return self._error(400, "Invalid JSON body.", "invalid_request_error")
+
+        handler = {"/v1/embeddings": self._embeddings,
+                   "/v1/chat/completions": self._chat}.get(self.path.rstrip("/"))
+        if handler is None:
+            return self._error(404, f"Unknown endpoint {self.path}", "invalid_request_error")
+
+        config = self.server.config
+        self.server.count("requests")
+        if not self.server.limiter.allow():
+            self.server.count("rate_limited")
+            return self._error(429, "Rate limit reached (stub).", "rate_limit_exceeded",
+                               {"Retry-After": str(config.retry_after_seconds)})
+        time.sleep(max(0.0, self.server.latency()))
+        if self.server.should_fail():
+            self.server.count("errors")
+            return self._error(500, "Injected server error (stub).", "server_error")
+        handler(request)
+
+    def _embeddings(self, request: dict) -> None:
+        inputs = request.get("input", [])
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        dim = int(request.get("dimensions") or EMBEDDING_DIMENSION)
+        data = []
+        for i, text in enumerate(texts):
+            vector = deterministic_embedding(str(text), dim)
+            if request.get("encoding_format") == "base64":
+                vector = base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        tokens = sum(len(str(t).split()) for t in texts)
+        self._json(200, {"object": "list", "data": data, "model": request.get("model", "stub"),
+                         "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    def _chat(self, request: dict) -> None:
+        messages = request.get("messages", [])
+        content = stub_answer(messages)
+        model = request.get("model", "stub")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content.split()),
+                 "total_tokens": prompt_tokens + len(content.split()),
+                 "prompt_tokens_details": {"cached_tokens": 0}}
+
+        if not request.get("stream"):
+            return self._json(200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            })
+
+        # Server-sent events, one word per chunk, then [DONE]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def emit(delta: dict, finish_reason=None, extra: dict = None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            chunk.update(extra or {})
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        emit({"role": "assistant", "content": ""})
+        for i, word in enumerate(content.split(" ")):
+            time.sleep(self.server.config.stream_chunk_ms / 1000)
+            emit({"content": word if i == 0 else " " + word})
+        include_usage = (request.get("stream_options") or {}).get("include_usage")
+        emit({}, "stop", {"usage": usage} if include_usage else None)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class StubOpenAIServer(ThreadingHTTPServer):
+    """Threaded OpenAI-compatible server (/v1/embeddings, /v1/chat/completions)."""
+    daemon_threads = True
+
+    def __init__(self, host: str, port: int, config: StubServerConfig):
+        super().__init__((host, port), _StubHandler)
+        self.config = config
+        self.limiter = _RateLimiter(config.rate_limit_rps, config.rate_limit_burst)
+        self.rng = random.Random(config.seed)
+        self.rng_lock = threading.Lock()
+        self.counters = {"requests": 0, "rate_limited": 0, "errors": 0}
+
+    def count(self, name: str) -> None:
+        with self.rng_lock:
+            self.counters[name] += 1
+
+    def latency(self) -> float:
+        with self.rng_lock:
+            jitter = self.rng.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+        return (self.config.latency_ms + jitter) / 1000
+
+    def should_fail(self) -> bool:
+        with self.rng_lock:
+            return self.rng.random() < self.config.error_rate
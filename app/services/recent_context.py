@@ -0,0 +1,135 @@
+"""
+RECENT CHANNEL CONTEXT (in-memory ring buffers)
+Keeps the last RECENT_CONTEXT_SIZE messages of each active channel (ids,
+author, truncated text and a float16 unit vector once embedded), so a
+mention or !ask can include what was just said in the channel without a
+database round trip. Channels are kept in LRU order; idle channels and those
+beyond RECENT_CONTEXT_MAX_CHANNELS are evicted on insert.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# --- CONFIGURATION ---
+RECENT_CONTEXT_ENABLED = os.getenv("RECENT_CONTEXT_ENABLED", "true").lower() == "true"
+RECENT_CONTEXT_SIZE = int(os.getenv("RECENT_CONTEXT_SIZE", "50"))
+RECENT_CONTEXT_MAX_CHANNELS = int(os.getenv("RECENT_CONTEXT_MAX_CHANNELS", "2000"))
+RECENT_CONTEXT_IDLE_SECONDS = int(os.getenv("RECENT_CONTEXT_IDLE_SECONDS", "3600"))
+# Latest turns always included, plus up to RECENT_CONTEXT_RELEVANT older ones similar to the question
+RECENT_CONTEXT_TURNS = int(os.getenv("RECENT_CONTEXT_TURNS", "6"))
+RECENT_CONTEXT_RELEVANT = int(os.getenv("RECENT_CONTEXT_RELEVANT", "3"))
+RECENT_CONTEXT_MAX_CHARS = int(os.getenv("RECENT_CONTEXT_MAX_CHARS", "500"))
+
+
+class RecentMessage:
+    """One buffered message; slots keep ~100 bytes of overhead per entry."""
+    __slots__ = ("discord_id", "author_id", "content", "created_at", "vector")
+
+    def __init__(self, discord_id: int, author_id: str, content: str, created_at: float,
+                 vector: Optional[np.ndarray] = None):
+        self.discord_id = discord_id
+        self.author_id = author_id
+        self.content = content
+        self.created_at = created_at  # epoch seconds
+        self.vector = vector          # float16 unit vector, None until embedded
+
+
+class _ChannelBuffer:
+    __slots__ = ("messages", "last_active")
+
+    def __init__(self, size: int):
+        self.messages: deque = deque(maxlen=size)
+        self.last_active = time.monotonic()
+
+
+class RecentContextBuffer:
+    """Per-channel ring buffers, safe to use from the event loop and worker threads."""
+
+    def __init__(self, size: int = RECENT_CONTEXT_SIZE, max_channels: int = RECENT_CONTEXT_MAX_CHANNELS,
+                 idle_seconds: int = RECENT_CONTEXT_IDLE_SECONDS):
+        self.size = size
+        self.max_channels = max_channels
+        self.idle_seconds = idle_seconds
+        self.channels: "OrderedDict[str, _ChannelBuffer]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.evicted = 0
+
+    def _evict(self, now: float) -> None:
+        # Channels are in LRU order, so idle ones are always at the front
+        while self.channels:
+            oldest = next(iter(self.channels.values()))
+            if len(self.channels) <= self.max_channels and now - oldest.last_active < self.idle_seconds:
+                break
+            self.channels.popitem(last=False)
+            self.evicted += 1
+
+    def add(self, channel_id: str, discord_id: str, author_id: str, content: str, created_at: float) -> None:
+        entry = RecentMessage(int(discord_id), author_id, content[:RECENT_CONTEXT_MAX_CHARS], created_at)
+        now = time.monotonic()
+        with self.lock:
+            buffer = self.channels.get(channel_id)
+            if buffer is None:
+                buffer = self.channels[channel_id] = _ChannelBuffer(self.size)
+            else:
+                self.channels.move_to_end(channel_id)
+            buffer.messages.append(entry)
+            buffer.last_active = now
+            self._evict(now)
+
+    def attach_vector(self, channel_id: str, discord_id: str, vector) -> None:
+        """Stores the embedding of a buffered message once ingestion has computed it."""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return
+        wanted = int(discord_id)
+        with self.lock:
+            buffer = self.channels.get(channel_id)
+            if buffer is None:
+                return
+            for entry in reversed(buffer.messages):  # usually the newest entry
+                if entry.discord_id == wanted:
+                    entry.vector = (vector / norm).astype(np.float16)
+                    return
+
+    def context(self, channel_id: str, query_vector=None, turns: int = RECENT_CONTEXT_TURNS,
+                relevant: int = RECENT_CONTEXT_RELEVANT) -> List[RecentMessage]:
+        """
+        The latest `turns` messages plus up to `relevant` older buffered ones
+        most similar to the query, oldest first.
+        """
+        with self.lock:
+            buffer = self.channels.get(channel_id)
+            messages = list(buffer.messages) if buffer else []
+        if not messages:
+            return []
+        latest, older = (messages[-turns:], messages[:-turns]) if turns > 0 else ([], messages)
+        picked = []
+        # Vectors from before a re-embedding switch can't be compared with the query
+        candidates = [m for m in older if m.vector is not None and query_vector is not None
+                      and len(m.vector) == len(query_vector)]
+        if relevant > 0 and candidates:
+            query = np.asarray(query_vector, dtype=np.float32)
+            matrix = np.stack([m.vector for m in candidates]).astype(np.float32)
+            order = np.argsort(-(matrix @ query))[:relevant]
+            picked = [candidates[i] for i in order]
+        return sorted(picked + latest, key=lambda m: m.discord_id)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            buffered = sum(len(b.messages) for b in self.channels.values())
+            return {"channels": len(self.channels), "messages": buffered, "evicted": self.evicted}
+
+
+def get_recent_context_buffer() -> Optional[RecentContextBuffer]:
+    """Dependency function providing the process-wide buffer (None when disabled)."""
+    if not RECENT_CONTEXT_ENABLED:
+        return None
+    if not hasattr(get_recent_context_buffer, 'instance'):
+        get_recent_context_buffer.instance = RecentContextBuffer()
+    return get_recent_context_buffer.instance
@@ -0,0 +1,551 @@
+"""
+ONLINE RE-EMBEDDING
+Moves every stored vector to a new embedding model (or dimension) while the
+bot keeps serving from the current one:
+  start   adds a shadow `embedding_next vector(N)` column to each embedded table
+  run     fills it in concurrent batches under a requests/tokens-per-minute
+          budget, checkpointing per table so an interrupted run resumes
+  index   builds the HNSW index on the shadow column CONCURRENTLY (per
+          partition, attached to a parent index created ON ONLY)
+  switch  in one short transaction embeds the stragglers, renames
+          embedding -> embedding_prev and embedding_next -> embedding and
+          makes the target model active in embedding_state
+Every process picks the new model up within EMBEDDING_STATE_TTL seconds
+(active_embedding()); rows written by a process still on the old model in
+that window are re-embedded afterwards. embedding_prev is kept for rollback
+inspection until drop_previous_column().
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from app.core.logger import logger
+from app.models.author_graph import AuthorCentroid, AuthorNeighbor
+from app.models.embedding_state import EmbeddingState
+from app.models.message import DiscordMessage, MessageChunk, EMBEDDING_DIMENSION
+from app.models.summary import ChannelSummary
+from app.models.topics import TopicCentroid, AuthorTopic, ChannelTopic
+from app.services.embedding_service import (
+    AppError, EMBEDDING_MODEL, EMBEDDING_STATE_TTL, get_embedding_service
+)
+
+# --- CONFIGURATION ---
+REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", "256"))
+REEMBED_CONCURRENCY = int(os.getenv("REEMBED_CONCURRENCY", "4"))
+# Provider rate limits for the backfill (0 = unlimited); leave headroom for live traffic
+REEMBED_REQUESTS_PER_MINUTE = int(os.getenv("REEMBED_REQUESTS_PER_MINUTE", "3000"))
+REEMBED_TOKENS_PER_MINUTE = int(os.getenv("REEMBED_TOKENS_PER_MINUTE", "1000000"))
+REEMBED_MAX_ATTEMPTS = 5
+# The switch embeds rows the backfill has not reached while writes are blocked;
+# it refuses when more than this many are left
+REEMBED_MAX_STRAGGLERS = int(os.getenv("REEMBED_MAX_STRAGGLERS", "2000"))
+# DDL waits at most this long for a table lock instead of queueing live queries behind it
+REEMBED_LOCK_TIMEOUT = os.getenv("REEMBED_LOCK_TIMEOUT", "5s")
+REEMBED_INDEX_MEMORY = os.getenv("REEMBED_INDEX_MEMORY", "1GB")
+REEMBED_REPORT_SECONDS = 30.0
+# pgvector cannot build HNSW indexes on vector columns wider than this
+HNSW_MAX_DIMENSION = 2000
+
+SHADOW_COLUMN = "embedding_next"
+PREVIOUS_COLUMN = "embedding_prev"
+
+
+@dataclass(frozen=True)
+class EmbeddedTable:
+    name: str
+    text_column: str  # the text its `embedding` was computed from
+
+
+EMBEDDED_TABLES = [
+    EmbeddedTable(DiscordMessage.__tablename__, "content"),
+    EmbeddedTable(MessageChunk.__tablename__, "content"),
+    EmbeddedTable(ChannelSummary.__tablename__, "summary"),
+]
+
+
+# --- STATE ---
+def ensure_embedding_state(db: Session) -> EmbeddingState:
+    """The embedding_state row, created from the env defaults on first use."""
+    state = db.get(EmbeddingState, EmbeddingState.SINGLETON_ID)
+    if state is None:
+        db.execute(pg_insert(EmbeddingState).values(
+            id=EmbeddingState.SINGLETON_ID, active_model=EMBEDDING_MODEL,
+            active_dimension=EMBEDDING_DIMENSION, generation=0, status="idle",
+            checkpoint={}, embedded=0,
+        ).on_conflict_do_nothing())
+        state = db.get(EmbeddingState, EmbeddingState.SINGLETON_ID)
+    return state
+
+
+def _lock_state(db: Session) -> EmbeddingState:
+    ensure_embedding_state(db)
+    return db.get(EmbeddingState, EmbeddingState.SINGLETON_ID, with_for_update=True, populate_existing=True)
+
+
+def _has_column(conn, table: str, column: str) -> bool:
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column)"
+    ), {"table": table, "column": column}).scalar()
+
+
+def _partitions(conn, table: str) -> Optional[List[str]]:
+    """Partition names of a partitioned table, or None for a plain table."""
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": table}
+    ).scalar()
+    if relkind != "p":
+        return None
+    return conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:name) ORDER BY c.relname"
+    ), {"name": table}).scalars().all()
+
+
+def start_reembedding(db: Session, model: str, dimension: int) -> EmbeddingState:
+    """Records the target model and adds the shadow column (a catalog-only change)."""
+    state = _lock_state(db)
+    if state.status != "idle":
+        raise ValueError(f"Re-embedding to {state.target_model} is already {state.status}; "
+                         f"switch or abort it first.")
+    if (model, dimension) == (state.active_model, state.active_dimension):
+        raise ValueError(f"{model} ({dimension} dims) is already the active model.")
+    if any(_has_column(db, t.name, PREVIOUS_COLUMN) for t in EMBEDDED_TABLES):
+        raise ValueError(f"{PREVIOUS_COLUMN} from the last switch still exists; drop it first.")
+
+    db.execute(text(f"SET LOCAL lock_timeout = '{REEMBED_LOCK_TIMEOUT}'"))
+    for table in EMBEDDED_TABLES:
+        db.execute(text(f"ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS {SHADOW_COLUMN} vector({int(dimension)})"))
+    state.target_model = model
+    state.target_dimension = dimension
+    state.status = "backfilling"
+    state.checkpoint = {}
+    state.embedded = 0
+    state.started_at = func.now()
+    db.commit()
+    logger.info(f"Re-embedding started: {state.active_model} -> {model} ({dimension} dims)",
+                extra={"event": "reembed.started"})
+    return state
+
+
+# --- BACKFILL ---
+class RateBudget:
+    """Requests- and tokens-per-minute token buckets shared by the backfill workers (0 = unlimited)."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.requests = float(requests_per_minute)
+        self.tokens = float(tokens_per_minute)
+        self.refilled_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> None:
+        """Blocks until one request of `tokens` tokens fits in the budget."""
+        tokens = min(tokens, self.tpm)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                elapsed, self.refilled_at = now - self.refilled_at, now
+                if self.rpm:
+                    self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+                if self.tpm:
+                    self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+                wait = max(
+                    (1 - self.requests) * 60 / self.rpm if self.rpm else 0.0,
+                    (tokens - self.tokens) * 60 / self.tpm if self.tpm else 0.0,
+                )
+                if wait <= 0:
+                    self.requests -= 1 if self.rpm else 0
+                    self.tokens -= tokens
+                    return
+            time.sleep(wait)
+
+
+def _estimate_tokens(texts: Sequence[str]) -> int:
+    """~4 characters per token, the usual estimate for English text."""
+    return sum(len(t) // 4 + 1 for t in texts)
+
+
+class BackfillProgress:
+    """Rows embedded so far against the rows pending at start, with rate and ETA."""
+
+    def __init__(self, pending: int):
+        self.pending = pending
+        self.embedded = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.reported = self.started
+
+    @property
+    def rate(self) -> float:
+        return self.embedded / max(time.monotonic() - self.started, 1e-9)
+
+    def __str__(self) -> str:
+        remaining = max(self.pending - self.embedded, 0)
+        eta = f"{remaining / self.rate / 60:.1f} min" if self.rate else "unknown"
+        failed = f", {self.failed} failed" if self.failed else ""
+        return f"{self.embedded}/{self.pending} rows ({self.rate:.0f} rows/s, ETA {eta}{failed})"
+
+    def report(self, force: bool = False) -> None:
+        if force or time.monotonic() - self.reported >= REEMBED_REPORT_SECONDS:
+            self.reported = time.monotonic()
+            logger.info(f"Re-embedding: {self}", extra={
+                "event": "reembed.progress", "embedded": self.embedded,
+                "pending": self.pending, "rows_per_second": round(self.rate, 1),
+            })
+
+
+def _pending_filter(after_param: str = ":after") -> str:
+    return f"id > {after_param} AND embedding IS NOT NULL AND {SHADOW_COLUMN} IS NULL"
+
+
+def _vector_literal(vector: Sequence[float]) -> str:
+    return "[" + ",".join(f"{x:.7g}" for x in vector) + "]"
+
+
+def _write_vectors(conn: Connection, table: str, column: str,
+                   ids: List[int], vectors: List[List[float]]) -> None:
+    """One UPDATE for the whole batch, joined against unnest()ed id/vector arrays."""
+    conn.execute(text(
+        f"UPDATE {table} AS t SET {column} = CAST(v.vector AS vector) "
+        f"FROM unnest(CAST(:ids AS bigint[]), CAST(:vectors AS text[])) AS v(id, vector) "
+        f"WHERE t.id = v.id"
+    ), {"ids": ids, "vectors": [_vector_literal(v) for v in vectors]})
+
+
+def _embed(texts: List[str], model: str, dimension: int,
+           budget: Optional[RateBudget] = None) -> List[List[float]]:
+    """Target-model vectors, retried with backoff (rate limits, transient API errors)."""
+    service = get_embedding_service()
+    for attempt in range(REEMBED_MAX_ATTEMPTS):
+        if budget is not None:
+            budget.acquire(_estimate_tokens(texts))
+        try:
+            return service.embed_batch(texts, model=model, dimensions=dimension)
+        except AppError:
+            if attempt == REEMBED_MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def _embed_rows(engine: Engine, table: EmbeddedTable, rows: List[Tuple[int, str]],
+                model: str, dimension: int, budget: RateBudget) -> int:
+    """Worker: embeds one batch with the target model and writes the shadow column."""
+    vectors = _embed([content for _, content in rows], model, dimension, budget)
+    with engine.begin() as conn:
+        _write_vectors(conn, table.name, SHADOW_COLUMN, [row_id for row_id, _ in rows], vectors)
+    return len(rows)
+
+
+def _save_checkpoint(engine: Engine, table: str, after: Optional[int], embedded: int) -> None:
+    with engine.begin() as conn:
+        if after is not None:
+            conn.execute(text(
+                "UPDATE embedding_state SET checkpoint = jsonb_set(coalesce(checkpoint, '{}'), "
+                "ARRAY[:table], to_jsonb(CAST(:after AS bigint))) WHERE id = :id"
+            ), {"table": table, "after": after, "id": EmbeddingState.SINGLETON_ID})
+        conn.execute(text(
+            "UPDATE embedding_state SET embedded = embedded + :n, updated_at = now() WHERE id = :id"
+        ), {"n": embedded, "id": EmbeddingState.SINGLETON_ID})
+
+
+def _backfill_table(engine: Engine, pool: ThreadPoolExecutor, table: EmbeddedTable, after: int,
+                    model: str, dimension: int, budget: RateBudget, batch_size: int,
+                    concurrency: int, progress: BackfillProgress) -> bool:
+    """
+    Scans pending rows by id keyset and keeps up to 2 x concurrency batches in
+    flight. The checkpoint only advances over an unbroken run of committed
+    batches, so rows of a failed batch are rescanned on the next run.
+    Returns False if any batch failed.
+    """
+    in_flight = deque()
+    clean = True
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(text(
+                f"SELECT id, {table.text_column} FROM {table.name} WHERE {_pending_filter()} "
+                f"ORDER BY id LIMIT :limit"
+            ), {"after": after, "limit": batch_size}).all()
+        if rows:
+            after = rows[-1][0]
+            in_flight.append((after, len(rows), pool.submit(
+                _embed_rows, engine, table, [tuple(r) for r in rows], model, dimension, budget
+            )))
+        while in_flight and (not rows or len(in_flight) >= 2 * concurrency or in_flight[0][2].done()):
+            last_id, size, future = in_flight.popleft()
+            try:
+                embedded = future.result()
+            except Exception as e:
+                clean = False
+                progress.failed += size
+                logger.error(f"Re-embedding batch of {table.name} up to id {last_id} failed: {e}",
+                             extra={"event": "reembed.batch_failed"})
+                continue
+            progress.embedded += embedded
+            _save_checkpoint(engine, table.name, last_id if clean else None, embedded)
+            progress.report()
+        if not rows:
+            return clean
+
+
+def run_backfill(engine: Engine, batch_size: int = REEMBED_BATCH_SIZE, concurrency: int = REEMBED_CONCURRENCY,
+                 requests_per_minute: int = REEMBED_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = REEMBED_TOKENS_PER_MINUTE) -> BackfillProgress:
+    """
+    Fills the shadow column of every embedded table, resuming from the
+    stored checkpoints. Marks the state "backfilled" once a run finishes
+    without failed batches; rows written meanwhile are left to the switch.
+    """
+    with Session(engine) as db:
+        state = ensure_embedding_state(db)
+        if state.status == "idle":
+            raise ValueError("No re-embedding in progress; start one first.")
+        model, dimension = state.target_model, state.target_dimension
+        checkpoint = dict(state.checkpoint or {})
+        pending = sum(
+            db.execute(text(f"SELECT count(*) FROM {t.name} WHERE {_pending_filter()}"),
+                       {"after": checkpoint.get(t.name, 0)}).scalar()
+            for t in EMBEDDED_TABLES
+        )
+
+    progress = BackfillProgress(pending)
+    budget = RateBudget(requests_per_minute, tokens_per_minute)
+    complete = True
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="reembed") as pool:
+        for table in EMBEDDED_TABLES:
+            complete &= _backfill_table(engine, pool, table, checkpoint.get(table.name, 0), model,
+                                        dimension, budget, batch_size, concurrency, progress)
+    progress.report(force=True)
+
+    with Session(engine) as db:
+        state = _lock_state(db)
+        if complete and state.status == "backfilling":
+            state.status = "backfilled"
+        db.commit()
+    return progress
+
+
+# --- INDEX ---
+def _index_name(table: str, generation: int) -> str:
+    return f"{table}_emb_g{generation}_hnsw"
+
+
+def _create_index_concurrently(conn: Connection, name: str, table: str) -> None:
+    """CREATE INDEX CONCURRENTLY, replacing an invalid leftover of an interrupted build."""
+    valid = conn.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+    if valid is False:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY {name}"))
+    if valid is not True:
+        conn.execute(text(
+            f"CREATE INDEX CONCURRENTLY {name} ON {table} USING hnsw ({SHADOW_COLUMN} vector_cosine_ops)"
+        ))
+
+
+def build_shadow_indexes(engine: Engine) -> List[str]:
+    """
+    Builds the cosine HNSW index on each shadow column without blocking writes.
+    Partitioned tables get one concurrent build per partition, each attached
+    to a parent index created ON ONLY (Postgres cannot build a partitioned
+    index concurrently). Returns the parent index names.
+    """
+    with Session(engine) as db:
+        state = ensure_embedding_state(db)
+        if state.status not in ("backfilled", "indexed"):
+            raise ValueError(f"Re-embedding is {state.status}; finish the backfill first.")
+        generation, dimension = state.generation + 1, state.target_dimension
+
+    built = []
+    if dimension > HNSW_MAX_DIMENSION:
+        logger.warning(f"No HNSW index for {dimension}-dimension vectors (pgvector limit "
+                       f"{HNSW_MAX_DIMENSION}); searches will scan exactly.")
+    else:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f"SET maintenance_work_mem = '{REEMBED_INDEX_MEMORY}'"))
+            for table in EMBEDDED_TABLES:
+                name = _index_name(table.name, generation)
+                partitions = _partitions(conn, table.name)
+                if partitions is None:
+                    _create_index_concurrently(conn, name, table.name)
+                else:
+                    conn.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table.name} "
+                        f"USING hnsw ({SHADOW_COLUMN} vector_cosine_ops)"
+                    ))
+                    for partition in partitions:
+                        _create_index_concurrently(conn, _index_name(partition, generation), partition)
+                        conn.execute(text(f"ALTER INDEX {name} ATTACH PARTITION {_index_name(partition, generation)}"))
+                built.append(name)
+                logger.info(f"Re-embedding: built {name}", extra={"event": "reembed.indexed"})
+
+    with Session(engine) as db:
+        state = _lock_state(db)
+        state.status = "indexed"
+        db.commit()
+    return built
+
+
+# --- SWITCH ---
+def switch_to_target(engine: Engine, max_stragglers: int = REEMBED_MAX_STRAGGLERS,
+                     require_index: bool = True) -> Dict[str, int]:
+    """
+    Makes the target model active in one transaction: blocks writes to the
+    embedded tables (reads continue), embeds the rows the backfill missed,
+    swaps the columns by rename and resets the author and topic centroids
+    (rebuilt in the new space by their refresh loops). Returns the max
+    id per table at the switch, the watermark for repair_after_switch().
+    """
+    with Session(engine) as db:
+        state = _lock_state(db)
+        ready = ("indexed",) if require_index else ("backfilled", "indexed")
+        if state.status not in ready:
+            raise ValueError(f"Re-embedding is {state.status}; expected {' or '.join(ready)}.")
+        model, dimension = state.target_model, state.target_dimension
+
+        db.execute(text(f"SET LOCAL lock_timeout = '{REEMBED_LOCK_TIMEOUT}'"))
+        for table in EMBEDDED_TABLES:
+            db.execute(text(f"LOCK TABLE {table.name} IN SHARE ROW EXCLUSIVE MODE"))
+
+        stragglers = {
+            table: db.execute(text(
+                f"SELECT id, {table.text_column} FROM {table.name} WHERE {_pending_filter('0')} "
+                f"ORDER BY id LIMIT :limit"
+            ), {"limit": max_stragglers + 1}).all()
+            for table in EMBEDDED_TABLES
+        }
+        total = sum(len(rows) for rows in stragglers.values())
+        if total > max_stragglers:
+            raise ValueError(f"More than {max_stragglers} rows still lack a {model} vector; "
+                             f"run the backfill again before switching.")
+        for table, rows in stragglers.items():
+            for i in range(0, len(rows), REEMBED_BATCH_SIZE):
+                batch = rows[i:i + REEMBED_BATCH_SIZE]
+                _write_vectors(db.connection(), table.name, SHADOW_COLUMN, [r[0] for r in batch],
+                               _embed([r[1] for r in batch], model, dimension))
+
+        watermarks = {
+            table.name: db.execute(text(f"SELECT coalesce(max(id), 0) FROM {table.name}")).scalar()
+            for table in EMBEDDED_TABLES
+        }
+        for table in EMBEDDED_TABLES:
+            db.execute(text(f"ALTER TABLE {table.name} RENAME COLUMN embedding TO {PREVIOUS_COLUMN}"))
+            db.execute(text(f"ALTER TABLE {table.name} RENAME COLUMN {SHADOW_COLUMN} TO embedding"))
+        # Centroid tables live in the old vector space; their refresh loops rebuild them
+        db.execute(text(f"TRUNCATE {AuthorNeighbor.__tablename__}, {AuthorCentroid.__tablename__}, "
+                        f"{TopicCentroid.__tablename__}, {AuthorTopic.__tablename__}, {ChannelTopic.__tablename__}"))
+        for table in (AuthorCentroid.__tablename__, TopicCentroid.__tablename__):
+            db.execute(text(f"ALTER TABLE {table} ALTER COLUMN centroid TYPE vector({int(dimension)})"))
+
+        state.previous_model = state.active_model
+        state.active_model, state.active_dimension = model, dimension
+        state.generation += 1
+        state.target_model = state.target_dimension = None
+        state.status = "idle"
+        state.checkpoint = {"switch_watermarks": watermarks}
+        state.switched_at = func.now()
+        db.commit()
+
+    logger.info(f"Re-embedding: switched to {model} ({dimension} dims, {total} stragglers embedded)",
+                extra={"event": "reembed.switched"})
+    return watermarks
+
+
+def repair_after_switch(engine: Engine, watermarks: Dict[str, int],
+                        wait_seconds: float = EMBEDDING_STATE_TTL + 5) -> int:
+    """
+    Re-embeds rows inserted after the switch watermark once every process has
+    had EMBEDDING_STATE_TTL to see the new model: a process still on the old
+    model in that window may have stored an old-model vector. Returns the
+    number of rows re-embedded.
+    """
+    time.sleep(wait_seconds)
+    with Session(engine) as db:
+        state = ensure_embedding_state(db)
+        model, dimension = state.active_model, state.active_dimension
+    repaired = 0
+    for table in EMBEDDED_TABLES:
+        after = watermarks.get(table.name, 0)
+        while True:
+            with engine.connect() as conn:
+                rows = conn.execute(text(
+                    f"SELECT id, {table.text_column} FROM {table.name} "
+                    f"WHERE id > :after AND embedding IS NOT NULL ORDER BY id LIMIT :limit"
+                ), {"after": after, "limit": REEMBED_BATCH_SIZE}).all()
+            if not rows:
+                break
+            vectors = _embed([r[1] for r in rows], model, dimension)
+            with engine.begin() as conn:
+                _write_vectors(conn, table.name, "embedding", [r[0] for r in rows], vectors)
+            after = rows[-1][0]
+            repaired += len(rows)
+    return repaired
+
+
+def drop_previous_column(engine: Engine) -> List[str]:
+    """Drops the pre-switch vectors (embedding_prev) once the new model has proven itself."""
+    dropped = []
+    with Session(engine) as db:
+        state = _lock_state(db)
+        db.execute(text(f"SET LOCAL lock_timeout = '{REEMBED_LOCK_TIMEOUT}'"))
+        for table in EMBEDDED_TABLES:
+            if _has_column(db, table.name, PREVIOUS_COLUMN):
+                db.execute(text(f"ALTER TABLE {table.name} DROP COLUMN {PREVIOUS_COLUMN}"))
+                dropped.append(table.name)
+        state.previous_model = None
+        db.commit()
+    return dropped
+
+
+def abort_reembedding(engine: Engine) -> None:
+    """Drops the shadow column (and its indexes) and returns to idle; the active model is untouched."""
+    with Session(engine) as db:
+        state = _lock_state(db)
+        db.execute(text(f"SET LOCAL lock_timeout = '{REEMBED_LOCK_TIMEOUT}'"))
+        for table in EMBEDDED_TABLES:
+            db.execute(text(f"ALTER TABLE {table.name} DROP COLUMN IF EXISTS {SHADOW_COLUMN}"))
+        state.target_model = state.target_dimension = None
+        state.status = "idle"
+        state.checkpoint = {}
+        db.commit()
+
+
+def reembedding_status(engine: Engine) -> Dict[str, Any]:
+    """State plus per-table coverage (rows with a vector vs rows with a shadow vector)."""
+    with Session(engine) as db:
+        state = ensure_embedding_state(db)
+        db.commit()
+        status = {
+            "active_model": state.active_model,
+            "active_dimension": state.active_dimension,
+            "generation": state.generation,
+            "previous_model": state.previous_model,
+            "target_model": state.target_model,
+            "target_dimension": state.target_dimension,
+            "status": state.status,
+            "embedded": state.embedded,
+            "started_at": state.started_at,
+            "switched_at": state.switched_at,
+            "tables": {},
+        }
+        for table in EMBEDDED_TABLES:
+            if not _has_column(db, table.name, SHADOW_COLUMN):
+                continue
+            total, done = db.execute(text(
+                f"SELECT count(*) FILTER (WHERE embedding IS NOT NULL), "
+                f"count(*) FILTER (WHERE embedding IS NOT NULL AND {SHADOW_COLUMN} IS NOT NULL) "
+                f"FROM {table.name}"
+            )).one()
+            status["tables"][table.name] = {"vectors": total, "shadow_vectors": done}
+    return status
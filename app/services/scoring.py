@@ -0,0 +1,59 @@
+"""
+RETRIEVAL SCORING
+Blends vector similarity with recency decay, per-channel weights and
+engagement (reactions + replies) into one ranking score. The SQL form ranks an
+ANN candidate set inside the retrieval query; the Python form mirrors it for
+hits served from the in-process vector cache.
+
+    score = similarity
+          * ((1 - RECENCY_WEIGHT) + RECENCY_WEIGHT * 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS))
+          * channel_weight
+          * (1 + ENGAGEMENT_WEIGHT * ln(1 + reactions + replies))
+"""
+
+import os
+import math
+from datetime import datetime, timezone
+
+from sqlalchemy import case, func, literal
+
+# --- CONFIGURATION ---
+# Nearest neighbours fetched before re-ranking (per vector source)
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "50"))
+RECENCY_HALF_LIFE_DAYS = float(os.getenv("RECENCY_HALF_LIFE_DAYS", "180"))
+# 0 disables time decay, 1 lets it scale similarity all the way down
+RECENCY_WEIGHT = float(os.getenv("RECENCY_WEIGHT", "0.3"))
+ENGAGEMENT_WEIGHT = float(os.getenv("ENGAGEMENT_WEIGHT", "0.1"))
+# e.g. "123456789:1.5,987654321:0.5" (default weight 1)
+CHANNEL_WEIGHTS = {
+    channel_id.strip(): float(weight)
+    for channel_id, weight in (
+        pair.split(":") for pair in os.getenv("CHANNEL_WEIGHTS", "").split(",") if ":" in pair
+    )
+}
+
+
+def score_expression(distance, created_at, channel_id, reaction_count, reply_count):
+    """SQL expression for the blended score (higher is better)."""
+    age_days = func.extract("epoch", func.now() - created_at) / 86400.0
+    recency = (1.0 - RECENCY_WEIGHT) + RECENCY_WEIGHT * func.power(0.5, age_days / RECENCY_HALF_LIFE_DAYS)
+    if CHANNEL_WEIGHTS:
+        channel = case(
+            *[(channel_id == cid, weight) for cid, weight in CHANNEL_WEIGHTS.items()], else_=1.0
+        )
+    else:
+        channel = literal(1.0)
+    engagement = 1.0 + ENGAGEMENT_WEIGHT * func.ln(1.0 + reaction_count + reply_count)
+    return (1.0 - distance) * recency * channel * engagement
+
+
+def score(distance: float, created_at: datetime, channel_id: str,
+          reaction_count: int = 0, reply_count: int = 0) -> float:
+    """Python twin of score_expression()."""
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    age_days = max((datetime.now(timezone.utc) - created_at).total_seconds(), 0.0) / 86400.0
+    recency = (1.0 - RECENCY_WEIGHT) + RECENCY_WEIGHT * 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+    channel = CHANNEL_WEIGHTS.get(channel_id, 1.0)
+    engagement = 1.0 + ENGAGEMENT_WEIGHT * math.log(1.0 + reaction_count + reply_count)
+    return (1.0 - distance) * recency * channel * engagement
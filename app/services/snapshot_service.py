@@ -0,0 +1,361 @@
+"""
+CORPUS SNAPSHOT SERVICE
+Exports the embedding corpus to a columnar snapshot on disk:
+  - manifest.json            watermark, row count, dimension, part list
+  - part-<first>-<last>.parquet  ids, author/channel ids, timestamps, content
+  - embeddings.npy           float32 (rows x dim) matrix, memory-mapped on load
+  - chunks-<first>-<last>.parquet / chunk_embeddings.npy  the chunks of long
+    messages in the same parts; the parent row carries their mean vector
+Exports are incremental: only rows with id > the manifest watermark are appended.
+The watermark never passes a row younger than SNAPSHOT_SAFETY_SECONDS, so a
+lower id from a transaction still in flight is not skipped for good.
+"""
+
+import io
+import os
+import json
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from pgvector.sqlalchemy import Vector
+
+from app.models.message import DiscordMessage, MessageChunk
+from app.services.embedding_service import AppError, EMBEDDING_DIMENSION
+
+# --- CONFIGURATION ---
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNK_EMBEDDINGS_FILE = "chunk_embeddings.npy"
+EXPORT_BATCH_SIZE = int(os.getenv("SNAPSHOT_EXPORT_BATCH_SIZE", "5000"))
+IMPORT_BATCH_SIZE = int(os.getenv("SNAPSHOT_IMPORT_BATCH_SIZE", "1000"))
+# Rows inserted more recently than this are left for the next export. Must
+# exceed the longest ingest transaction (plus replica lag when exporting from one).
+SNAPSHOT_SAFETY_SECONDS = float(os.getenv("SNAPSHOT_SAFETY_SECONDS", "300"))
+
+SNAPSHOT_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("discord_id", pa.string()),
+    ("author_id", pa.string()),
+    ("channel_id", pa.string()),
+    ("guild_id", pa.string()),
+    ("created_at", pa.timestamp("us", tz="UTC")),
+    ("content", pa.string()),
+])
+
+CHUNK_SCHEMA = pa.schema([
+    ("message_id", pa.int64()),  # SNAPSHOT_SCHEMA id of the parent
+    ("chunk_index", pa.int32()),
+    ("guild_id", pa.string()),
+    ("created_at", pa.timestamp("us", tz="UTC")),
+    ("content", pa.string()),
+])
+
+
+@dataclass
+class SnapshotMessage:
+    """Lightweight stand-in for DiscordMessage rows read from a snapshot."""
+    id: int
+    discord_id: str
+    author_id: str
+    channel_id: str
+    guild_id: Optional[str]
+    created_at: datetime
+    content: str
+
+
+# --- MANIFEST / NPY HELPERS ---
+def _read_manifest(path: str) -> Dict[str, Any]:
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    manifest = {"watermark": 0, "rows": 0, "dim": EMBEDDING_DIMENSION, "parts": [],
+                "chunk_rows": 0, "chunk_parts": []}
+    if os.path.exists(manifest_path):
+        # Snapshots written before chunk export lack the chunk keys
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest.update(json.load(f))
+    return manifest
+
+
+def _write_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    """Atomically replaces the manifest; it is the commit point of an export."""
+    tmp_path = os.path.join(path, MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(path, MANIFEST_FILE))
+
+
+def _npy_header(rows: int, dim: int) -> bytes:
+    buffer = io.BytesIO()
+    np.lib.format.write_array_header_1_0(
+        buffer, {"descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+                 "fortran_order": False, "shape": (rows, dim)}
+    )
+    return buffer.getvalue()
+
+
+def _append_embeddings(path: str, existing_rows: int, block: np.ndarray,
+                       filename: str = EMBEDDINGS_FILE) -> None:
+    """
+    Appends a float32 block to an .npy matrix (embeddings.npy by default) in place.
+    Bytes past `existing_rows` (left by a crashed export) are truncated first,
+    and the header is rewritten for the new shape.
+    """
+    npy_path = os.path.join(path, filename)
+    dim = block.shape[1]
+    new_rows = existing_rows + block.shape[0]
+
+    if not os.path.exists(npy_path):
+        with open(npy_path, "wb") as f:
+            f.write(_npy_header(new_rows, dim))
+            f.write(block.tobytes())
+        return
+
+    with open(npy_path, "r+b") as f:
+        np.lib.format.read_magic(f)
+        np.lib.format.read_array_header_1_0(f)
+        old_header_len = f.tell()
+        new_header = _npy_header(new_rows, dim)
+
+        if len(new_header) != old_header_len:
+            # Shape grew past the header padding; rewrite the whole file once
+            f.seek(old_header_len)
+            data = f.read(existing_rows * dim * 4)
+            f.seek(0)
+            f.write(new_header)
+            f.write(data)
+            f.write(block.tobytes())
+            f.truncate()
+            return
+
+        # Data first, header last: a crash in between leaves a valid old-shape file
+        f.seek(old_header_len + existing_rows * dim * 4)
+        f.write(block.tobytes())
+        f.truncate()
+        f.seek(0)
+        f.write(new_header)
+
+
+# --- EXPORT ---
+def _check_dimension(manifest: Dict[str, Any], block: np.ndarray) -> None:
+    if block.shape[1] != manifest["dim"]:
+        raise AppError("Snapshot dimension mismatch.",
+                       context={"snapshot_dim": manifest["dim"], "row_dim": block.shape[1]})
+
+
+def export_snapshot(db: Session, path: str) -> int:
+    """
+    Appends every embedded message with id above the snapshot watermark, and
+    the chunks of long messages (whose parent row gets their mean vector).
+    Stops at the first row inserted within SNAPSHOT_SAFETY_SECONDS.
+    Returns the number of message rows exported.
+    """
+    os.makedirs(path, exist_ok=True)
+    manifest = _read_manifest(path)
+    watermark = manifest["watermark"]
+    exported = 0
+    settled_before = db.execute(select(func.now())).scalar() - timedelta(seconds=SNAPSHOT_SAFETY_SECONDS)
+    chunk_mean = (
+        select(func.avg(MessageChunk.embedding, type_=Vector()))
+        .where(MessageChunk.message_id == DiscordMessage.id, MessageChunk.created_at == DiscordMessage.created_at)
+        .scalar_subquery()
+    )
+
+    while True:
+        rows = db.execute(
+            select(
+                DiscordMessage.id, DiscordMessage.discord_id, DiscordMessage.author_id,
+                DiscordMessage.channel_id, DiscordMessage.guild_id, DiscordMessage.created_at,
+                DiscordMessage.content, DiscordMessage.ingested_at,
+                func.coalesce(DiscordMessage.embedding, chunk_mean).label("embedding"),
+            )
+            .where(DiscordMessage.id > watermark)
+            .order_by(DiscordMessage.id)
+            .limit(EXPORT_BATCH_SIZE)
+        ).all()
+        # Only the prefix inserted before the safety window (NULL predates the column)
+        settled = len(rows)
+        for i, row in enumerate(rows):
+            if row.ingested_at is not None and row.ingested_at >= settled_before:
+                settled = i
+                break
+        if not settled:
+            break
+        last_seen = rows[settled - 1].id
+        rows = [row for row in rows[:settled] if row.embedding is not None]
+        if not rows:
+            # Nothing embedded in this range (compacted or filtered rows)
+            manifest["watermark"] = watermark = last_seen
+            _write_manifest(path, manifest)
+            continue
+
+        first_id, last_id = rows[0].id, rows[-1].id
+        block = np.asarray([row.embedding for row in rows], dtype=np.float32)
+        _check_dimension(manifest, block)
+
+        # Chunks commit with their parent, so the parents' range covers them
+        chunks = db.execute(
+            select(MessageChunk.message_id, MessageChunk.chunk_index, MessageChunk.guild_id,
+                   MessageChunk.created_at, MessageChunk.content, MessageChunk.embedding)
+            .where(MessageChunk.message_id.between(first_id, last_id), MessageChunk.embedding.is_not(None))
+            .order_by(MessageChunk.message_id, MessageChunk.chunk_index)
+        ).all()
+        if chunks:
+            chunk_block = np.asarray([chunk.embedding for chunk in chunks], dtype=np.float32)
+            _check_dimension(manifest, chunk_block)
+            chunk_part = f"chunks-{first_id:012d}-{last_id:012d}.parquet"
+            pq.write_table(pa.table({
+                "message_id": [chunk.message_id for chunk in chunks],
+                "chunk_index": [chunk.chunk_index for chunk in chunks],
+                "guild_id": [chunk.guild_id for chunk in chunks],
+                "created_at": [chunk.created_at for chunk in chunks],
+                "content": [chunk.content for chunk in chunks],
+            }, schema=CHUNK_SCHEMA), os.path.join(path, chunk_part), compression="zstd")
+            _append_embeddings(path, manifest["chunk_rows"], chunk_block, CHUNK_EMBEDDINGS_FILE)
+
+        part_name = f"part-{first_id:012d}-{last_id:012d}.parquet"
+        table = pa.table({
+            "id": [row.id for row in rows],
+            "discord_id": [row.discord_id for row in rows],
+            "author_id": [row.author_id for row in rows],
+            "channel_id": [row.channel_id for row in rows],
+            "guild_id": [row.guild_id for row in rows],
+            "created_at": [row.created_at for row in rows],
+            "content": [row.content for row in rows],
+        }, schema=SNAPSHOT_SCHEMA)
+        pq.write_table(table, os.path.join(path, part_name), compression="zstd")
+        _append_embeddings(path, manifest["rows"], block)
+
+        manifest["rows"] += len(rows)
+        manifest["watermark"] = last_seen
+        manifest["parts"].append(part_name)
+        if chunks:
+            manifest["chunk_rows"] += len(chunks)
+            manifest["chunk_parts"].append(chunk_part)
+        manifest["exported_at"] = datetime.now(timezone.utc).isoformat()
+        _write_manifest(path, manifest)
+
+        watermark = last_seen
+        exported += len(rows)
+
+    return exported
+
+
+# --- LOAD ---
+class CorpusSnapshot:
+    """
+    Read-only view of an exported snapshot.
+    Metadata columns are loaded into memory; the embedding matrix stays memory-mapped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.manifest = _read_manifest(path)
+        rows = self.manifest["rows"]
+
+        if rows:
+            table = pa.concat_tables(
+                [pq.read_table(os.path.join(path, part)) for part in self.manifest["parts"]]
+            )
+            self.ids = table.column("id").to_numpy()
+            self.author_ids = np.asarray(table.column("author_id").to_pylist(), dtype=object)
+            self._table = table
+            # Crashed exports can leave rows past the manifest; never read them
+            self.embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r")[:rows]
+        else:
+            self.ids = np.array([], dtype=np.int64)
+            self.author_ids = np.array([], dtype=object)
+            self._table = None
+            self.embeddings = np.empty((0, self.manifest["dim"]), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self.manifest["rows"]
+
+    def messages(self, indices: Optional[np.ndarray] = None) -> List[SnapshotMessage]:
+        """Materializes message rows (all, or the given row indices)."""
+        if self._table is None:
+            return []
+        table = self._table if indices is None else self._table.take(pa.array(indices))
+        return [SnapshotMessage(**row) for row in table.to_pylist()]
+
+    def author_indices(self, author_id: str) -> np.ndarray:
+        """Row indices for one author, most recent first."""
+        indices = np.flatnonzero(self.author_ids == author_id)
+        return indices[::-1]
+
+    def author_counts(self) -> Dict[str, int]:
+        authors, counts = np.unique(self.author_ids, return_counts=True)
+        return dict(zip(authors.tolist(), counts.tolist()))
+
+    def chunk_rows(self) -> Dict[int, List[Dict[str, Any]]]:
+        """Chunks per parent snapshot id, each with its embedding (read on demand)."""
+        rows = self.manifest["chunk_rows"]
+        if not rows:
+            return {}
+        table = pa.concat_tables(
+            [pq.read_table(os.path.join(self.path, part)) for part in self.manifest["chunk_parts"]]
+        )
+        embeddings = np.load(os.path.join(self.path, CHUNK_EMBEDDINGS_FILE), mmap_mode="r")[:rows]
+        by_parent: Dict[int, List[Dict[str, Any]]] = {}
+        for i, chunk in enumerate(table.slice(0, rows).to_pylist()):
+            chunk["embedding"] = np.asarray(embeddings[i])
+            by_parent.setdefault(chunk.pop("message_id"), []).append(chunk)
+        return by_parent
+
+
+# --- IMPORT ---
+def import_snapshot(db: Session, path: str) -> int:
+    """
+    Restores a snapshot into discord_messages without re-embedding.
+    Rows already present (same discord_id and created_at) are skipped; long
+    messages are restored as a vector-less parent plus their chunks.
+    Returns the number of rows read from the snapshot.
+    """
+    snapshot = CorpusSnapshot(path)
+    total = len(snapshot)
+    chunks = snapshot.chunk_rows()
+
+    for start in range(0, total, IMPORT_BATCH_SIZE):
+        indices = np.arange(start, min(start + IMPORT_BATCH_SIZE, total))
+        messages = snapshot.messages(indices)
+        values = [
+            {
+                "discord_id": msg.discord_id,
+                "author_id": msg.author_id,
+                "channel_id": msg.channel_id,
+                "guild_id": msg.guild_id,
+                "created_at": msg.created_at,
+                "content": msg.content,
+                # A chunked parent's snapshot vector is the mean of its chunks
+                "embedding": None if msg.id in chunks else np.asarray(snapshot.embeddings[i]),
+            }
+            for i, msg in zip(indices, messages)
+        ]
+        inserted = db.execute(
+            pg_insert(DiscordMessage)
+            .values(values)
+            .on_conflict_do_nothing(constraint="uq_discord_messages_discord_id_created_at")
+            .returning(DiscordMessage.id, DiscordMessage.discord_id, DiscordMessage.created_at)
+        ).all()
+
+        # Snapshot ids are the source database's; map them to the new rows
+        new_ids = {(discord_id, created_at): new_id for new_id, discord_id, created_at in inserted}
+        chunk_values = [
+            {**chunk, "message_id": new_ids[(msg.discord_id, msg.created_at)]}
+            for msg in messages if msg.id in chunks and (msg.discord_id, msg.created_at) in new_ids
+            for chunk in chunks[msg.id]
+        ]
+        if chunk_values:
+            db.execute(
+                pg_insert(MessageChunk)
+                .values(chunk_values)
+                .on_conflict_do_nothing(constraint="uq_discord_message_chunks_message_chunk")
+            )
+        db.commit()
+
+    return total
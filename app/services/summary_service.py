@@ -0,0 +1,217 @@
+"""
+ROLLING CHANNEL SUMMARIES
+Keeps an LLM summary per channel per day, updated incrementally: once a day
+bucket has SUMMARY_MIN_NEW_MESSAGES messages past its watermark, the previous
+summary plus only those messages are condensed into the new one. Day
+summaries roll up into week summaries. Each summary carries its own embedding,
+so retrieval can pull a couple of them as cheap, high-coverage context and
+!recap can answer without calling the LLM.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import select, func, and_, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, aliased
+
+from app.core.logger import logger
+from app.core.prompts import build_summary_messages, build_rollup_messages
+from app.models.message import DiscordMessage
+from app.models.summary import ChannelSummary
+from app.services.embedding_service import get_embedding_service
+
+# --- CONFIGURATION ---
+SUMMARY_MIN_NEW_MESSAGES = int(os.getenv("SUMMARY_MIN_NEW_MESSAGES", "25"))
+# Seconds between background refreshes (0 disables the refresh loop)
+SUMMARY_REFRESH_SECONDS = int(os.getenv("SUMMARY_REFRESH_SECONDS", "600"))
+SUMMARY_LOOKBACK_DAYS = int(os.getenv("SUMMARY_LOOKBACK_DAYS", "14"))
+SUMMARY_MAX_INPUT_MESSAGES = int(os.getenv("SUMMARY_MAX_INPUT_MESSAGES", "200"))
+SUMMARY_MAX_CHARS_PER_MESSAGE = int(os.getenv("SUMMARY_MAX_CHARS_PER_MESSAGE", "300"))
+# Summaries added to RAG context per question (0 disables)
+SUMMARY_CONTEXT_K = int(os.getenv("SUMMARY_CONTEXT_K", "2"))
+# Batches of new messages folded into one day summary per refresh cycle
+SUMMARY_MAX_STEPS = 5
+
+_ADVISORY_LOCK_KEY = 0x53554D4D  # "SUMM"
+
+
+def _day_start(dt: datetime) -> datetime:
+    dt = dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _week_start(dt: datetime) -> datetime:
+    day = _day_start(dt)
+    return day - timedelta(days=day.weekday())
+
+
+def _complete(messages) -> str:
+    from app.services.retrieval_service import get_chat_client, CHAT_MODEL
+    response = get_chat_client().chat.completions.create(model=CHAT_MODEL, messages=messages, temperature=0.2)
+    return response.choices[0].message.content.strip()
+
+
+def _upsert(db: Session, values: dict) -> None:
+    statement = pg_insert(ChannelSummary).values(**values)
+    db.execute(statement.on_conflict_do_update(
+        constraint="uq_channel_summaries_bucket",
+        set_={key: statement.excluded[key]
+              for key in ("summary", "message_count", "last_message_id", "embedding")}
+              | {"updated_at": func.now()},
+    ))
+
+
+def pending_day_buckets(db: Session) -> List[Tuple[Optional[str], str, datetime]]:
+    """
+    (guild_id, channel_id, day) buckets with enough messages past their
+    watermark. Closed days (before today) are finalised with any remainder.
+    """
+    summary = aliased(ChannelSummary)
+    day = func.date_trunc("day", DiscordMessage.created_at)
+    today = _day_start(datetime.now(timezone.utc))
+    rows = db.execute(
+        select(DiscordMessage.guild_id, DiscordMessage.channel_id, day, func.count(DiscordMessage.id))
+        .outerjoin(summary, and_(summary.channel_id == DiscordMessage.channel_id,
+                                 summary.granularity == "day", summary.bucket_start == day))
+        .where(DiscordMessage.created_at >= today - timedelta(days=SUMMARY_LOOKBACK_DAYS),
+               DiscordMessage.id > func.coalesce(summary.last_message_id, 0))
+        .group_by(DiscordMessage.guild_id, DiscordMessage.channel_id, day)
+    ).all()
+    return [
+        (guild_id, channel_id, _day_start(bucket))
+        for guild_id, channel_id, bucket, count in rows
+        if count >= SUMMARY_MIN_NEW_MESSAGES or _day_start(bucket) < today
+    ]
+
+
+def update_day_summary(db: Session, guild_id: Optional[str], channel_id: str, day: datetime) -> int:
+    """Folds messages past the watermark into the day's summary; returns messages added."""
+    existing = db.scalar(select(ChannelSummary).where(
+        ChannelSummary.channel_id == channel_id, ChannelSummary.granularity == "day",
+        ChannelSummary.bucket_start == day
+    ))
+    summary = existing.summary if existing else ""
+    message_count = existing.message_count if existing else 0
+    watermark = existing.last_message_id if existing else 0
+
+    added = 0
+    for _ in range(SUMMARY_MAX_STEPS):
+        messages = db.execute(
+            select(DiscordMessage.id, DiscordMessage.author_id, DiscordMessage.content)
+            .where(DiscordMessage.channel_id == channel_id, DiscordMessage.id > watermark,
+                   DiscordMessage.created_at >= day, DiscordMessage.created_at < day + timedelta(days=1))
+            .order_by(DiscordMessage.id)
+            .limit(SUMMARY_MAX_INPUT_MESSAGES)
+        ).all()
+        if not messages:
+            break
+        lines = "\n".join(f"[{m.author_id}] {m.content[:SUMMARY_MAX_CHARS_PER_MESSAGE]}" for m in messages)
+        summary = _complete(build_summary_messages(summary, lines))
+        watermark = messages[-1].id
+        message_count += len(messages)
+        added += len(messages)
+        if len(messages) < SUMMARY_MAX_INPUT_MESSAGES:
+            break
+
+    if added:
+        _upsert(db, {
+            "guild_id": guild_id, "channel_id": channel_id, "granularity": "day", "bucket_start": day,
+            "summary": summary, "message_count": message_count, "last_message_id": watermark,
+            "embedding": get_embedding_service().embed_batch([summary])[0],
+        })
+        db.commit()
+    return added
+
+
+def update_week_summary(db: Session, guild_id: Optional[str], channel_id: str, week: datetime) -> None:
+    """Re-rolls a week summary from its day summaries."""
+    days = db.scalars(
+        select(ChannelSummary)
+        .where(ChannelSummary.channel_id == channel_id, ChannelSummary.granularity == "day",
+               ChannelSummary.bucket_start >= week, ChannelSummary.bucket_start < week + timedelta(days=7))
+        .order_by(ChannelSummary.bucket_start)
+    ).all()
+    if not days:
+        return
+    if len(days) == 1:
+        summary, embedding = days[0].summary, days[0].embedding
+    else:
+        summary = _complete(build_rollup_messages("\n\n".join(
+            f"{d.bucket_start:%A %Y-%m-%d} ({d.message_count} msgs):\n{d.summary}" for d in days
+        )))
+        embedding = get_embedding_service().embed_batch([summary])[0]
+    _upsert(db, {
+        "guild_id": guild_id, "channel_id": channel_id, "granularity": "week", "bucket_start": week,
+        "summary": summary, "message_count": sum(d.message_count for d in days),
+        "last_message_id": max(d.last_message_id for d in days), "embedding": embedding,
+    })
+    db.commit()
+
+
+def refresh_summaries(db: Session) -> Optional[int]:
+    """
+    One refresh cycle: updates every pending day bucket, then the weeks they
+    belong to. Returns the number of day summaries updated, or None when
+    another process holds the refresh lock.
+    """
+    # Session-level lock on a dedicated connection: the cycle commits per
+    # bucket, and the Session may hand its connection back to the pool.
+    lock_conn = db.get_bind().connect()
+    if not lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": _ADVISORY_LOCK_KEY}).scalar():
+        lock_conn.close()
+        return None
+    try:
+        updated = 0
+        weeks: Set[Tuple[Optional[str], str, datetime]] = set()
+        for guild_id, channel_id, day in pending_day_buckets(db):
+            try:
+                if update_day_summary(db, guild_id, channel_id, day):
+                    updated += 1
+                    weeks.add((guild_id, channel_id, _week_start(day)))
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Summary update failed for channel {channel_id} ({day:%Y-%m-%d}): {e}")
+        for guild_id, channel_id, week in weeks:
+            try:
+                update_week_summary(db, guild_id, channel_id, week)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Week rollup failed for channel {channel_id} ({week:%Y-%m-%d}): {e}")
+        if updated:
+            logger.info(f"Channel summaries refreshed: {updated} day bucket(s), {len(weeks)} week(s).")
+        return updated
+    finally:
+        lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+        lock_conn.close()
+
+
+def summary_context(db: Session, query_vector, guild_id: Optional[str],
+                    k: int = SUMMARY_CONTEXT_K) -> List[ChannelSummary]:
+    """The k summaries closest to the query (day and week), for RAG context."""
+    if k <= 0 or not guild_id:
+        return []
+    return db.scalars(
+        select(ChannelSummary)
+        .where(ChannelSummary.guild_id == guild_id, ChannelSummary.embedding.is_not(None))
+        .order_by(ChannelSummary.embedding.cosine_distance(query_vector))
+        .limit(k)
+    ).all()
+
+
+def get_recap(db: Session, channel_id: str, days: int = 1) -> List[ChannelSummary]:
+    """
+    Stored summaries covering the last `days` days of a channel, oldest first:
+    day summaries up to a week, week summaries beyond that.
+    """
+    since = _day_start(datetime.now(timezone.utc)) - timedelta(days=max(days, 1) - 1)
+    granularity = "day" if days <= 7 else "week"
+    if granularity == "week":
+        since = _week_start(since)
+    return db.scalars(
+        select(ChannelSummary)
+        .where(ChannelSummary.channel_id == channel_id, ChannelSummary.granularity == granularity,
+               ChannelSummary.bucket_start >= since)
+        .order_by(ChannelSummary.bucket_start)
+    ).all()
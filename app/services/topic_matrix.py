@@ -0,0 +1,316 @@
+"""
+AUTHOR x TOPIC MATRIX
+Sparse message counts per (author, topic) and (channel, topic) against a
+stored topic model, so !mindmap shows what someone talks about with one
+indexed read instead of a profile scan plus a clustering run.
+Ingestion assigns each embedded message to its nearest topic centroid (one
+matmul over the normalised centroid matrix) and increments both counts in
+the insert's transaction. That transaction locks the count tables before it
+checks the stored model version, so it waits out a rebuild in progress and
+then counts against the new centroids, never the replaced ones.
+rebuild_topic_model() re-clusters a sample of recent embeddings and recounts
+the corpus; the bot runs it when no model exists and every
+TOPIC_MODEL_REFRESH_HOURS.
+"""
+
+import os
+import time
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from pgvector.sqlalchemy import Vector
+
+from app.core.logger import logger
+from app.core.partitions import searchable_criteria
+from app.models.message import DiscordMessage, MessageChunk
+from app.models.topics import TopicCentroid, AuthorTopic, ChannelTopic
+
+# --- CONFIGURATION ---
+TOPIC_COUNT = int(os.getenv("TOPIC_COUNT", "24"))
+# Recent embeddings k-means is fitted on (assignment covers the whole corpus)
+TOPIC_SAMPLE_SIZE = int(os.getenv("TOPIC_SAMPLE_SIZE", "20000"))
+# Model age that triggers a rebuild (0 = only build when missing)
+TOPIC_MODEL_REFRESH_HOURS = float(os.getenv("TOPIC_MODEL_REFRESH_HOURS", "168"))
+# How often assign() looks for a rebuilt model outside record_topics (which always checks)
+TOPIC_MODEL_TTL = 60.0
+TOPIC_SCAN_BATCH = 5000
+
+# Serialises rebuilds across bot processes
+_ADVISORY_LOCK_KEY = 0x544F504943  # "TOPIC"
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class TopicAssigner:
+    """Normalised centroid matrix of the stored model; reloaded when a rebuild replaces it."""
+
+    def __init__(self):
+        self.topic_ids = np.empty(0, dtype=np.int64)
+        self.matrix: Optional[np.ndarray] = None
+        self.version = None
+        self.checked_at = float("-inf")
+        self.lock = threading.Lock()
+
+    def load(self, rows: Sequence[Tuple[int, Sequence[float]]], version=None) -> None:
+        self.topic_ids = np.array([topic_id for topic_id, _ in rows], dtype=np.int64)
+        self.matrix = _normalize(np.asarray([c for _, c in rows], dtype=np.float32)) if rows else None
+        self.version = version
+
+    def _refresh(self, db: Session, verify: bool = False) -> None:
+        if not verify and time.monotonic() - self.checked_at < TOPIC_MODEL_TTL:
+            return
+        self.checked_at = time.monotonic()
+        version = tuple(db.execute(select(func.max(TopicCentroid.computed_at), func.count())).one())
+        if version != self.version:
+            self.load(db.execute(
+                select(TopicCentroid.topic_id, TopicCentroid.centroid).order_by(TopicCentroid.topic_id)
+            ).all(), version)
+
+    def assign(self, db: Session, vectors: Sequence[Sequence[float]], verify: bool = False) -> List[Optional[int]]:
+        """
+        Nearest topic (cosine) per vector; None without a model or in another
+        embedding space. `verify` checks the stored model version now instead
+        of trusting a check younger than TOPIC_MODEL_TTL.
+        """
+        with self.lock:
+            self._refresh(db, verify)
+            matrix, topic_ids = self.matrix, self.topic_ids
+        if matrix is None or not len(vectors):
+            return [None] * len(vectors)
+        batch = np.asarray(vectors, dtype=np.float32)
+        if batch.shape[1] != matrix.shape[1]:
+            return [None] * len(vectors)
+        # Row norms of the batch don't change the argmax
+        return topic_ids[np.argmax(batch @ matrix.T, axis=1)].tolist()
+
+
+def get_topic_assigner() -> TopicAssigner:
+    """Dependency function for the process-wide assigner."""
+    if not hasattr(get_topic_assigner, 'instance'):
+        get_topic_assigner.instance = TopicAssigner()
+    return get_topic_assigner.instance
+
+
+def _upsert_counts(db: Session, model, key: str, counts: Counter) -> None:
+    # Sorted keys: concurrent ingesters lock rows in the same order
+    statement = pg_insert(model).values([
+        {key: k, "topic_id": topic_id, "message_count": n} for (k, topic_id), n in sorted(counts.items())
+    ])
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[key, "topic_id"],
+        set_={"message_count": model.message_count + statement.excluded.message_count},
+    ))
+
+
+def record_topics(db: Session, messages: Iterable[Tuple[str, str, Optional[Sequence[float]]]]) -> None:
+    """
+    Adds (author_id, channel_id, vector) messages to the topic matrix; messages
+    without a vector are not counted. Call inside the inserting transaction.
+    """
+    messages = [m for m in messages if m[2] is not None]
+    if not messages:
+        return
+    # Conflicts with the rebuild's EXCLUSIVE lock: a rebuild in progress
+    # commits first, and the version read below then sees its centroids.
+    db.execute(text(
+        f"LOCK TABLE {AuthorTopic.__tablename__}, {ChannelTopic.__tablename__} IN ROW EXCLUSIVE MODE"
+    ))
+    topics = get_topic_assigner().assign(db, [vector for _, _, vector in messages], verify=True)
+    authors: Counter = Counter()
+    channels: Counter = Counter()
+    for (author_id, channel_id, _), topic_id in zip(messages, topics):
+        if topic_id is not None:
+            authors[(author_id, topic_id)] += 1
+            channels[(channel_id, topic_id)] += 1
+    if authors:
+        _upsert_counts(db, AuthorTopic, "author_id", authors)
+        _upsert_counts(db, ChannelTopic, "channel_id", channels)
+
+
+# --- REBUILD ---
+def _vector_batches(db: Session, after: int, upto: Optional[int] = None
+                    ) -> Iterator[List[Tuple[int, str, str, Sequence[float]]]]:
+    """
+    (message id, author, channel, vector) in id-keyset batches: whole-message
+    embeddings, then long messages as the mean of their chunk embeddings.
+    """
+    bound = [DiscordMessage.id <= upto] if upto is not None else []
+    sources = [
+        lambda start: select(DiscordMessage.id, DiscordMessage.author_id, DiscordMessage.channel_id,
+                             DiscordMessage.embedding)
+        .where(DiscordMessage.id > start, DiscordMessage.embedding.is_not(None), *bound)
+        .order_by(DiscordMessage.id),
+        lambda start: select(MessageChunk.message_id, DiscordMessage.author_id, DiscordMessage.channel_id,
+                             func.avg(MessageChunk.embedding, type_=Vector()))
+        .join(DiscordMessage, (DiscordMessage.id == MessageChunk.message_id)
+              & (DiscordMessage.created_at == MessageChunk.created_at))
+        .where(MessageChunk.message_id > start, MessageChunk.embedding.is_not(None), *bound)
+        .group_by(MessageChunk.message_id, DiscordMessage.author_id, DiscordMessage.channel_id)
+        .order_by(MessageChunk.message_id),
+    ]
+    for statement in sources:
+        start = after
+        while True:
+            rows = db.execute(statement(start).limit(TOPIC_SCAN_BATCH)).all()
+            if not rows:
+                break
+            yield rows
+            start = rows[-1][0]
+
+
+def _count(db: Session, assigner: TopicAssigner, after: int, upto: Optional[int],
+           authors: Counter, channels: Counter, totals: Counter) -> None:
+    for rows in _vector_batches(db, after, upto):
+        for (_, author_id, channel_id, _), topic_id in zip(rows, assigner.assign(db, [r[3] for r in rows])):
+            if topic_id is not None:
+                authors[(author_id, topic_id)] += 1
+                channels[(channel_id, topic_id)] += 1
+                totals[topic_id] += 1
+
+
+def topic_model_built_at(db: Session) -> Optional[datetime]:
+    return db.execute(select(func.max(TopicCentroid.computed_at))).scalar()
+
+
+def rebuild_topic_model(db: Session, n_topics: int = TOPIC_COUNT) -> Optional[int]:
+    """
+    Fits k-means on the most recent embeddings, then recounts every embedded
+    message against the new centroids up to a watermark. The swap happens
+    under an EXCLUSIVE lock on the count tables, which record_topics also
+    locks before reading the model version: ingesters committed before the
+    lock are recounted here (messages after the watermark included), and
+    later ones wait and count against the new model.
+    Returns the number of topics, or None when another process is rebuilding
+    or there is too little data.
+    """
+    if not db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _ADVISORY_LOCK_KEY}).scalar():
+        return None
+    from sklearn.cluster import KMeans  # heavy import, paid only by the rebuilding process
+
+    sample = db.execute(
+        select(DiscordMessage.content, DiscordMessage.embedding)
+        .where(*searchable_criteria())
+        .order_by(DiscordMessage.id.desc())
+        .limit(TOPIC_SAMPLE_SIZE)
+    ).all()
+    if len(sample) < n_topics * 10:
+        db.rollback()
+        return None
+
+    embeddings = _normalize(np.asarray([e for _, e in sample], dtype=np.float32))
+    kmeans = KMeans(n_clusters=n_topics, random_state=42, n_init=3).fit(embeddings)
+    centroids = kmeans.cluster_centers_
+    labels = [
+        sample[int(np.argmax(embeddings @ centroid))].content[:120] for centroid in _normalize(centroids)
+    ]
+    assigner = TopicAssigner()
+    assigner.load(list(enumerate(centroids.tolist())))
+    assigner.checked_at = float("inf")  # never reload from the old stored model
+
+    watermark = db.execute(select(func.coalesce(func.max(DiscordMessage.id), 0))).scalar()
+    authors: Counter = Counter()
+    channels: Counter = Counter()
+    totals: Counter = Counter()
+    _count(db, assigner, 0, watermark, authors, channels, totals)
+
+    db.execute(text(
+        f"LOCK TABLE {TopicCentroid.__tablename__}, {AuthorTopic.__tablename__}, "
+        f"{ChannelTopic.__tablename__} IN EXCLUSIVE MODE"
+    ))
+    _count(db, assigner, watermark, None, authors, channels, totals)
+    db.execute(text(
+        f"TRUNCATE {TopicCentroid.__tablename__}, {AuthorTopic.__tablename__}, {ChannelTopic.__tablename__}"
+    ))
+    db.execute(pg_insert(TopicCentroid).values([
+        {"topic_id": topic_id, "centroid": centroid, "label": label, "message_count": totals[topic_id]}
+        for topic_id, (centroid, label) in enumerate(zip(centroids.tolist(), labels))
+    ]))
+    for model, key, counts in ((AuthorTopic, "author_id", authors), (ChannelTopic, "channel_id", channels)):
+        values = [{key: k, "topic_id": topic_id, "message_count": n} for (k, topic_id), n in counts.items()]
+        for start in range(0, len(values), 5000):
+            db.execute(pg_insert(model).values(values[start:start + 5000]))
+    db.commit()
+    get_topic_assigner().checked_at = float("-inf")
+
+    logger.info(f"Topic model rebuilt: {n_topics} topics, {sum(totals.values())} messages assigned, "
+                f"{len(authors)} author cells.", extra={"event": "topics.rebuilt"})
+    return n_topics
+
+
+def recount_topic_counts(db: Session) -> Optional[int]:
+    """
+    Recounts the author and channel topic cells against the stored model
+    (no re-clustering), e.g. after retention dropped messages that are still
+    counted. Uses the rebuild's lock protocol. Returns the number of messages
+    assigned, or None without a model or while a rebuild runs.
+    """
+    if not db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _ADVISORY_LOCK_KEY}).scalar():
+        return None
+    stored = db.execute(
+        select(TopicCentroid.topic_id, TopicCentroid.centroid).order_by(TopicCentroid.topic_id)
+    ).all()
+    if not stored:
+        db.rollback()
+        return None
+    assigner = TopicAssigner()
+    assigner.load(stored)
+    assigner.checked_at = float("inf")
+
+    watermark = db.execute(select(func.coalesce(func.max(DiscordMessage.id), 0))).scalar()
+    authors: Counter = Counter()
+    channels: Counter = Counter()
+    totals: Counter = Counter()
+    _count(db, assigner, 0, watermark, authors, channels, totals)
+    db.execute(text(
+        f"LOCK TABLE {AuthorTopic.__tablename__}, {ChannelTopic.__tablename__} IN EXCLUSIVE MODE"
+    ))
+    _count(db, assigner, watermark, None, authors, channels, totals)
+    db.execute(text(f"TRUNCATE {AuthorTopic.__tablename__}, {ChannelTopic.__tablename__}"))
+    for model, key, counts in ((AuthorTopic, "author_id", authors), (ChannelTopic, "channel_id", channels)):
+        values = [{key: k, "topic_id": topic_id, "message_count": n} for (k, topic_id), n in counts.items()]
+        for start in range(0, len(values), 5000):
+            db.execute(pg_insert(model).values(values[start:start + 5000]))
+    db.commit()
+    return sum(totals.values())
+
+
+def rebuild_topic_model_if_stale(db: Session) -> Optional[int]:
+    """Builds the model when none exists, or rebuilds it once older than TOPIC_MODEL_REFRESH_HOURS."""
+    built_at = topic_model_built_at(db)
+    if built_at is not None and (
+        TOPIC_MODEL_REFRESH_HOURS <= 0
+        or datetime.now(timezone.utc) - built_at < timedelta(hours=TOPIC_MODEL_REFRESH_HOURS)
+    ):
+        return None
+    return rebuild_topic_model(db)
+
+
+# --- QUERIES ---
+def author_topics(db: Session, author_id: str) -> List[Tuple[int, str, int]]:
+    """An author's (topic_id, label, message_count), largest first (one primary-key range read)."""
+    return db.execute(
+        select(AuthorTopic.topic_id, TopicCentroid.label, AuthorTopic.message_count)
+        .join(TopicCentroid, TopicCentroid.topic_id == AuthorTopic.topic_id)
+        .where(AuthorTopic.author_id == author_id)
+        .order_by(AuthorTopic.message_count.desc())
+    ).all()
+
+
+def channel_topics(db: Session, channel_id: str) -> List[Tuple[int, str, int]]:
+    """A channel's (topic_id, label, message_count), largest first."""
+    return db.execute(
+        select(ChannelTopic.topic_id, TopicCentroid.label, ChannelTopic.message_count)
+        .join(TopicCentroid, TopicCentroid.topic_id == ChannelTopic.topic_id)
+        .where(ChannelTopic.channel_id == channel_id)
+        .order_by(ChannelTopic.message_count.desc())
+    ).all()
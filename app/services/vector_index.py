@@ -0,0 +1,396 @@
+"""
+IN-PROCESS VECTOR INDEX (Hot Guild Warm Cache)
+Keeps a normalized float32 embedding matrix plus the context fields RAG needs
+for the most active guilds, so top-k retrieval for them skips the database.
+Small guilds use exact matmul search; large ones use HNSW when hnswlib is installed.
+Chunks of long messages are indexed alongside whole messages and collapsed per
+parent message at search time.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from app.core.logger import logger
+from app.core.partitions import searchable_criteria, chunk_searchable_criteria
+from app.models.message import DiscordMessage, MessageChunk, EMBEDDING_DIMENSION
+
+try:
+    import hnswlib
+except ImportError:  # Optional: exact search is used for every guild without it
+    hnswlib = None
+
+# --- CONFIGURATION ---
+VECTOR_CACHE_ENABLED = os.getenv("VECTOR_CACHE_ENABLED", "false").lower() == "true"
+# Explicit hot guilds (comma-separated IDs); otherwise the N guilds with the most messages
+VECTOR_CACHE_GUILDS = [g.strip() for g in os.getenv("VECTOR_CACHE_GUILDS", "").split(",") if g.strip()]
+VECTOR_CACHE_TOP_GUILDS = int(os.getenv("VECTOR_CACHE_TOP_GUILDS", "3"))
+VECTOR_CACHE_MAX_MB = float(os.getenv("VECTOR_CACHE_MAX_MB", "512"))
+VECTOR_CACHE_HNSW_THRESHOLD = int(os.getenv("VECTOR_CACHE_HNSW_THRESHOLD", "50000"))
+VECTOR_CACHE_VERIFY_INTERVAL = int(os.getenv("VECTOR_CACHE_VERIFY_INTERVAL", "300"))
+# An evicted hot guild is reloaded on its next miss, but not sooner than this
+# after its eviction, so two guilds that don't fit together can't thrash
+VECTOR_CACHE_RELOAD_COOLDOWN = float(os.getenv("VECTOR_CACHE_RELOAD_COOLDOWN", "600"))
+VECTOR_CACHE_LOAD_BATCH = 5000
+
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+# Candidates fetched per requested hit so chunk-heavy results still yield k distinct messages
+CHUNK_OVERFETCH = 4
+
+
+@dataclass
+class IndexedMessage:
+    """The subset of DiscordMessage fields needed to build RAG context."""
+    id: int
+    author_id: str
+    channel_id: str
+    created_at: datetime
+    content: str
+    chunk_index: Optional[int] = None  # set for chunks of long messages (id is the parent's)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _collapse(candidates: List[Tuple[IndexedMessage, float]], k: int) -> List[Tuple[IndexedMessage, float]]:
+    """Keeps the best hit per message (chunks share their parent's id)."""
+    hits, seen = [], set()
+    for record, distance in candidates:
+        if record.id not in seen:
+            seen.add(record.id)
+            hits.append((record, distance))
+            if len(hits) == k:
+                break
+    return hits
+
+
+def exact_search(matrix: np.ndarray, records: Sequence[IndexedMessage], query: np.ndarray,
+                 k: int) -> List[Tuple[IndexedMessage, float]]:
+    """Exact top-k over a normalized matrix (rows aligned with records), one hit per message."""
+    size = matrix.shape[0]
+    if size == 0:
+        return []
+    fetch = min(k * CHUNK_OVERFETCH, size)
+    scores = matrix @ _normalize(query)
+    top = np.argpartition(-scores, fetch - 1)[:fetch]
+    top = top[np.argsort(-scores[top])]
+    return _collapse([(records[r], float(1.0 - scores[r])) for r in top], k)
+
+
+class GuildVectorIndex:
+    """Append-only vector index for one guild."""
+
+    def __init__(self, guild_id: str, dim: int):
+        self.guild_id = guild_id
+        self.dim = dim
+        self.size = 0
+        self.matrix = np.empty((0, dim), dtype=np.float32)  # grows geometrically
+        self.records: List[IndexedMessage] = []
+        self.ids: Dict[Tuple[int, Optional[int]], int] = {}  # (message id, chunk index) -> row
+        self.max_id: Optional[int] = None
+        self.text_bytes = 0
+        self.hnsw = None
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate resident size: matrix capacity, context text and HNSW graph."""
+        hnsw_bytes = self.size * (self.dim * 4 + HNSW_M * 2 * 4) if self.hnsw is not None else 0
+        return self.matrix.nbytes + self.text_bytes + hnsw_bytes
+
+    def add(self, records: Sequence[IndexedMessage], vectors: np.ndarray) -> None:
+        fresh = [i for i, r in enumerate(records) if (r.id, r.chunk_index) not in self.ids]
+        if not fresh:
+            return
+        records = [records[i] for i in fresh]
+        vectors = _normalize(np.asarray(vectors)[fresh])
+
+        needed = self.size + len(records)
+        if needed > self.matrix.shape[0]:
+            grown = np.empty((max(needed, self.matrix.shape[0] * 2, 1024), self.dim), dtype=np.float32)
+            grown[:self.size] = self.matrix[:self.size]
+            self.matrix = grown
+        self.matrix[self.size:needed] = vectors
+
+        for offset, record in enumerate(records):
+            self.ids[(record.id, record.chunk_index)] = self.size + offset
+            self.text_bytes += len(record.content)
+            self.max_id = record.id if self.max_id is None else max(self.max_id, record.id)
+        self.records.extend(records)
+
+        if self.hnsw is not None:
+            if needed > self.hnsw.get_max_elements():
+                self.hnsw.resize_index(max(needed, self.hnsw.get_max_elements() * 2))
+            self.hnsw.add_items(vectors, np.arange(self.size, needed))
+        self.size = needed
+
+        if self.hnsw is None and hnswlib is not None and self.size >= VECTOR_CACHE_HNSW_THRESHOLD:
+            self._build_hnsw()
+
+    def _build_hnsw(self) -> None:
+        index = hnswlib.Index(space="ip", dim=self.dim)
+        index.init_index(max_elements=self.size * 2, ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+        index.add_items(self.matrix[:self.size], np.arange(self.size))
+        index.set_ef(HNSW_EF_SEARCH)
+        self.hnsw = index
+        logger.info(f"Vector cache: guild {self.guild_id} switched to HNSW ({self.size} vectors).")
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[IndexedMessage, float]]:
+        """
+        Returns up to k (record, cosine_distance) pairs, nearest first, with at
+        most one hit (the best chunk) per message.
+        """
+        if self.hnsw is None:
+            return exact_search(self.matrix[:self.size], self.records, query, k)
+        if self.size == 0:
+            return []
+        fetch = min(k * CHUNK_OVERFETCH, self.size)
+        rows, distances = self.hnsw.knn_query(_normalize(query).reshape(1, -1), k=fetch)
+        return _collapse([(self.records[r], float(d)) for r, d in zip(rows[0], distances[0])], k)
+
+    def chunk_context(self, record: IndexedMessage, radius: int) -> str:
+        """The chunk's text joined with up to `radius` cached neighbours on each side."""
+        if record.chunk_index is None:
+            return record.content
+        parts = []
+        for i in range(record.chunk_index - radius, record.chunk_index + radius + 1):
+            row = self.ids.get((record.id, i))
+            if row is not None:
+                parts.append(self.records[row].content)
+        return "\n".join(parts)
+
+
+class VectorIndexCache:
+    """
+    LRU cache of GuildVectorIndex objects bounded by VECTOR_CACHE_MAX_MB.
+    Guilds that are not loaded (or were evicted) fall back to pgvector; a miss
+    on an evicted hot guild queues it for reload_missed().
+    """
+
+    def __init__(self, max_bytes: int, dim: int = EMBEDDING_DIMENSION):
+        self.max_bytes = max_bytes
+        self.dim = dim
+        self.guilds: "OrderedDict[str, GuildVectorIndex]" = OrderedDict()
+        self.hot: set = set()
+        self.evicted_at: Dict[str, float] = {}
+        self.missed: set = set()
+        self.lock = threading.RLock()
+
+    def reset(self, dim: int) -> None:
+        """Drops every cached guild (their vectors belong to a replaced embedding model)."""
+        with self.lock:
+            self.guilds.clear()
+            self.evicted_at.clear()
+            self.missed.clear()
+            self.dim = dim
+
+    def is_loaded(self, guild_id: str) -> bool:
+        return guild_id in self.guilds
+
+    def hot_guild_ids(self, db: Session) -> List[str]:
+        """Configured hot guilds, or the most active guilds by message count."""
+        if VECTOR_CACHE_GUILDS:
+            return VECTOR_CACHE_GUILDS
+        rows = db.execute(
+            select(DiscordMessage.guild_id)
+            .where(DiscordMessage.guild_id.is_not(None))
+            .group_by(DiscordMessage.guild_id)
+            .order_by(func.count(DiscordMessage.id).desc())
+            .limit(VECTOR_CACHE_TOP_GUILDS)
+        ).scalars().all()
+        return list(rows)
+
+    def _fetch_rows(self, db: Session, guild_id: str, after_id: int, limit: Optional[int] = None):
+        """
+        Whole-message and chunk vectors of messages with id > after_id, in
+        message-id order. Chunks carry their parent's author/channel context.
+        """
+        messages = (
+            select(
+                DiscordMessage.id, DiscordMessage.author_id, DiscordMessage.channel_id,
+                DiscordMessage.created_at, DiscordMessage.content, DiscordMessage.embedding
+            )
+            .where(DiscordMessage.guild_id == guild_id, DiscordMessage.id > after_id,
+                   *searchable_criteria())
+            .order_by(DiscordMessage.id)
+        )
+        if limit:
+            messages = messages.limit(limit)
+        rows = db.execute(messages).all()
+        records = [IndexedMessage(r.id, r.author_id, r.channel_id, r.created_at, r.content) for r in rows]
+        vectors = [r.embedding for r in rows]
+
+        # Chunks in the same id range (all chunks of a message commit together)
+        upper = rows[-1].id if limit and len(rows) == limit else None
+        chunks = (
+            select(
+                MessageChunk.message_id, DiscordMessage.author_id, DiscordMessage.channel_id,
+                MessageChunk.created_at, MessageChunk.content, MessageChunk.chunk_index,
+                MessageChunk.embedding
+            )
+            .join(DiscordMessage, DiscordMessage.id == MessageChunk.message_id)
+            .where(MessageChunk.guild_id == guild_id, MessageChunk.message_id > after_id,
+                   *chunk_searchable_criteria())
+            .order_by(MessageChunk.message_id, MessageChunk.chunk_index)
+        )
+        if upper is not None:
+            chunks = chunks.where(MessageChunk.message_id <= upper)
+        for r in db.execute(chunks).all():
+            records.append(IndexedMessage(r.message_id, r.author_id, r.channel_id, r.created_at,
+                                          r.content, r.chunk_index))
+            vectors.append(r.embedding)
+        return records, vectors, upper
+
+    def load_guild(self, db: Session, guild_id: str) -> GuildVectorIndex:
+        """(Re)builds a guild's index from Postgres in id-keyset batches."""
+        index = GuildVectorIndex(guild_id, self.dim)
+        last_id = 0
+        while True:
+            records, vectors, upper = self._fetch_rows(db, guild_id, last_id, VECTOR_CACHE_LOAD_BATCH)
+            if records:
+                index.add(records, np.asarray(vectors, dtype=np.float32))
+            if upper is None:
+                break
+            last_id = upper
+
+        with self.lock:
+            self.guilds[guild_id] = index
+            self.guilds.move_to_end(guild_id)
+            self._enforce_budget()
+        logger.info(f"Vector cache: loaded guild {guild_id} ({index.size} vectors, "
+                    f"{index.nbytes / 1e6:.1f} MB).")
+        return index
+
+    def warm(self, db: Session) -> int:
+        """Loads every hot guild; returns the number of guilds cached."""
+        hot = self.hot_guild_ids(db)
+        with self.lock:
+            self.hot = set(hot)
+        for guild_id in hot:
+            self.load_guild(db, guild_id)
+        return len(self.guilds)
+
+    def reload_missed(self, db: Session) -> List[str]:
+        """
+        Reloads evicted hot guilds that were searched since the last call and
+        are past VECTOR_CACHE_RELOAD_COOLDOWN; the LRU budget still applies.
+        """
+        with self.lock:
+            now = time.monotonic()
+            due = [g for g in self.missed
+                   if g not in self.guilds and now - self.evicted_at.get(g, float("-inf")) >= VECTOR_CACHE_RELOAD_COOLDOWN]
+            self.missed.difference_update(due)
+        for guild_id in due:
+            self.load_guild(db, guild_id)
+        return due
+
+    def add_message(self, guild_id: Optional[str], record: IndexedMessage, vector) -> None:
+        """Ingestion hook: appends a freshly stored message if its guild is cached."""
+        if guild_id is None:
+            return
+        with self.lock:
+            index = self.guilds.get(guild_id)
+            if index is None:
+                return
+            index.add([record], np.asarray([vector], dtype=np.float32))
+            self._enforce_budget()
+
+    def chunk_context(self, guild_id: str, record: IndexedMessage, radius: int) -> str:
+        """Neighbouring-chunk context for a cached hit (the record's own text if evicted)."""
+        with self.lock:
+            index = self.guilds.get(guild_id)
+            return index.chunk_context(record, radius) if index is not None else record.content
+
+    def search(self, guild_id: str, query_vector, k: int) -> Optional[List[Tuple[IndexedMessage, float]]]:
+        """Top-k from the in-process index, or None when the guild is not cached."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        with self.lock:
+            index = self.guilds.get(guild_id)
+            if index is None and guild_id in self.hot:
+                self.missed.add(guild_id)
+            # A query from another embedding model (mid re-embedding switch) goes to pgvector
+            if index is None or len(query) != self.dim:
+                return None
+            self.guilds.move_to_end(guild_id)
+            if index.hnsw is not None:
+                # hnswlib can't be queried while add_message resizes it
+                return index.search(query, k)
+            # Rows below size are never rewritten, so the view stays valid
+            # while ingestion appends; the matmul runs without the lock
+            matrix, records = index.matrix[:index.size], index.records
+        return exact_search(matrix, records, query, k)
+
+    def catch_up(self, db: Session, guild_id: str) -> int:
+        """Appends rows newer than the cached max id (e.g. written by queue workers)."""
+        index = self.guilds.get(guild_id)
+        if index is None:
+            return 0
+        records, vectors, _ = self._fetch_rows(db, guild_id, index.max_id or 0)
+        if records:
+            with self.lock:
+                index.add(records, np.asarray(vectors, dtype=np.float32))
+                self._enforce_budget()
+        return len(records)
+
+    def verify(self, db: Session, guild_id: str) -> bool:
+        """
+        Consistency check against Postgres: vector count (messages plus chunks)
+        and max message id must match.
+        New rows are appended first; any remaining mismatch (compaction,
+        deletes) triggers a rebuild.
+        """
+        index = self.guilds.get(guild_id)
+        if index is None:
+            return True
+        self.catch_up(db, guild_id)
+        count, max_id = db.execute(
+            select(func.count(DiscordMessage.id), func.max(DiscordMessage.id))
+            .where(DiscordMessage.guild_id == guild_id, *searchable_criteria())
+        ).one()
+        chunk_count, max_chunk_parent = db.execute(
+            select(func.count(MessageChunk.id), func.max(MessageChunk.message_id))
+            .where(MessageChunk.guild_id == guild_id, *chunk_searchable_criteria())
+        ).one()
+        count += chunk_count
+        if max_chunk_parent is not None:
+            max_id = max(max_id or 0, max_chunk_parent)
+        if count == index.size and max_id == index.max_id:
+            return True
+
+        logger.warning(f"Vector cache: guild {guild_id} drifted (db={count}/{max_id}, "
+                       f"cache={index.size}/{index.max_id}); rebuilding.")
+        self.load_guild(db, guild_id)
+        return False
+
+    def verify_all(self, db: Session) -> int:
+        """Verifies every cached guild; returns how many needed a rebuild."""
+        return sum(0 if self.verify(db, guild_id) else 1 for guild_id in list(self.guilds))
+
+    def _enforce_budget(self) -> None:
+        """Evicts least-recently-used guilds until the cache fits in max_bytes."""
+        while len(self.guilds) > 1 and sum(i.nbytes for i in self.guilds.values()) > self.max_bytes:
+            guild_id, evicted = self.guilds.popitem(last=False)
+            self.evicted_at[guild_id] = time.monotonic()
+            logger.info(f"Vector cache: evicted cold guild {guild_id} ({evicted.nbytes / 1e6:.1f} MB).")
+
+
+def get_vector_index_cache() -> Optional[VectorIndexCache]:
+    """Dependency function for the process-wide cache (None when disabled)."""
+    if not VECTOR_CACHE_ENABLED:
+        return None
+    if not hasattr(get_vector_index_cache, 'instance'):
+        get_vector_index_cache.instance = VectorIndexCache(int(VECTOR_CACHE_MAX_MB * 1024 * 1024))
+    return get_vector_index_cache.instance
@@ -1,7 +1,11 @@
 
+import time
+_PROCESS_STARTED_AT = time.perf_counter()
+
 import os
 import sys
 import asyncio
+from collections import Counter
 import discord
 from discord.ext import commands
 from sqlalchemy import text
@@ -11,21 +15,73 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # --- Production Imports ---
-from app.core.logger import logger
-from app.core.database import get_db_session
-from app.services.embedding_service import process_and_store_message
-from app.services.retrieval_service import retrieve_and_answer
-from app.services.clustering_service import get_clustering_service
+# scikit-learn, pyarrow and the clustering service are deliberately NOT imported
+# here; see load_clustering() below. NumPy is: the models and vector services need it.
+from app.core.logger import logger, dropped_log_records
+from app.core.startup import StartupTimer
+from app.core.profiling import trace, span, SamplingProfiler
+from app.core.deadline import Deadline, deadline_misses
+from app.core.database import get_db_session, get_read_db_session, SessionLocal
+from app.core.partitions import default_partition_rows
+from app.services.embedding_service import (
+    process_and_store_message, store_message_batch, backfill_guild_ids, adjust_reaction_counts,
+    active_embedding, get_embedding_service, EMBEDDING_STATE_TTL
+)
+from app.services.retrieval_service import (
+    retrieve_and_answer, search_page, SEARCH_PAGE_SIZE, SEARCH_TIMEOUT_SECONDS, SEARCH_MAX_PAGES
+)
+from app.services.admission import get_admission_controller, AdmissionRejected
+from app.services import job_queue
+from app.services.vector_index import get_vector_index_cache, VECTOR_CACHE_VERIFY_INTERVAL
+from app.services.author_graph import refresh_author_graph, get_similar_authors, AUTHOR_GRAPH_REFRESH_SECONDS
+from app.services.summary_service import refresh_summaries, get_recap, SUMMARY_REFRESH_SECONDS
+from app.services.topic_matrix import rebuild_topic_model_if_stale, author_topics
+from app.services.recent_context import get_recent_context_buffer
+from app.services.activity import (
+    activity_totals, guild_volume, top_channels, get_author_activity, author_top_channels
+)
+from app.services.ingest_spool import get_ingest_spool, INGEST_SPOOL_DRAIN_INTERVAL, INGEST_SPOOL_BATCH_SIZE
 
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 
 if not DISCORD_TOKEN:
     # Logger might not be initialized if we needed env for it, but here it's fine
-    print("CRITICAL: DISCORD_TOKEN not found in .env. Exiting.")
+    logger.critical("CRITICAL: DISCORD_TOKEN not found in .env. Exiting.")
     sys.exit(1)
 
+# Capture the on_message stream for load-test replay (see replay.py)
+GATEWAY_RECORD_PATH = os.getenv("GATEWAY_RECORD_PATH")
+
+# Import clustering dependencies in the background once connected (optional)
+PREWARM_HEAVY_IMPORTS = os.getenv("PREWARM_HEAVY_IMPORTS", "false").lower() == "true"
+
+# How long !search page buttons stay usable
+SEARCH_VIEW_TIMEOUT = 300
+
+# Reaction adds/removes are summed per message and written in one transaction this often
+REACTION_FLUSH_SECONDS = float(os.getenv("REACTION_FLUSH_SECONDS", "5"))
+
+startup_timer = StartupTimer(_PROCESS_STARTED_AT)
+startup_timer.mark("imports + config")
+
+
+def load_clustering():
+    """
+    Imports the clustering service on first use of !topics/!whosaid.
+    Returns the module; subsequent calls hit sys.modules.
+    """
+    from app.services import clustering_service
+    return clustering_service
+
+# --- Sharding ---
+# Unset: one process, shard count chosen by Discord. For multi-process
+# deployments every process gets the same SHARD_COUNT and its own SHARD_IDS
+# range (see launcher.py).
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+SHARD_IDS = [int(s) for s in os.getenv("SHARD_IDS", "").split(",") if s.strip()] or None
+
 # --- 2. Bot Class definition (MANDATE 4.2) ---
-class DiscordMindBot(commands.Bot):
+class DiscordMindBot(commands.AutoShardedBot):
     def __init__(self):
         # Intents
         intents = discord.Intents.default()
@@ -34,8 +90,16 @@ class DiscordMindBot(commands.Bot):
         super().__init__(
             command_prefix='!',
             intents=intents,
-            help_command=commands.DefaultHelpCommand()
+            help_command=commands.DefaultHelpCommand(),
+            shard_count=SHARD_COUNT,
+            shard_ids=SHARD_IDS
         )
+        self._guild_backfill_done = False
+        self._reaction_deltas: Counter = Counter()
+        self._recorder = None
+        if GATEWAY_RECORD_PATH:
+            from app.services.gateway_replay import EventRecorder
+            self._recorder = EventRecorder(GATEWAY_RECORD_PATH)
     
     async def setup_hook(self):
         """
@@ -46,26 +110,216 @@ class DiscordMindBot(commands.Bot):
         try:
             db = next(get_db_session())
             db.execute(text("SELECT 1"))
+            stranded = default_partition_rows(db.connection())
             db.close()
             logger.info("✅ Database connection healthy.")
+            if stranded:
+                logger.warning(f"⚠️ {stranded} message(s) sit in the default partition (no monthly partition "
+                               f"for their send time); run create_tables.py to move them.")
         except Exception as e:
             logger.critical(f"❌ Database connection failed: {e}")
             await self.close()
             sys.exit(1)
+        startup_timer.mark("setup_hook (DB check)")
+
+        # Build the hot-guild vector cache in the background (gateway login isn't delayed)
+        if get_vector_index_cache() is not None:
+            self.loop.create_task(self._maintain_vector_cache())
+
+        # Precomputed author kNN graph for !similar (one refresher per deployment, see advisory lock)
+        if AUTHOR_GRAPH_REFRESH_SECONDS > 0 and (SHARD_IDS is None or 0 in SHARD_IDS):
+            self.loop.create_task(self._refresh_author_graph())
+
+        # Replay and drain the local ingest spool (messages survive DB/OpenAI outages)
+        if get_ingest_spool(SHARD_IDS) is not None:
+            self.loop.create_task(self._drain_ingest_spool())
+
+        # Rolling channel summaries for !recap and RAG context (same single-refresher rule)
+        if SUMMARY_REFRESH_SECONDS > 0 and (SHARD_IDS is None or 0 in SHARD_IDS):
+            self.loop.create_task(self._refresh_channel_summaries())
+
+        # Topic model behind the author x topic matrix (!mindmap), built when missing or stale
+        if SHARD_IDS is None or 0 in SHARD_IDS:
+            self.loop.create_task(self._refresh_topic_model())
+
+        # Batched reaction_count updates (reaction events are the busiest gateway traffic)
+        self.loop.create_task(self._flush_reactions())
+
+    async def _maintain_vector_cache(self):
+        """
+        Warms the in-process vector cache, reloads evicted hot guilds that were
+        searched again, and periodically verifies it against Postgres. A
+        re-embedding switch (new generation) empties and re-warms it.
+        """
+        cache = get_vector_index_cache()
+
+        def _run(operation):
+            db = next(get_db_session())
+            try:
+                return operation(db)
+            finally:
+                db.close()
+
+        async def _warm():
+            active = await asyncio.to_thread(active_embedding)
+            cache.reset(active.dimension)
+            try:
+                warmed = await asyncio.to_thread(_run, cache.warm)
+                logger.info(f"✅ Vector cache warmed for {warmed} guild(s) ({active.model}).")
+            except Exception as e:
+                logger.error(f"Vector cache warm-up failed: {e}")
+            return active.generation
+
+        generation = await _warm()
+        verified_at = time.monotonic()
+        while not self.is_closed():
+            await asyncio.sleep(min(VECTOR_CACHE_VERIFY_INTERVAL, EMBEDDING_STATE_TTL))
+            if (await asyncio.to_thread(active_embedding)).generation != generation:
+                logger.warning("Vector cache: embedding model switched, rebuilding.")
+                generation = await _warm()
+                continue
+            try:
+                reloaded = await asyncio.to_thread(_run, cache.reload_missed)
+                if reloaded:
+                    logger.info(f"Vector cache: reloaded evicted guild(s) {', '.join(reloaded)}.")
+            except Exception as e:
+                logger.error(f"Vector cache reload failed: {e}")
+            if time.monotonic() - verified_at < VECTOR_CACHE_VERIFY_INTERVAL:
+                continue
+            verified_at = time.monotonic()
+            try:
+                rebuilt = await asyncio.to_thread(_run, cache.verify_all)
+                if rebuilt:
+                    logger.warning(f"Vector cache: {rebuilt} guild(s) rebuilt after consistency check.")
+            except Exception as e:
+                logger.error(f"Vector cache verification failed: {e}")
+
+    async def _refresh_author_graph(self):
+        """Incrementally refreshes the author similarity graph on a fixed interval."""
+        def _run():
+            db = next(get_db_session())
+            try:
+                return refresh_author_graph(db)
+            finally:
+                db.close()
+
+        while not self.is_closed():
+            try:
+                await asyncio.to_thread(_run)
+            except Exception as e:
+                logger.error(f"Author graph refresh failed: {e}")
+            await asyncio.sleep(AUTHOR_GRAPH_REFRESH_SECONDS)
+
+    async def _drain_ingest_spool(self):
+        """Moves spooled messages into Postgres in batches; failed batches stay spooled and back off."""
+        spool = get_ingest_spool(SHARD_IDS)
+
+        def _sink(items):
+            db = next(get_db_session())
+            try:
+                if job_queue.OFFLOAD_INGESTION:
+                    job_queue.enqueue_many(db, "ingest", items)
+                    return len(items)
+                return store_message_batch(db, items)
+            finally:
+                db.close()
+
+        while not self.is_closed():
+            try:
+                drained = await asyncio.to_thread(spool.drain_once, _sink)
+            except Exception as e:
+                logger.error(f"Ingest spool drain failed: {e}", extra={"event": "spool.failed"})
+                drained = 0
+            if drained < INGEST_SPOOL_BATCH_SIZE:
+                await asyncio.sleep(INGEST_SPOOL_DRAIN_INTERVAL)
+
+    async def _refresh_channel_summaries(self):
+        """Folds new messages into the rolling channel summaries on a fixed interval."""
+        def _run():
+            db = next(get_db_session())
+            try:
+                return refresh_summaries(db)
+            finally:
+                db.close()
+
+        while not self.is_closed():
+            await asyncio.sleep(SUMMARY_REFRESH_SECONDS)
+            try:
+                await asyncio.to_thread(_run)
+            except Exception as e:
+                logger.error(f"Channel summary refresh failed: {e}")
+
+    async def _refresh_topic_model(self):
+        """Hourly check whether the topic model needs (re)building; k-means runs off the event loop."""
+        def _run():
+            db = next(get_db_session())
+            try:
+                return rebuild_topic_model_if_stale(db)
+            finally:
+                db.close()
+
+        while not self.is_closed():
+            try:
+                await asyncio.to_thread(_run)
+            except Exception as e:
+                logger.error(f"Topic model rebuild failed: {e}")
+            await asyncio.sleep(3600)
 
     async def on_ready(self):
         logger.info(f'✅ Logged in as: {self.user} (ID: {self.user.id})')
-        logger.info(f'Connected to {len(self.guilds)} guild(s)')
+        logger.info(f'Connected to {len(self.guilds)} guild(s) on shard(s) {sorted(self.shards)} of {self.shard_count}')
         await self.change_presence(activity=discord.Activity(
             type=discord.ActivityType.listening, 
             name="the substrate"
         ))
+        startup_timer.mark("gateway login -> ready")
+        startup_timer.report()
+
+        if PREWARM_HEAVY_IMPORTS and "app.services.clustering_service" not in sys.modules:
+            self.loop.create_task(self._prewarm())
+
+        # One-time: attribute legacy rows (ingested before guild tracking) to their guild
+        if not self._guild_backfill_done:
+            self._guild_backfill_done = True
+            await asyncio.to_thread(self._backfill_guild_ids, [
+                (str(guild.id), [str(c.id) for c in guild.channels] + [str(t.id) for t in guild.threads])
+                for guild in self.guilds
+            ])
+
+    async def _prewarm(self):
+        """Loads the clustering stack off the event loop so the first !topics is fast."""
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(load_clustering)
+            logger.info(f"🔥 Prewarmed clustering stack in {(time.perf_counter() - started) * 1000:.0f} ms")
+        except Exception as e:
+            logger.error(f"Prewarm failed: {e}")
+
+    def _backfill_guild_ids(self, guild_channels):
+        db = None
+        try:
+            db = next(get_db_session())
+            updated = sum(backfill_guild_ids(db, guild_id, channel_ids) for guild_id, channel_ids in guild_channels)
+            if updated:
+                logger.info(f"Backfilled guild_id on {updated} legacy message(s).")
+        except Exception as e:
+            logger.error(f"Guild backfill failed: {e}")
+        finally:
+            if db: db.close()
+
+    async def invoke(self, ctx):
+        """Every command runs inside a profiling trace (no-op unless PROFILING_ENABLED)."""
+        with trace(f"!{ctx.command}" if ctx.command else "command"):
+            await super().invoke(ctx)
 
     async def on_message(self, message: discord.Message):
         # 1. Self-protection
         if message.author.bot:
             return
 
+        if self._recorder is not None:
+            self._recorder.record(message, self.user)
+
         # 2. Command Handling
         # If it's a command, process it and STOP (don't ingest commands)
         if message.content.startswith(self.command_prefix):
@@ -80,43 +334,119 @@ class DiscordMindBot(commands.Bot):
             
             if clean_content:
                 async with message.channel.typing():
-                    db = None
                     try:
-                        db = next(get_db_session())
                         # Re-use retrieve_and_answer to leverage RAG + Persona prompt
-                        answer = retrieve_and_answer(clean_content, db)
-                        await message.reply(answer)
+                        guild_id = str(message.guild.id) if message.guild else None
+                        with trace("mention"):
+                            answer = await answer_question(clean_content, str(message.author.id), guild_id,
+                                                           str(message.channel.id))
+                            with span("discord", "reply"):
+                                await message.reply(answer)
+                    except AdmissionRejected as e:
+                        await message.reply(e.reply)
                     except Exception as e:
                         logger.error(f"Reply error: {e}")
                         await message.reply("The gravitational field is failing. (Error occurred)")
-                    finally:
-                        if db: db.close()
 
             # We DO continue to ingest this message so the conversation is remembered!
             
         # 4. Ingestion Logic
         if message.guild and message.content.strip():
-            await self._ingest_message(message)
+            with trace("ingest"):
+                await self._ingest_message(message)
 
     async def _ingest_message(self, message: discord.Message):
         """Private helper to handle ingestion safely."""
-        db = None
+        # Engagement signals for retrieval scoring
+        reply_to = str(message.reference.message_id) if message.reference and message.reference.message_id else None
+        reaction_count = sum(r.count for r in message.reactions)
+        # Conversation memory for mentions/!ask in this channel (vector attached once embedded)
+        recent = get_recent_context_buffer()
+        if recent is not None:
+            recent.add(str(message.channel.id), str(message.id), str(message.author.id),
+                       message.content, message.created_at.timestamp())
+        payload = {
+            "discord_message_id": str(message.id),
+            "author_id": str(message.author.id),
+            "channel_id": str(message.channel.id),
+            "guild_id": str(message.guild.id) if message.guild else None,
+            "content": message.content,
+            "created_at": message.created_at.isoformat(),
+            "reply_to": reply_to,
+            "reaction_count": reaction_count
+        }
+        spool = get_ingest_spool(SHARD_IDS)
+        if spool is not None:
+            # Local append only; _drain_ingest_spool stores it (or enqueues it for workers)
+            try:
+                spool.append(payload)
+                return
+            except Exception as e:
+                logger.error(f"Spool append failed for msg {message.id}, storing directly: {e}")
         try:
-            db = next(get_db_session())
-            await process_and_store_message(
-                db=db,
-                discord_message_id=str(message.id),
-                author_id=str(message.author.id),
-                channel_id=str(message.channel.id),
-                content=message.content
-            )
+            # Embedding and DB work (including topic counting, which may wait
+            # on a topic-model rebuild's lock) stays off the gateway loop
+            await asyncio.to_thread(self._store_message, payload)
             # logger.info(f"Ingested: {message.author.name} ({len(message.content)} chars)")
         except Exception as e:
             logger.error(f"Ingestion failed for msg {message.id}: {e}")
+
+    @staticmethod
+    def _store_message(payload: dict) -> None:
+        """Stores (or enqueues) one message; runs in a worker thread."""
+        db = next(get_db_session())
+        try:
+            if job_queue.OFFLOAD_INGESTION:
+                # Cheap insert; a worker process embeds and stores it in batches
+                job_queue.enqueue(db, "ingest", payload)
+                return
+            process_and_store_message(
+                db=db,
+                discord_message_id=payload["discord_message_id"],
+                author_id=payload["author_id"],
+                channel_id=payload["channel_id"],
+                content=payload["content"],
+                guild_id=payload["guild_id"],
+                reply_to=payload["reply_to"],
+                reaction_count=payload["reaction_count"]
+            )
         finally:
-            if db:
+            db.close()
+
+
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        await self._record_reaction(payload, 1)
+
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        await self._record_reaction(payload, -1)
+
+    async def _record_reaction(self, payload: discord.RawReactionActionEvent, delta: int):
+        """Keeps reaction_count current for engagement-weighted retrieval (flushed by _flush_reactions)."""
+        if payload.guild_id is None:
+            return
+        self._reaction_deltas[str(payload.message_id)] += delta
+
+    async def _flush_reactions(self):
+        """Writes the summed reaction deltas off the event loop every REACTION_FLUSH_SECONDS."""
+        def _run(deltas):
+            db = next(get_db_session())
+            try:
+                adjust_reaction_counts(db, deltas)
+            finally:
                 db.close()
 
+        while not self.is_closed():
+            await asyncio.sleep(REACTION_FLUSH_SECONDS)
+            if not self._reaction_deltas:
+                continue
+            deltas, self._reaction_deltas = self._reaction_deltas, Counter()
+            try:
+                await asyncio.to_thread(_run, deltas)
+            except Exception as e:
+                # Keep them for the next flush (counts are approximate engagement signals)
+                self._reaction_deltas.update(deltas)
+                logger.error(f"Reaction update failed for {len(deltas)} message(s): {e}")
+
 
 # --- 3. Instantiation ---
 bot = DiscordMindBot()
@@ -124,6 +454,133 @@ bot = DiscordMindBot()
 # --- 4. Command Registrations ---
 # We register commands here to keep the class clean, or simpler: use decorators.
 
+async def answer_question(question: str, user_id: str, guild_id, channel_id=None):
+    """
+    Runs a RAG answer under admission control (rate limits, fair queueing,
+    in-flight cap) in a worker thread so queued requests don't block the gateway.
+    The deadline starts here, so time spent queued shrinks the stage budgets.
+    Raises AdmissionRejected when the request is shed.
+    """
+    deadline = Deadline()
+    async with get_admission_controller().slot(user_id, guild_id):
+        def _run():
+            db = next(get_read_db_session())
+            try:
+                return retrieve_and_answer(question, db, guild_id=guild_id, channel_id=channel_id,
+                                           deadline=deadline)
+            finally:
+                db.close()
+        return await asyncio.to_thread(_run)
+
+def _search_rows(query_vector, guild_id, after, seen):
+    """One !search page as plain tuples (the session is closed before rendering)."""
+    db = next(get_read_db_session())
+    try:
+        hits, more = search_page(db, query_vector, guild_id, after, seen=seen)
+        return [(m.id, m.discord_id, m.author_id, m.channel_id, m.guild_id, m.created_at, content, distance)
+                for m, content, distance in hits], more
+    finally:
+        db.close()
+
+
+class SearchPager(discord.ui.View):
+    """
+    Prev/Next buttons for !search. Each page starts after the (distance, id)
+    of the previous page's last hit and skips the messages already shown
+    (their other chunks rank later); the query vector is kept, so paging
+    never re-embeds. Paging stops at SEARCH_MAX_PAGES.
+    """
+
+    def __init__(self, invoker_id: int, query: str, query_vector, guild):
+        super().__init__(timeout=SEARCH_VIEW_TIMEOUT)
+        self.invoker_id = invoker_id
+        self.query = query
+        self.query_vector = query_vector
+        self.guild = guild
+        # Start of every page up to the current one: ((distance, id) cursor, ids shown before it)
+        self.cursors = [(None, frozenset())]
+        self.next_cursor = None
+        self.message = None
+
+    async def load(self) -> str:
+        guild_id = str(self.guild.id) if self.guild else None
+        after, seen = self.cursors[-1]
+        rows, more = await asyncio.to_thread(_search_rows, self.query_vector, guild_id, after, seen)
+        self.next_cursor = ((rows[-1][7], rows[-1][0]), seen | {row[0] for row in rows}) if rows else None
+        page = len(self.cursors)
+        self.previous_button.disabled = page == 1
+        self.next_button.disabled = not (more and rows) or page >= SEARCH_MAX_PAGES
+
+        lines = [f'**🔎 "{self.query[:80]}"** — page {page}']
+        if not rows:
+            lines.append("No more matching messages.")
+        for i, (_, discord_id, author_id, channel_id, row_guild_id, created_at, content, distance) in enumerate(
+                rows, (page - 1) * SEARCH_PAGE_SIZE + 1):
+            member = self.guild.get_member(int(author_id)) if self.guild else None
+            name = member.display_name if member else f"User {author_id[:4]}"
+            link = f"https://discord.com/channels/{row_guild_id or '@me'}/{channel_id}/{discord_id}"
+            lines.append(f"**{i}.** {name} in <#{channel_id}> · {created_at:%Y-%m-%d} · "
+                         f"{(1 - distance) * 100:.0f}% · [jump](<{link}>)\n> {' '.join(content.split())[:200]}")
+        return "\n".join(lines)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.invoker_id:
+            await interaction.response.send_message("Run your own `!search` to page through results.",
+                                                    ephemeral=True)
+            return False
+        return True
+
+    async def _show(self, interaction: discord.Interaction):
+        # Acknowledge first: a page query may outlast Discord's 3 s response window
+        await interaction.response.defer()
+        await interaction.edit_original_response(content=await self.load(), view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.cursors.pop()
+        await self._show(interaction)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.primary)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.cursors.append(self.next_cursor)
+        await self._show(interaction)
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+async def run_offloaded(payload):
+    """Queues an analytics job for a worker process and waits for its result."""
+    db = next(get_db_session())
+    try:
+        job_id = job_queue.enqueue(db, "analytics", payload)
+    finally:
+        db.close()
+    return await job_queue.wait_for_result(SessionLocal, job_id)
+
+@bot.command(name='profile')
+@commands.is_owner()
+async def profile(ctx, seconds: float = 10.0):
+    """Owner only: samples every thread's stack for N seconds and reports hot spots."""
+    seconds = max(1.0, min(seconds, 120.0))
+    await ctx.send(f"🔬 Sampling for {seconds:.0f}s...")
+    try:
+        profiler = await asyncio.to_thread(SamplingProfiler().run, seconds)
+        path = await asyncio.to_thread(profiler.write_collapsed)
+        lines = [f"{own:>6} {cumulative:>6}  {name[:70]}" for name, own, cumulative in profiler.top_functions(15)]
+        await ctx.send(
+            f"**🔬 Profile ({profiler.samples} samples)** — collapsed stacks: `{path}`\n"
+            f"```\n{'self':>6} {'cum':>6}  function\n" + "\n".join(lines) + "\n```"
+        )
+    except Exception as e:
+        logger.error(f"Profile command error: {e}")
+        await ctx.send("Profiling failed.")
+
 @bot.command(name='ping')
 async def ping(ctx):
     """Latency check."""
@@ -134,9 +591,36 @@ async def status(ctx):
     """Health check."""
     db = None
     try:
-        db = next(get_db_session())
-        result = db.execute(text("SELECT COUNT(*) FROM discord_messages")).scalar()
-        await ctx.send(f'✅ **Substrate Status**\nMessages Observed: `{result}`')
+        db = next(get_read_db_session())
+        # Rollup tables answer in milliseconds; no scan of discord_messages
+        result, authors = activity_totals(db)
+        activity = ""
+        if ctx.guild:
+            volume = guild_volume(db, str(ctx.guild.id), days=7)
+            busiest = top_channels(db, str(ctx.guild.id), days=7)
+            activity = (f'\nThis server, 7 days: `{sum(n for _, n in volume)}` messages '
+                        f'(`{volume[-1][1] if volume else 0}` today)')
+            if busiest:
+                activity += "\nMost active: " + ", ".join(f"<#{channel}> `{n}`" for channel, n in busiest)
+        llm = get_admission_controller().stats()
+        shed = sum(llm["rejected"].values())
+        spool = get_ingest_spool(SHARD_IDS)
+        spooled = ""
+        if spool is not None:
+            stats = spool.stats()
+            spooled = (f'\nIngest spool: `{stats["depth"]}` pending, lag `{stats["lag_seconds"]:.0f}s`, '
+                       f'`{stats["retrying"]}` retrying, `{stats["dead"]}` dead')
+        misses = deadline_misses()
+        missed = ("\nDeadline misses: " + ", ".join(f"{stage} `{n}`" for stage, n in sorted(misses.items()))
+                  if misses else "")
+        dropped = dropped_log_records()
+        if dropped:
+            missed += f"\nLog records dropped: `{dropped}`"
+        await ctx.send(
+            f'✅ **Substrate Status**\nMessages Observed: `{result}` from `{authors}` minds{activity}\n'
+            f'LLM: `{llm["inflight"]}` in flight, `{llm["queued"]}` queued, '
+            f'wait p95 `{llm["wait_p95_ms"]:.0f}ms`, shed `{shed}`' + missed + spooled
+        )
     except Exception as e:
         logger.error(f"Status command error: {e}")
         await ctx.send(f'❌ Database error.')
@@ -147,16 +631,34 @@ async def status(ctx):
 async def ask(ctx, *, question):
     """RAG Retrieval."""
     async with ctx.typing(): # Show typing indicator while thinking
-        db = None
         try:
-            db = next(get_db_session())
-            answer = retrieve_and_answer(question, db)
+            guild_id = str(ctx.guild.id) if ctx.guild else None
+            answer = await answer_question(question, str(ctx.author.id), guild_id, str(ctx.channel.id))
             await ctx.send(f"🧠 **Substrate Oracle:**\n{answer}")
+        except AdmissionRejected as e:
+            await ctx.send(e.reply)
         except Exception as e:
             logger.error(f"Ask command error: {e}")
             await ctx.send("The substrate is silent. (Error occurred)")
-        finally:
-            if db: db.close()
+
+@bot.command(name='search')
+async def search(ctx, *, query: str):
+    """Past messages closest to the query with jump links (no LLM call), paged with buttons."""
+    async with ctx.typing():
+        try:
+            query_vector = await asyncio.to_thread(
+                lambda: get_embedding_service().embed_batch([query], timeout=SEARCH_TIMEOUT_SECONDS)[0]
+            )
+            pager = SearchPager(ctx.author.id, query, query_vector, ctx.guild)
+            content = await pager.load()
+            if pager.next_cursor is None:
+                await ctx.send("No matching messages found.")
+                return
+            # The query is echoed back; it must not ping anyone
+            pager.message = await ctx.send(content, view=pager, allowed_mentions=discord.AllowedMentions.none())
+        except Exception as e:
+            logger.error(f"Search command error: {e}")
+            await ctx.send("The substrate could not search right now. (Error occurred)")
 
 # --- Clustering Commands ---
 @bot.command(name='topics')
@@ -165,8 +667,8 @@ async def topics(ctx, num: int = 5):
     async with ctx.typing():
         db = None
         try:
-            db = next(get_db_session())
-            clustering = get_clustering_service(db)
+            db = next(get_read_db_session())
+            clustering = load_clustering().get_clustering_service(db)
             
             summary = clustering.get_cluster_summary()
             if summary["total_messages"] < 5:
@@ -174,7 +676,13 @@ async def topics(ctx, num: int = 5):
                 await ctx.send("⚠️ Not enough mass for clustering yet.")
                 return
 
-            clusters = clustering.discover_topics(n_clusters=min(num, summary["total_messages"] // 2))
+            n_clusters = min(num, summary["total_messages"] // 2)
+            if job_queue.OFFLOAD_ANALYTICS:
+                # K-means runs in a worker process, keeping this event loop free
+                result = await run_offloaded({"op": "topics", "n_clusters": n_clusters})
+                clusters = [load_clustering().TopicCluster.from_dict(c) for c in result]
+            else:
+                clusters = clustering.discover_topics(n_clusters=n_clusters)
             
             if not clusters:
                 await ctx.send("No patterns found.")
@@ -205,27 +713,92 @@ async def mindmap(ctx, member: discord.Member = None):
     member = member or ctx.author
     db = None
     try:
-        db = next(get_db_session())
-        clustering = get_clustering_service(db)
-        profile = clustering.get_author_profile(str(member.id))
+        db = next(get_read_db_session())
+        # Activity rollups: no embeddings are loaded just to count messages
+        activity = get_author_activity(db, str(member.id))
         
-        if not profile:
+        if not activity:
             await ctx.send(f"No data for {member.display_name}.")
             return
-            
-        await ctx.send(f"**🌀 Mindmap: {member.display_name}**\nMass: {profile.message_count} messages")
+        
+        channels = author_top_channels(db, str(member.id))
+        # Author x topic matrix: the whole distribution is one primary-key range read
+        topics = author_topics(db, str(member.id))
+        assigned = sum(n for _, _, n in topics)
+        await ctx.send(
+            f"**🌀 Mindmap: {member.display_name}**\nMass: {activity.message_count} messages\n"
+            f"Orbit: {activity.first_message_at:%Y-%m-%d} → {activity.last_message_at:%Y-%m-%d}"
+            + ("\nGravity wells: " + ", ".join(f"<#{channel}> ({n})" for channel, n in channels) if channels else "")
+            + ("\nIdea orbits:\n" + "\n".join(
+                f"`{'█' * round(10 * n / assigned):<10}` {n / assigned:.0%} *\"{label[:60]}\"*"
+                for _, label, n in topics[:5]
+            ) if topics else "")
+            + (f"\n…and {len(topics) - 5} more topic(s)" if len(topics) > 5 else "")
+        )
     except Exception as e:
         logger.error(f"Mindmap error: {e}")
     finally:
         if db: db.close()
 
+@bot.command(name='similar')
+async def similar(ctx, member: discord.Member = None):
+    """Authors who think most like a member (precomputed author graph)."""
+    member = member or ctx.author
+    db = None
+    try:
+        db = next(get_read_db_session())
+        neighbours = get_similar_authors(db, str(member.id), top_n=5)
+        
+        if not neighbours:
+            await ctx.send(f"No similarity data for {member.display_name} yet.")
+            return
+        
+        resp = f"**🧭 Kindred minds of {member.display_name}:**\n"
+        for i, (uid, score, count) in enumerate(neighbours, 1):
+            user = ctx.guild.get_member(int(uid)) if ctx.guild else None
+            name = user.display_name if user else uid
+            resp += f"{i}. **{name}** ({score*100:.1f}%, {count} msgs)\n"
+        
+        await ctx.send(resp)
+    except Exception as e:
+        logger.error(f"Similar error: {e}")
+    finally:
+        if db: db.close()
+
+@bot.command(name='recap')
+async def recap(ctx, days: int = 1):
+    """What this channel talked about lately (precomputed summaries, no LLM call)."""
+    days = max(1, min(days, 30))
+    db = None
+    try:
+        db = next(get_read_db_session())
+        summaries = get_recap(db, str(ctx.channel.id), days)
+
+        if not summaries:
+            await ctx.send("No summary for this channel yet.")
+            return
+
+        resp = f"**📜 Recap of the last {days} day(s):**\n"
+        for s in summaries:
+            period = "Week of " if s.granularity == "week" else ""
+            resp += f"\n__{period}{s.bucket_start.strftime('%a %Y-%m-%d')}__ ({s.message_count} msgs)\n{s.summary}\n"
+
+        await ctx.send(resp[:2000])
+    except Exception as e:
+        logger.error(f"Recap error: {e}")
+    finally:
+        if db: db.close()
+
 @bot.command(name='whosaid')
 async def whosaid(ctx, *, idea: str):
     db = None
     try:
-        db = next(get_db_session())
-        clustering = get_clustering_service(db)
-        attributions = clustering.attribute_idea(idea)
+        db = next(get_read_db_session())
+        if job_queue.OFFLOAD_ANALYTICS:
+            attributions = await run_offloaded({"op": "attribute_idea", "idea": idea})
+        else:
+            clustering = load_clustering().get_clustering_service(db)
+            attributions = clustering.attribute_idea(idea)
         
         if not attributions:
             await ctx.send("Trace failed.")
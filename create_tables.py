@@ -1,10 +1,12 @@
 import os
 import sys
+import argparse
 from sqlalchemy import create_engine, text
-from dotenv import load_dotenv 
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
 
 # --- 1. Load Environment Variables ---
-load_dotenv() 
+load_dotenv()
 
 # --- 2. Get DB URL and Dependencies ---
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -12,25 +14,124 @@ if not DATABASE_URL:
     print("CRITICAL: DATABASE_URL not found in .env. Cannot proceed.")
     sys.exit(1)
 
-from app.models.message import Base 
+from app.models.message import Base
+from app.models import job  # noqa: F401  (registers the jobs table on Base.metadata)
+from app.models import author_graph  # noqa: F401  (author_centroids / author_neighbors)
+from app.models import summary  # noqa: F401  (channel_summaries)
+from app.models import activity  # noqa: F401  (activity_hourly / author_activity)
+from app.models import embedding_state  # noqa: F401  (active embedding model, re-embedding progress)
+from app.models import topics  # noqa: F401  (topic_centroids / author_topics / channel_topics)
+from app.core import partitions
+from app.core.migrations import apply_additive_migrations
+from app.services.activity import rebuild_activity_rollups, rollups_empty
+from app.core.snowflakes import migrate_snowflake_columns, backfill_snowflake_timestamps
+from app.services.reembedding import ensure_embedding_state
+from app.services.topic_matrix import recount_topic_counts
+
+parser = argparse.ArgumentParser(description="Create and maintain the DiscordBot-Mind schema.")
+parser.add_argument("--migrate-partitions", action="store_true",
+                    help="Convert an existing unpartitioned discord_messages table to monthly partitions.")
+parser.add_argument("--maintain", action="store_true",
+                    help="Run partition maintenance only: create upcoming months, compact and apply retention.")
+parser.add_argument("--snowflake-timestamps", action="store_true",
+                    help="Rewrite created_at of existing messages to the send time encoded in their "
+                         "Discord ID (moves rows across partitions; removes duplicate copies).")
+parser.add_argument("--rebuild-rollups", action="store_true",
+                    help="Recompute the activity rollup tables from discord_messages.")
+parser.add_argument("--retention-months", type=int, default=partitions.RETENTION_MONTHS,
+                    help="Drop partitions older than N months (0 = keep forever).")
+args = parser.parse_args()
 
 # --- 3. Define the Database Engine ---
 engine = create_engine(
     DATABASE_URL.replace("postgresql://", "postgresql+psycopg2://")
 )
 
-# --- 4. Step 1: Ensure the vector extension is active (MANDATE 1.3) ---
-try:
+if not args.maintain:
+    # --- 4. Step 1: Ensure the vector extension is active (MANDATE 1.3) ---
+    try:
+        with engine.begin() as connection:
+            print("Attempting to create 'vector' extension if it doesn't exist...")
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+            connection.commit()
+            print("Vector extension check complete.")
+    except Exception as e:
+        print(f"CRITICAL: Failed to connect or create extension. Error: {e}")
+        sys.exit(1)
+
+    # --- 5. Step 2: Convert a legacy unpartitioned table if requested ---
+    if args.migrate_partitions:
+        with engine.begin() as connection:
+            exists = connection.execute(
+                text("SELECT to_regclass(:name) IS NOT NULL"), {"name": partitions.PARENT_TABLE}
+            ).scalar()
+            if exists and not partitions.is_partitioned(connection):
+                print(f"Migrating '{partitions.PARENT_TABLE}' to monthly partitions...")
+                migrated = partitions.migrate_to_partitioned(connection, Base.metadata)
+                print(f"✅ Migrated {migrated} rows into partitioned table.")
+            else:
+                print("Nothing to migrate (table missing or already partitioned).")
+
+    # --- 6. Step 3: Create all tables defined in Base ---
+    print(f"Creating tables defined in Base.metadata for engine: {engine.url.host}")
+    Base.metadata.create_all(bind=engine)
+    print("✅ Database tables created successfully (or already exist).")
+
     with engine.begin() as connection:
-        print("Attempting to create 'vector' extension if it doesn't exist...")
-        connection.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
-        connection.commit()
-        print("Vector extension check complete.")
-except Exception as e:
-    print(f"CRITICAL: Failed to connect or create extension. Error: {e}")
-    sys.exit(1)
+        applied = apply_additive_migrations(connection)
+    print(f"✅ Additive migrations applied ({applied} statements).")
+
+    # Legacy VARCHAR Discord IDs -> BIGINT (no-op once converted)
+    with engine.begin() as connection:
+        converted = migrate_snowflake_columns(connection)
+    if converted:
+        print(f"✅ Discord ID columns converted to BIGINT: {', '.join(converted)}")
+
+    if args.snowflake_timestamps:
+        with engine.begin() as connection:
+            removed, retimed = backfill_snowflake_timestamps(connection)
+        print(f"✅ Send times restored from snowflakes ({retimed} rows retimed, {removed} duplicates removed).")
+        args.rebuild_rollups = True  # hour buckets moved
+
+    # Record the model the existing vectors come from (EMBEDDING_MODEL on first run)
+    with Session(engine) as db:
+        state = ensure_embedding_state(db)
+        db.commit()
+        print(f"✅ Active embedding model: {state.active_model} ({state.active_dimension} dims).")
+
+    # Seed the activity rollups once; ingestion keeps them current afterwards
+    with engine.begin() as connection:
+        if args.rebuild_rollups or rollups_empty(connection):
+            written = rebuild_activity_rollups(connection)
+            print(f"✅ Activity rollups rebuilt ({written} hourly rows).")
+
+# --- 7. Step 4: Partition maintenance (safe to run from cron) ---
+with engine.begin() as connection:
+    if not partitions.is_partitioned(connection):
+        print(f"⚠️  '{partitions.PARENT_TABLE}' is not partitioned. Run with --migrate-partitions to convert it.")
+        sys.exit(0)
+
+    created = partitions.ensure_monthly_partitions(connection)
+    print(f"✅ Monthly partitions ensured ({len(created)} created: {', '.join(created) or 'none'}).")
+    stranded = partitions.default_partition_rows(connection)
+    if stranded:
+        print(f"⚠️  {stranded} row(s) still in '{partitions.DEFAULT_PARTITION}'.")
+
+    dropped = partitions.apply_retention(connection, args.retention_months)
+    if dropped:
+        print(f"🗑️  Retention dropped {len(dropped)} partition(s): {', '.join(dropped)}")
+        # The rollups and topic counts still include the dropped messages
+        written = rebuild_activity_rollups(connection)
+        print(f"✅ Activity rollups rebuilt ({written} hourly rows).")
+
+if dropped:
+    with Session(engine) as db:
+        recounted = recount_topic_counts(db)
+    if recounted is not None:
+        print(f"✅ Topic counts recounted ({recounted} messages).")
 
-# --- 5. Step 2: Create all tables defined in Base ---
-print(f"Creating tables defined in Base.metadata for engine: {engine.url.host}")
-Base.metadata.create_all(bind=engine)
-print("✅ Database tables created successfully (or already exist).")
\ No newline at end of file
+# The compaction tier comes from COMPACT_AFTER_MONTHS only: vector queries read the
+# same setting (searchable_cutoff) to skip compacted partitions, so the two must agree.
+compacted = partitions.compact_partitions(engine)
+if compacted:
+    print(f"🗜️  Compacted {len(compacted)} partition(s): {', '.join(compacted)}")
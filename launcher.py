@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+from dotenv import load_dotenv
+
+# --- 1. Load Environment Variables ---
+load_dotenv()
+
+parser = argparse.ArgumentParser(
+    description="Run the bot as several shard processes plus queue workers on this host."
+)
+parser.add_argument("--shards", type=int, required=True,
+                    help="Total shard count (same for every host).")
+parser.add_argument("--processes", type=int, default=1,
+                    help="Bot processes on this host; shards are split into contiguous ranges.")
+parser.add_argument("--first-shard", type=int, default=0,
+                    help="First shard id owned by this host (for multi-host deployments).")
+parser.add_argument("--last-shard", type=int, default=None,
+                    help="Last shard id owned by this host (default: shards - 1).")
+parser.add_argument("--workers", type=int, default=1,
+                    help="Queue worker processes (ingest + analytics) to start.")
+args = parser.parse_args()
+
+
+def shard_ranges(first: int, last: int, processes: int):
+    """Splits shard ids first..last into `processes` contiguous, near-equal ranges."""
+    shard_ids = list(range(first, last + 1))
+    size, extra = divmod(len(shard_ids), processes)
+    ranges, start = [], 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            ranges.append(shard_ids[start:end])
+        start = end
+    return ranges
+
+
+last_shard = args.last_shard if args.last_shard is not None else args.shards - 1
+children = []
+
+for shard_ids in shard_ranges(args.first_shard, last_shard, args.processes):
+    env = dict(os.environ, SHARD_COUNT=str(args.shards), SHARD_IDS=",".join(map(str, shard_ids)),
+               # Shard processes only enqueue; workers own embedding and analytics
+               OFFLOAD_INGESTION="true" if args.workers else os.getenv("OFFLOAD_INGESTION", "false"),
+               OFFLOAD_ANALYTICS="true" if args.workers else os.getenv("OFFLOAD_ANALYTICS", "false"))
+    print(f"🚀 Starting bot process for shards {shard_ids[0]}-{shard_ids[-1]}")
+    children.append(subprocess.Popen([sys.executable, "bot.py"], env=env))
+
+for i in range(args.workers):
+    print(f"🛠️  Starting queue worker {i + 1}/{args.workers}")
+    children.append(subprocess.Popen([sys.executable, "worker.py"]))
+
+try:
+    # Supervise: if any child exits, bring the whole group down so the
+    # orchestrator (Docker, systemd) can restart it cleanly.
+    while all(child.poll() is None for child in children):
+        time.sleep(1)
+    print("CRITICAL: A child process exited; stopping the group.")
+finally:
+    for child in children:
+        if child.poll() is None:
+            child.terminate()
+    for child in children:
+        child.wait()
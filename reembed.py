@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import argparse
+from dotenv import load_dotenv
+
+# --- 1. Load Environment Variables (before app imports) ---
+load_dotenv()
+
+parser = argparse.ArgumentParser(
+    description="Re-embed the corpus with a new model while the bot keeps serving "
+                "(start -> run -> index -> switch -> drop-previous)."
+)
+subparsers = parser.add_subparsers(dest="command", required=True)
+
+start_parser = subparsers.add_parser("start", help="Add the shadow column for a target model.")
+start_parser.add_argument("--model", required=True, help="Target embedding model.")
+start_parser.add_argument("--dimension", type=int, required=True, help="Target vector size.")
+
+run_parser = subparsers.add_parser("run", help="Backfill the shadow column (resumable).")
+run_parser.add_argument("--batch-size", type=int, default=None)
+run_parser.add_argument("--concurrency", type=int, default=None)
+run_parser.add_argument("--rpm", type=int, default=None, help="Requests per minute budget (0 = unlimited).")
+run_parser.add_argument("--tpm", type=int, default=None, help="Tokens per minute budget (0 = unlimited).")
+
+subparsers.add_parser("index", help="Build the HNSW index on the shadow column concurrently.")
+
+switch_parser = subparsers.add_parser("switch", help="Atomically make the target model active.")
+switch_parser.add_argument("--max-stragglers", type=int, default=None)
+switch_parser.add_argument("--skip-index", action="store_true", help="Switch without building the index first.")
+
+subparsers.add_parser("status", help="Show the active model and re-embedding progress.")
+subparsers.add_parser("drop-previous", help="Drop the pre-switch vectors (embedding_prev).")
+subparsers.add_parser("abort", help="Drop the shadow column and keep the active model.")
+
+args = parser.parse_args()
+
+if not os.getenv("DATABASE_URL"):
+    print("CRITICAL: DATABASE_URL not found in .env. Cannot proceed.")
+    sys.exit(1)
+
+from app.core.database import engine, SessionLocal
+from app.services import reembedding
+
+started = time.perf_counter()
+try:
+    if args.command == "start":
+        db = SessionLocal()
+        try:
+            reembedding.start_reembedding(db, args.model, args.dimension)
+        finally:
+            db.close()
+        print(f"✅ Shadow column added; run `python reembed.py run` to embed with {args.model}.")
+
+    elif args.command == "run":
+        progress = reembedding.run_backfill(
+            engine,
+            batch_size=args.batch_size or reembedding.REEMBED_BATCH_SIZE,
+            concurrency=args.concurrency or reembedding.REEMBED_CONCURRENCY,
+            requests_per_minute=reembedding.REEMBED_REQUESTS_PER_MINUTE if args.rpm is None else args.rpm,
+            tokens_per_minute=reembedding.REEMBED_TOKENS_PER_MINUTE if args.tpm is None else args.tpm,
+        )
+        print(f"{'⚠️ ' if progress.failed else '✅'} Backfill pass finished: {progress}")
+
+    elif args.command == "index":
+        built = reembedding.build_shadow_indexes(engine)
+        print(f"✅ Indexes ready: {', '.join(built) or 'none'} ({time.perf_counter() - started:.0f}s)")
+
+    elif args.command == "switch":
+        watermarks = reembedding.switch_to_target(
+            engine,
+            max_stragglers=args.max_stragglers or reembedding.REEMBED_MAX_STRAGGLERS,
+            require_index=not args.skip_index,
+        )
+        print("✅ Switched. Waiting for every process to pick up the new model...")
+        repaired = reembedding.repair_after_switch(engine, watermarks)
+        print(f"✅ Re-embedded {repaired} row(s) written during the switch window.")
+
+    elif args.command == "status":
+        status = reembedding.reembedding_status(engine)
+        print(f"Active: {status['active_model']} ({status['active_dimension']} dims, "
+              f"generation {status['generation']})")
+        if status["previous_model"]:
+            print(f"Previous vectors kept: {status['previous_model']} (embedding_prev)")
+        if status["target_model"]:
+            print(f"Target: {status['target_model']} ({status['target_dimension']} dims), "
+                  f"{status['status']}, {status['embedded']} rows embedded since {status['started_at']}")
+        for table, counts in status["tables"].items():
+            share = counts["shadow_vectors"] / counts["vectors"] if counts["vectors"] else 1.0
+            print(f"  {table}: {counts['shadow_vectors']}/{counts['vectors']} ({share:.1%})")
+
+    elif args.command == "drop-previous":
+        dropped = reembedding.drop_previous_column(engine)
+        print(f"✅ Dropped embedding_prev from: {', '.join(dropped) or 'nothing'}")
+
+    else:
+        reembedding.abort_reembedding(engine)
+        print("✅ Re-embedding aborted; the active model is unchanged.")
+except ValueError as e:
+    print(f"❌ {e}")
+    sys.exit(1)
@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import asyncio
+import argparse
+from dotenv import load_dotenv
+
+# --- 1. Load Environment Variables (before app imports) ---
+load_dotenv()
+
+parser = argparse.ArgumentParser(
+    description="Generate synthetic gateway streams and replay recorded/synthetic streams into the bot."
+)
+subparsers = parser.add_subparsers(dest="command", required=True)
+
+synth_parser = subparsers.add_parser("synth", help="Write a synthetic event stream to a JSONL file.")
+synth_parser.add_argument("out", help="Output JSONL path.")
+synth_parser.add_argument("--count", type=int, default=5000)
+synth_parser.add_argument("--rate", type=float, default=20.0, help="Mean events per second.")
+synth_parser.add_argument("--guilds", type=int, default=3)
+synth_parser.add_argument("--channels", type=int, default=10, help="Channels per guild.")
+synth_parser.add_argument("--authors", type=int, default=200)
+synth_parser.add_argument("--command-ratio", type=float, default=0.02)
+synth_parser.add_argument("--mention-ratio", type=float, default=0.01)
+synth_parser.add_argument("--burst-every", type=float, default=0.0, help="Seconds between bursts (0 = none).")
+synth_parser.add_argument("--burst-seconds", type=float, default=5.0)
+synth_parser.add_argument("--burst-factor", type=float, default=10.0)
+synth_parser.add_argument("--seed", type=int, default=0)
+
+run_parser = subparsers.add_parser("run", help="Replay a JSONL stream into DiscordMindBot.on_message.")
+run_parser.add_argument("events", help="JSONL stream (recorded with GATEWAY_RECORD_PATH or from synth).")
+run_parser.add_argument("--speed", type=float, default=1.0, help="Time compression of recorded timings.")
+run_parser.add_argument("--rate", type=float, default=None, help="Ignore timings and replay at N events/s.")
+run_parser.add_argument("--limit", type=int, default=None, help="Replay only the first N events.")
+run_parser.add_argument("--real-openai", action="store_true",
+                        help="Call the configured endpoint (OPENAI_BASE_URL, e.g. stub_openai.py) "
+                             "instead of the in-process stub.")
+run_parser.add_argument("--embedding-latency-ms", type=float, default=80.0)
+run_parser.add_argument("--chat-latency-ms", type=float, default=600.0)
+run_parser.add_argument("--drain-timeout", type=float, default=60.0,
+                        help="Seconds to wait for queued ingestion after the last event.")
+run_parser.add_argument("--report", default=None, help="Also write the JSON report here.")
+
+args = parser.parse_args()
+
+from app.services.gateway_replay import synthesize, save_events, load_events
+
+if args.command == "synth":
+    events = synthesize(
+        args.count, args.rate, guilds=args.guilds, channels=args.channels, authors=args.authors,
+        command_ratio=args.command_ratio, mention_ratio=args.mention_ratio,
+        burst_every=args.burst_every, burst_seconds=args.burst_seconds, burst_factor=args.burst_factor,
+        seed=args.seed,
+    )
+    written = save_events(args.out, events)
+    print(f"✅ Wrote {written} events spanning {events[-1].t:.1f}s to {args.out}")
+    sys.exit(0)
+
+if not os.getenv("DATABASE_URL"):
+    print("CRITICAL: DATABASE_URL not found in .env. Cannot proceed.")
+    sys.exit(1)
+
+# bot.py refuses to import without a token; the replay never logs in
+os.environ.setdefault("DISCORD_TOKEN", "replay")
+
+import bot as bot_module
+from app.core.database import SessionLocal, engine
+from app.services.gateway_replay import ReplayDriver
+from app.services.openai_stub import install_stub_clients
+
+
+async def main():
+    if not args.real_openai:
+        install_stub_clients(args.embedding_latency_ms / 1000, args.chat_latency_ms / 1000)
+    events = load_events(args.events)[:args.limit]
+    print(f"▶️  Replaying {len(events)} events "
+          f"({'%.1f events/s' % args.rate if args.rate else 'speed x%.1f' % args.speed})...")
+    driver = ReplayDriver(bot_module.bot, SessionLocal, engine, events, speed=args.speed, rate=args.rate)
+    report = await driver.run(drain_timeout=args.drain_timeout)
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+asyncio.run(main())
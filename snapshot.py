@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import argparse
+from dotenv import load_dotenv
+
+# --- 1. Load Environment Variables (before app imports) ---
+load_dotenv()
+
+parser = argparse.ArgumentParser(description="Export, import or analyze corpus snapshots.")
+subparsers = parser.add_subparsers(dest="command", required=True)
+
+export_parser = subparsers.add_parser("export", help="Append new rows (id > watermark) to a snapshot.")
+export_parser.add_argument("path", help="Snapshot directory.")
+
+import_parser = subparsers.add_parser("import", help="Restore a snapshot into discord_messages.")
+import_parser.add_argument("path", help="Snapshot directory.")
+
+topics_parser = subparsers.add_parser("topics", help="Run topic clustering on a snapshot (no database).")
+topics_parser.add_argument("path", help="Snapshot directory.")
+topics_parser.add_argument("-k", "--clusters", type=int, default=5)
+
+args = parser.parse_args()
+
+from app.services.snapshot_service import CorpusSnapshot, export_snapshot, import_snapshot
+
+if args.command == "topics":
+    from app.services.clustering_service import ClusteringService
+
+    snapshot = CorpusSnapshot(args.path)
+    print(f"Loaded snapshot: {len(snapshot)} rows, watermark id {snapshot.manifest['watermark']}")
+    clustering = ClusteringService(db=None, snapshot=snapshot)
+    for c in clustering.discover_topics(n_clusters=args.clusters):
+        print(f"  Cluster {c.cluster_id}: {c.message_count} msgs | {c.representative_messages[0][:80]}")
+    sys.exit(0)
+
+if not os.getenv("DATABASE_URL"):
+    print("CRITICAL: DATABASE_URL not found in .env. Cannot proceed.")
+    sys.exit(1)
+
+from app.core.database import get_db_session, get_read_db_session
+
+started = time.perf_counter()
+if args.command == "export":
+    db = next(get_read_db_session())
+    try:
+        rows = export_snapshot(db, args.path)
+    finally:
+        db.close()
+    print(f"✅ Exported {rows} new rows to {args.path} in {time.perf_counter() - started:.1f}s")
+else:
+    db = next(get_db_session())
+    try:
+        rows = import_snapshot(db, args.path)
+    finally:
+        db.close()
+    print(f"✅ Imported {rows} snapshot rows from {args.path} in {time.perf_counter() - started:.1f}s")
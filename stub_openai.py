@@ -0,0 +1,42 @@
+import os
+import argparse
+from dotenv import load_dotenv
+
+# --- 1. Load Environment Variables ---
+load_dotenv()
+
+from app.services.openai_stub import StubOpenAIServer, StubServerConfig
+
+parser = argparse.ArgumentParser(
+    description="Local OpenAI-compatible stub (embeddings + chat) for offline and perf runs. "
+                "Point the bot/workers at it with OPENAI_BASE_URL=http://HOST:PORT/v1."
+)
+parser.add_argument("--host", default=os.getenv("STUB_OPENAI_HOST", "127.0.0.1"))
+parser.add_argument("--port", type=int, default=int(os.getenv("STUB_OPENAI_PORT", "8089")))
+parser.add_argument("--latency-ms", type=float, default=50.0, help="Mean response latency.")
+parser.add_argument("--jitter-ms", type=float, default=20.0, help="Uniform +/- jitter on latency.")
+parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 500.")
+parser.add_argument("--rate-limit-rps", type=float, default=0.0,
+                    help="Requests/s allowed before answering 429 (0 = unlimited).")
+parser.add_argument("--rate-limit-burst", type=float, default=10.0)
+parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429s.")
+parser.add_argument("--stream-chunk-ms", type=float, default=15.0, help="Delay between streamed chunks.")
+parser.add_argument("--seed", type=int, default=0, help="Seed for latency jitter and error injection.")
+args = parser.parse_args()
+
+config = StubServerConfig(
+    latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+    rate_limit_rps=args.rate_limit_rps, rate_limit_burst=args.rate_limit_burst,
+    retry_after_seconds=args.retry_after, stream_chunk_ms=args.stream_chunk_ms, seed=args.seed,
+)
+server = StubOpenAIServer(args.host, args.port, config)
+print(f"🧪 Stub OpenAI listening on http://{args.host}:{args.port}/v1 "
+      f"(latency {args.latency_ms}±{args.jitter_ms} ms, errors {args.error_rate:.0%}, "
+      f"429 above {args.rate_limit_rps or '∞'} rps)")
+try:
+    server.serve_forever()
+except KeyboardInterrupt:
+    pass
+finally:
+    print(f"Stub OpenAI stopped. Counters: {server.counters}")
+    server.server_close()
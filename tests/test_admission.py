@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from app.services import admission
+from app.services.admission import AdmissionController, AdmissionRejected, TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def generous_rates(monkeypatch):
+    monkeypatch.setattr(admission, "LLM_USER_BURST", 1000.0)
+    monkeypatch.setattr(admission, "LLM_GUILD_BURST", 1000.0)
+
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(rate=1.0, capacity=2.0)
+    now = bucket.updated
+    bucket.take()
+    bucket.take()
+    assert not bucket.available(now)
+    assert bucket.available(now + 1.0)
+    assert bucket.available(now + 100.0) and bucket.tokens == 2.0
+
+
+def test_user_rate_is_enforced(monkeypatch):
+    monkeypatch.setattr(admission, "LLM_USER_BURST", 1.0)
+
+    async def scenario():
+        controller = AdmissionController(max_inflight=4)
+        async with controller.slot("u1", "g1"):
+            pass
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.slot("u1", "g1"):
+                pass
+        async with controller.slot("u2", "g1"):
+            pass
+        return controller, rejected.value
+
+    controller, rejected = asyncio.run(scenario())
+    assert rejected.reason == "user_rate" and rejected.reply
+    assert controller.admitted == 2 and controller.inflight == 0
+
+
+def test_fair_queue_interleaves_guilds():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_wait=5)
+        order = []
+        gate = asyncio.Event()
+
+        async def request(user, guild):
+            async with controller.slot(user, guild):
+                order.append(guild)
+                await gate.wait()
+
+        first = asyncio.create_task(request("holder", "busy"))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(request(f"b{i}", "busy")) for i in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("q", "quiet")))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, *tasks)
+        return order
+
+    order = asyncio.run(scenario())
+    # The quiet guild's only request is not served behind the busy guild's backlog
+    assert order.index("quiet") <= 2
+
+
+def test_stale_waiters_do_not_count_towards_overload():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_queue=2, max_wait=0.01)
+        hold = asyncio.Event()
+
+        async def holder():
+            async with controller.slot("h", "g"):
+                await hold.wait()
+
+        task = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        for user in ("a", "b"):
+            with pytest.raises(AdmissionRejected) as rejected:
+                async with controller.slot(user, "g"):
+                    pass
+            assert rejected.value.reason == "queue_timeout"
+        # Both timed-out waiters are still in the heap; the queue is not full
+        waiter = asyncio.create_task(controller._acquire("c", "g"))
+        await asyncio.sleep(0)
+        assert controller.stats()["queued"] == 1
+        hold.set()
+        await task
+        await waiter
+        controller._release()
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert controller.rejected["overload"] == 0
+    assert controller.inflight == 0
+
+
+def test_slot_granted_at_timeout_is_released(monkeypatch):
+    async def timed_out(future, timeout):
+        # _dispatch already granted the slot when the wait timed out
+        assert future.done()
+        raise asyncio.TimeoutError
+
+    monkeypatch.setattr(admission.asyncio, "wait_for", timed_out)
+
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_wait=5)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller._acquire("u", "g")
+        assert rejected.value.reason == "queue_timeout"
+        return controller
+
+    assert asyncio.run(scenario()).inflight == 0
+
+
+def test_cancelled_request_frees_its_queue_position():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_wait=5)
+        hold = asyncio.Event()
+
+        async def holder():
+            async with controller.slot("h", "g"):
+                await hold.wait()
+
+        first = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(controller._acquire("q", "g"))
+        await asyncio.sleep(0)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        hold.set()
+        await first
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert controller.inflight == 0 and controller.stats()["queued"] == 0
@@ -0,0 +1,41 @@
+from app.services.chunking import split_into_chunks, needs_chunking, LONG_MESSAGE_THRESHOLD
+
+
+def paragraphs(count, words=60):
+    return "\n\n".join(" ".join(f"p{p}w{w}" for w in range(words)) + "." for p in range(count))
+
+
+def test_short_text_is_one_chunk():
+    assert split_into_chunks("hello world", size=100, overlap=10) == ["hello world"]
+
+
+def test_only_long_messages_are_chunked():
+    assert not needs_chunking("x" * LONG_MESSAGE_THRESHOLD)
+    assert needs_chunking("x" * (LONG_MESSAGE_THRESHOLD + 1))
+
+
+def test_chunks_respect_size_and_cover_the_text():
+    text = paragraphs(20)
+    chunks = split_into_chunks(text, size=500, overlap=100)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 500 for chunk in chunks)
+    words = text.split()
+    assert {w for chunk in chunks for w in chunk.split()} == set(words)
+    assert chunks[0].startswith(words[0]) and chunks[-1].endswith(words[-1])
+
+
+def test_consecutive_chunks_overlap_on_whole_words():
+    chunks = split_into_chunks(paragraphs(20), size=500, overlap=100)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.split()[0] in previous.split()
+
+
+def test_cuts_prefer_paragraph_boundaries():
+    chunks = split_into_chunks(paragraphs(6, words=40), size=700, overlap=0)
+    assert all(chunk.endswith(".") for chunk in chunks)
+
+
+def test_unbroken_text_still_terminates():
+    chunks = split_into_chunks("x" * 2000, size=300, overlap=50)
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    assert sum(len(chunk) for chunk in chunks) >= 2000
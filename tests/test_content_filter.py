@@ -0,0 +1,74 @@
+from app.services.content_filter import (
+    ContentFilter, simhash, informative_text, TOKEN_PATTERN, NEAR_DUP_MAX_DISTANCE
+)
+
+WALL = "please read the rules channel before posting your questions in general chat thanks everyone"
+WELCOME = ("welcome to the server please read the rules channel before posting and introduce yourself in the "
+           "intro channel so that everyone knows who you are also check the pinned messages for the faq and "
+           "the event calendar before asking about upcoming meetups or the release schedule thanks and have fun")
+
+
+def fingerprint(text):
+    return simhash(TOKEN_PATTERN.findall(informative_text(text).lower()))
+
+
+def test_low_information_messages_get_no_vector():
+    content_filter = ContentFilter()
+    assert content_filter.evaluate("+1").reason == "low_info"
+    assert content_filter.evaluate("🔥🔥🔥").reason == "emoji_only"
+    assert content_filter.evaluate("https://example.com/some/page").reason == "url_only"
+    assert content_filter.evaluate("+1").action in ("store", "skip")
+
+
+def test_short_messages_are_embedded_without_fingerprint():
+    decision = ContentFilter().evaluate("what time is the meeting")
+    assert (decision.action, decision.fingerprint) == ("embed", None)
+
+
+def test_simhash_is_close_for_near_duplicates():
+    edited = WELCOME.replace("have fun", "enjoy")
+    assert (fingerprint(WELCOME) ^ fingerprint(edited)).bit_count() <= NEAR_DUP_MAX_DISTANCE
+    unrelated = "the release schedule for next week moved to friday because of the holiday"
+    assert (fingerprint(WELCOME) ^ fingerprint(unrelated)).bit_count() > NEAR_DUP_MAX_DISTANCE
+
+
+def test_near_duplicates_are_only_matched_within_a_guild():
+    content_filter = ContentFilter()
+    content_filter.remember(fingerprint(WALL), 7, guild_id="guild-b")
+    assert content_filter.evaluate(WALL, guild_id="guild-a").action == "embed"
+    assert content_filter.evaluate(WALL, guild_id="guild-b").duplicate_of == 7
+    decisions = content_filter.evaluate_batch([WALL, WALL], ["guild-c", "guild-d"])
+    assert [d.action for d in decisions] == ["embed", "embed"]
+
+
+def test_remembered_message_suppresses_its_near_duplicate():
+    content_filter = ContentFilter()
+    first = content_filter.evaluate(WALL)
+    assert first.action == "embed"
+    content_filter.remember(first.fingerprint, 42)
+
+    repeat = content_filter.evaluate(WALL + " 🙏")
+    assert (repeat.action, repeat.reason, repeat.duplicate_of) == ("store", "near_duplicate", 42)
+
+
+def test_window_evicts_oldest_fingerprints():
+    content_filter = ContentFilter(window=1)
+    content_filter.remember(fingerprint(WALL), 1)
+    content_filter.remember(fingerprint("a completely different message about the release schedule for next week"), 2)
+    assert content_filter.evaluate(WALL).action == "embed"
+    assert len(content_filter.windows[None].recent) == 1
+
+
+def test_batch_near_duplicates_point_at_the_batch_original():
+    decisions = ContentFilter().evaluate_batch([WALL, "ok", WALL + "!!", WALL])
+    assert [d.action for d in decisions][0] == "embed"
+    assert [(d.reason, d.duplicate_in_batch) for d in decisions[2:]] == [
+        ("near_duplicate", 0), ("near_duplicate", 0)
+    ]
+
+
+def test_batch_duplicates_of_the_window_keep_the_stored_original():
+    content_filter = ContentFilter()
+    content_filter.remember(fingerprint(WALL), 7)
+    decisions = content_filter.evaluate_batch([WALL, WALL])
+    assert [(d.duplicate_of, d.duplicate_in_batch) for d in decisions] == [(7, None), (7, None)]
@@ -0,0 +1,38 @@
+import time
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from app.core import deadline as deadline_module
+from app.core.deadline import Deadline, DeadlineExceeded, MIN_STAGE_SECONDS
+
+
+@pytest.fixture(autouse=True)
+def fresh_misses(monkeypatch):
+    monkeypatch.setattr(deadline_module, "_misses", deadline_module.Counter())
+
+
+def test_stage_gets_its_share_of_the_remaining_time():
+    with Deadline(10).stage("retrieve", share=0.5) as stage:
+        assert 4.9 < stage.budget <= 5.0
+    assert deadline_module.deadline_misses() == {}
+
+
+def test_stage_below_the_minimum_is_skipped_and_counted():
+    deadline = Deadline(MIN_STAGE_SECONDS * 3)
+    with pytest.raises(DeadlineExceeded) as raised:
+        with deadline.stage("embed", share=0.1):
+            pytest.fail("stage should not run")
+    assert raised.value.stage == "embed"
+    assert deadline_module.deadline_misses() == {"embed": 1}
+
+
+def test_overrun_is_recorded_even_when_the_stage_raises():
+    deadline = Deadline(MIN_STAGE_SECONDS * 1.2)
+    with pytest.raises(TimeoutError):
+        with deadline.stage("generate"):
+            time.sleep(MIN_STAGE_SECONDS * 1.3)
+            raise TimeoutError
+    assert deadline_module.deadline_misses() == {"generate": 1}
+    assert deadline.remaining() == 0.0
@@ -0,0 +1,87 @@
+import pytest
+
+from app.services.ingest_spool import IngestSpool
+
+
+@pytest.fixture
+def spool(tmp_path):
+    spool = IngestSpool(str(tmp_path / "ingest.sqlite3"), dead_after=3)
+    yield spool
+    spool.close()
+
+
+def payload(discord_id):
+    return {"discord_message_id": str(discord_id), "content": f"message {discord_id}"}
+
+
+def make_due(spool):
+    spool.conn.execute("UPDATE spool SET next_attempt = 0")
+    spool.paused_until = 0.0
+
+
+class FailOn:
+    def __init__(self, bad_id):
+        self.bad_id = bad_id
+        self.stored = []
+
+    def __call__(self, batch):
+        if any(p["discord_message_id"] == self.bad_id for p in batch):
+            raise ValueError("bad row")
+        self.stored.extend(p["discord_message_id"] for p in batch)
+        return len(batch)
+
+
+def down(batch):
+    raise ConnectionError("database is down")
+
+
+def drain_all(spool, sink):
+    while True:
+        try:
+            if not spool.drain_once(sink):
+                return
+        except ValueError:
+            pass
+        make_due(spool)
+
+
+def test_drain_checkpoints_in_order_and_ignores_redelivery(spool):
+    for discord_id in (1, 2, 1, 3):
+        spool.append(payload(discord_id))
+    stored = []
+    assert spool.drain_once(lambda batch: stored.extend(p["discord_message_id"] for p in batch), limit=2) == 2
+    assert spool.drain_once(lambda batch: stored.extend(p["discord_message_id"] for p in batch)) == 1
+    assert stored == ["1", "2", "3"]
+    assert spool.stats()["depth"] == 0
+
+
+def test_outage_backs_off_the_drainer_without_counting_attempts(spool):
+    for discord_id in range(200):
+        spool.append(payload(discord_id))
+    for _ in range(60):
+        with pytest.raises(ConnectionError):
+            spool.drain_once(down)
+        assert spool.drain_once(down) == 0  # backing off
+        make_due(spool)
+    stats = spool.stats()
+    assert (stats["depth"], stats["retrying"], stats["dead"]) == (200, 0, 0)
+    assert spool.drain_once(lambda batch: len(batch)) == 64  # full batches once the sink is back
+
+
+def test_failing_row_is_bisected_out_and_dead_lettered_alone(spool):
+    sink = FailOn("5")
+    for discord_id in range(10):
+        spool.append(payload(discord_id))
+    drain_all(spool, sink)
+    stats = spool.stats()
+    assert (stats["depth"], stats["dead"]) == (0, 1)
+    assert sorted(sink.stored, key=int) == [str(i) for i in range(10) if i != 5]
+
+
+def test_dead_letters_can_be_requeued(spool):
+    spool.append(payload(1))
+    drain_all(spool, FailOn("1"))
+    assert spool.stats()["dead"] == 1
+    assert spool.requeue_dead() == 1
+    assert spool.drain_once(lambda batch: len(batch)) == 1
+    assert (spool.stats()["depth"], spool.stats()["dead"]) == (0, 0)
@@ -0,0 +1,27 @@
+import json
+import logging
+import queue
+import sys
+
+from app.core.logger import DroppingQueueHandler, JsonFormatter
+
+
+def failing_record():
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        return logging.LogRecord("discord_mind", logging.ERROR, __file__, 1, "failed %s", ("job",), sys.exc_info())
+
+
+def test_queued_records_keep_their_traceback():
+    record = DroppingQueueHandler(queue.Queue()).prepare(failing_record())
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["msg"] == "failed job"
+    assert "ZeroDivisionError" in entry["exc"]
+
+
+def test_full_queue_drops_and_counts():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    for _ in range(3):
+        handler.handle(logging.makeLogRecord({"msg": "x"}))
+    assert handler.dropped == 2
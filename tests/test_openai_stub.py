@@ -0,0 +1,15 @@
+import pytest
+
+pytest.importorskip("pgvector.sqlalchemy")
+
+from app.services.openai_stub import StubOpenAIClient
+
+
+def test_stub_accepts_per_call_options():
+    client = StubOpenAIClient()
+    assert client.with_options(timeout=1.5, max_retries=0) is client
+
+
+def test_stub_honours_requested_dimensions():
+    response = StubOpenAIClient().embeddings.create(input=["a", "b"], model="text-embedding-3-small", dimensions=8)
+    assert [len(item.embedding) for item in response.data] == [8, 8]
@@ -0,0 +1,13 @@
+import pytest
+
+from app.core.prompts import is_compact_query
+
+
+@pytest.mark.parametrize("question", ["hi", "hey there!", "thanks so much :)", "how are you?", "gm everyone"])
+def test_greetings_get_the_compact_persona(question):
+    assert is_compact_query(question)
+
+
+@pytest.mark.parametrize("question", ["yo what is git", "hello, can you explain rust", "history?", "who is admin?"])
+def test_short_questions_get_the_full_persona(question):
+    assert not is_compact_query(question)
@@ -0,0 +1,51 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.services.recent_context import RecentContextBuffer
+
+
+def fill(buffer, channel, count, start=1):
+    for i in range(start, start + count):
+        buffer.add(channel, str(i), "author", f"message {i}", float(i))
+
+
+def test_ring_buffer_keeps_the_latest_messages():
+    buffer = RecentContextBuffer(size=3)
+    fill(buffer, "c1", 5)
+    assert [m.discord_id for m in buffer.context("c1", turns=10, relevant=0)] == [3, 4, 5]
+
+
+def test_least_recently_used_channel_is_evicted():
+    buffer = RecentContextBuffer(size=3, max_channels=2)
+    fill(buffer, "c1", 1)
+    fill(buffer, "c2", 1)
+    fill(buffer, "c1", 1, start=2)
+    fill(buffer, "c3", 1)
+    assert list(buffer.channels) == ["c1", "c3"]
+    assert buffer.stats()["evicted"] == 1
+
+
+def test_idle_channels_are_evicted_on_insert():
+    buffer = RecentContextBuffer(size=3, idle_seconds=60)
+    fill(buffer, "c1", 1)
+    buffer.channels["c1"].last_active -= 120
+    fill(buffer, "c2", 1)
+    assert list(buffer.channels) == ["c2"]
+
+
+def test_context_adds_older_messages_similar_to_the_query():
+    buffer = RecentContextBuffer(size=10)
+    fill(buffer, "c1", 5)
+    buffer.attach_vector("c1", "1", [1.0, 0.0])
+    buffer.attach_vector("c1", "2", [0.0, 1.0])
+    picked = buffer.context("c1", query_vector=np.array([0.0, 1.0]), turns=2, relevant=1)
+    assert [m.discord_id for m in picked] == [2, 4, 5]
+
+
+def test_vectors_of_another_dimension_are_ignored():
+    buffer = RecentContextBuffer(size=10)
+    fill(buffer, "c1", 3)
+    buffer.attach_vector("c1", "1", [1.0, 0.0, 0.0])
+    picked = buffer.context("c1", query_vector=np.array([1.0, 0.0]), turns=1, relevant=1)
+    assert [m.discord_id for m in picked] == [3]
@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pgvector.sqlalchemy")
+
+from sqlalchemy.dialects import postgresql
+
+from app.services.retrieval_service import (
+    search_page, hnsw_iterative_scans, HNSW_EF_SEARCH_DEFAULT, HNSW_EF_SEARCH_MAX,
+)
+
+
+class RecordingSession:
+    """Collects the SQL search_page runs; the message query returns `messages`, the rest nothing."""
+
+    def __init__(self, messages=(), extversion="0.7.4"):
+        self.statements = []
+        self.messages = list(messages)
+        self.extversion = extversion
+        self.result = ()
+
+    def execute(self, statement, *args):
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        self.statements.append(sql)
+        self.result = self.messages if "FROM discord_messages" in sql and "ORDER BY" in sql else ()
+        return self
+
+    def scalar(self):
+        return self.extversion
+
+    def __iter__(self):
+        return iter(self.result)
+
+    def all(self):
+        return list(self.result)
+
+
+@pytest.fixture(autouse=True)
+def fresh_version_check():
+    if hasattr(hnsw_iterative_scans, "supported"):
+        del hnsw_iterative_scans.supported
+    yield
+    if hasattr(hnsw_iterative_scans, "supported"):
+        del hnsw_iterative_scans.supported
+
+
+def hits(n):
+    return [(SimpleNamespace(id=i, content=f"message {i}"), i / 100) for i in range(1, n + 1)]
+
+
+def run_page(session=None, **kwargs):
+    session = session or RecordingSession()
+    page, more = search_page(session, [0.0] * 4, **kwargs)
+    return session.statements, page, more
+
+
+def ef_search(statements):
+    return int(next(s for s in statements if "hnsw.ef_search" in s).rsplit("=", 1)[1])
+
+
+def test_first_page_keeps_the_default_candidate_list():
+    statements, _, _ = run_page(page_size=5)
+    assert ef_search(statements) == HNSW_EF_SEARCH_DEFAULT
+    assert not any("NOT IN" in s for s in statements)
+
+
+def test_deeper_pages_widen_the_scan_and_skip_shown_messages():
+    statements, _, _ = run_page(after=(0.25, 42), page_size=5, seen=set(range(1, 41)))
+    assert HNSW_EF_SEARCH_DEFAULT < ef_search(statements) <= HNSW_EF_SEARCH_MAX
+    queries = [s for s in statements if "ORDER BY" in s]
+    assert len(queries) == 2 and all("NOT IN" in s for s in queries)
+
+
+def test_no_next_page_once_the_scan_would_be_capped():
+    session = RecordingSession(hits(6))
+    _, page, more = run_page(session, after=(0.5, 1), page_size=5, seen=set(range(1000, 1030)))
+    assert len(page) == 5 and more
+    session = RecordingSession(hits(6))
+    statements, page, more = run_page(session, after=(0.5, 1), page_size=5, seen=set(range(10000)))
+    assert ef_search(statements) == HNSW_EF_SEARCH_MAX
+    assert len(page) == 5 and not more
+
+
+def test_iterative_scans_continue_without_widening():
+    session = RecordingSession(hits(6), extversion="0.8.0")
+    statements, page, more = run_page(session, after=(0.5, 1), page_size=5, seen=set(range(10000)))
+    assert any("hnsw.iterative_scan = strict_order" in s for s in statements)
+    assert not any("hnsw.ef_search" in s for s in statements)
+    assert len(page) == 5 and more
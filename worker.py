@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+import argparse
+from dotenv import load_dotenv
+
+# --- 1. Load Config (Must be before app imports) ---
+load_dotenv()
+
+from app.core.logger import logger
+from app.core.database import get_db_session, get_read_db_session
+from app.services import job_queue
+from app.services.embedding_service import store_message_batch
+from app.services.clustering_service import get_clustering_service
+
+parser = argparse.ArgumentParser(description="Drain the shared job queue (ingestion / analytics).")
+parser.add_argument("--kinds", default="ingest,analytics",
+                    help="Comma-separated job kinds this worker handles.")
+parser.add_argument("--batch-size", type=int, default=int(os.getenv("WORKER_BATCH_SIZE", "64")),
+                    help="Max ingest jobs embedded per API call.")
+parser.add_argument("--idle-sleep", type=float, default=1.0,
+                    help="Seconds to sleep when the queue is empty.")
+
+JOB_PURGE_INTERVAL_SECONDS = 600
+
+
+# --- Job Handlers ---
+def handle_ingest(jobs):
+    """
+    Embeds and stores a whole claimed batch with a single embedding call.
+    A failed batch is bisected, so only the payload that keeps failing is
+    charged an attempt and the rest of the batch is still ingested.
+    """
+    db = next(get_db_session())
+    try:
+        inserted = store_message_batch(db, [job.payload for job in jobs])
+        job_queue.complete(db, [job.id for job in jobs])
+        logger.info(f"Worker ingested {inserted}/{len(jobs)} message(s).")
+    except Exception as e:
+        db.rollback()
+        if len(jobs) == 1:
+            job_queue.fail(db, jobs[0], str(e))
+            logger.error(f"Ingest job {jobs[0].id} failed: {e}")
+            return
+        logger.warning(f"Ingest batch failed ({len(jobs)} jobs), retrying in halves: {e}")
+    finally:
+        db.close()
+    middle = len(jobs) // 2
+    handle_ingest(jobs[:middle])
+    handle_ingest(jobs[middle:])
+
+
+def run_analytics(payload):
+    """Runs one analytics operation against the read replica and returns a JSON result."""
+    db = next(get_read_db_session())
+    try:
+        clustering = get_clustering_service(db)
+        op = payload["op"]
+        if op == "topics":
+            return [c.to_dict() for c in clustering.discover_topics(n_clusters=payload["n_clusters"])]
+        if op == "attribute_idea":
+            return [list(a) for a in clustering.attribute_idea(payload["idea"])]
+        if op == "similar_thinkers":
+            return [list(s) for s in clustering.find_similar_thinkers(payload["author_id"])]
+        raise ValueError(f"Unknown analytics op: {op}")
+    finally:
+        db.close()
+
+
+def handle_analytics(jobs):
+    for job in jobs:
+        db = next(get_db_session())
+        try:
+            result = run_analytics(job.payload)
+            job_queue.complete(db, [job.id], {job.id: result})
+        except Exception as e:
+            job_queue.fail(db, job, str(e))
+            logger.error(f"Analytics job {job.id} failed: {e}")
+        finally:
+            db.close()
+
+
+HANDLERS = {
+    "ingest": handle_ingest,
+    "analytics": handle_analytics,
+}
+
+
+def run_worker(kinds, batch_size, idle_sleep):
+    logger.info(f"🛠️  Worker {job_queue.WORKER_ID} started (kinds: {', '.join(kinds)}).")
+    last_reap = 0.0
+    last_purge = 0.0
+    while True:
+        db = next(get_db_session())
+        try:
+            # Periodically return jobs orphaned by crashed workers
+            if time.monotonic() - last_reap > job_queue.JOB_LOCK_TIMEOUT_SECONDS / 2:
+                released = job_queue.release_stale(db)
+                if released:
+                    logger.warning(f"Released {released} stale job(s).")
+                last_reap = time.monotonic()
+
+            if time.monotonic() - last_purge > JOB_PURGE_INTERVAL_SECONDS:
+                purged = job_queue.purge_done(db)
+                if purged:
+                    logger.info(f"Purged {purged} finished job(s).")
+                last_purge = time.monotonic()
+
+            claimed = {kind: job_queue.claim_batch(db, [kind], batch_size if kind == "ingest" else 1)
+                       for kind in kinds}
+        finally:
+            db.close()
+
+        if not any(claimed.values()):
+            time.sleep(idle_sleep)
+            continue
+        for kind, jobs in claimed.items():
+            if jobs:
+                HANDLERS[kind](jobs)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()]
+    unknown = [k for k in kinds if k not in HANDLERS]
+    if unknown:
+        logger.critical(f"CRITICAL: Unknown job kind(s): {', '.join(unknown)}")
+        sys.exit(1)
+    try:
+        run_worker(kinds, args.batch_size, args.idle_sleep)
+    except KeyboardInterrupt:
+        logger.info("Worker stopped.")